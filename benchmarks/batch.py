@@ -0,0 +1,121 @@
+"""Batch generation benchmark: ``generate_batch`` versus one ``handle`` call per request.
+
+Builds a cohort of ``--requests`` generation requests over ``--distinct`` different
+queries, runs it once through the single-request path (sequentially, as a cohort job
+calling ``handle`` in a loop would) and once through ``batch_handler``, on fresh
+generators with the offline fakes. Reports paths per second, Bedrock calls and the batch
+summary (distinct work per stage, time per stage).
+
+    python -m benchmarks.batch --requests 200 --distinct 40 --latency-scale 0.1
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from typing import Any, Dict, List
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+os.environ.setdefault("METRICS_SINK", "memory")
+
+import learning_path_generator  # noqa: E402
+
+from benchmarks.fakes import (  # noqa: E402
+    FakeBedrockClient,
+    FakeMongoDBClient,
+    LatencyModel,
+    SQLitePostgresClient,
+    synthetic_catalog,
+)
+from benchmarks.pipeline import make_event  # noqa: E402
+
+
+def build_generator(args: argparse.Namespace, catalog: List[Dict[str, Any]]):
+    scale = args.latency_scale
+    return learning_path_generator.LearningPathGenerator(
+        FakeBedrockClient(
+            args.dimension,
+            embedding_latency=LatencyModel(args.embedding_ms, scale=scale),
+            nova_first_token=LatencyModel(args.nova_first_token_ms, scale=scale),
+            latency_scale=scale,
+        ),
+        FakeMongoDBClient(catalog, args.dimension, LatencyModel(args.search_ms, scale=scale)),
+        SQLitePostgresClient(LatencyModel(args.persist_ms, scale=scale)),
+    )
+
+
+def cohort(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    items = []
+    for index in range(args.requests):
+        body = json.loads(make_event(index % args.distinct, args.num_courses)["body"])
+        body["user_id"] = f"cohort-user-{index}"
+        items.append(body)
+    return items
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--distinct", type=int, default=25, help="different queries in the cohort")
+    parser.add_argument("--num-courses", type=int, default=8)
+    parser.add_argument("--catalog-size", type=int, default=2000)
+    parser.add_argument("--dimension", type=int, default=1024)
+    parser.add_argument("--latency-scale", type=float, default=0.1, help="0 = CPU only, no simulated I/O")
+    parser.add_argument("--embedding-ms", type=float, default=60.0)
+    parser.add_argument("--search-ms", type=float, default=40.0)
+    parser.add_argument("--nova-first-token-ms", type=float, default=600.0)
+    parser.add_argument("--persist-ms", type=float, default=30.0)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+    # Without the plan cache the sequential pass pays one Nova call per request, as a cold cohort would
+    os.environ["NOVA_PLAN_CACHE_SIZE"] = "0"
+
+    catalog = synthetic_catalog(args.catalog_size, args.dimension)
+    items = cohort(args)
+
+    generator = build_generator(args, catalog)
+    start = time.perf_counter()
+    for item in items:
+        generator.handle({"body": item})
+    sequential_s = time.perf_counter() - start
+    sequential_calls = dict(generator.bedrock.calls)
+
+    generator = build_generator(args, catalog)
+    learning_path_generator.generator_instance = generator
+    start = time.perf_counter()
+    response = learning_path_generator.lambda_handler({"batch": items}, None)
+    batch_s = time.perf_counter() - start
+    summary = json.loads(response["body"])["summary"]
+
+    report = {
+        "requests": args.requests,
+        "sequential": {
+            "seconds": round(sequential_s, 3),
+            "paths_per_second": round(args.requests / sequential_s, 2),
+            "bedrock_calls": sequential_calls,
+        },
+        "batch": {
+            "seconds": round(batch_s, 3),
+            "paths_per_second": round(summary["succeeded"] / batch_s, 2),
+            "bedrock_calls": dict(generator.bedrock.calls),
+            "summary": summary,
+        },
+    }
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"{'mode':<12}{'seconds':>10}{'paths/s':>10}{'embeddings':>12}{'nova':>8}")
+    for mode in ("sequential", "batch"):
+        values = report[mode]
+        calls = values["bedrock_calls"]
+        print(f"{mode:<12}{values['seconds']:>10.3f}{values['paths_per_second']:>10.2f}{calls['embedding']:>12}{calls['nova']:>8}")
+    print(f"speedup: {sequential_s / batch_s:.2f}x, batch stages (ms): {summary['stages_ms']}, failed: {summary['failed']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,371 @@
+"""In-process stand-ins for Bedrock, Atlas and RDS used by the offline benchmarks.
+
+The fakes reuse the real client code wherever it does not touch the network:
+``FakeMongoDBClient`` is a ``MongoDBClient`` running the local NumPy engine over a
+synthetic catalog, so filtering, relaxation and serialization are the production paths.
+"""
+import hashlib
+import json
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from utils.deadline import NO_DEADLINE, Deadline
+from utils.model_router import build_model_router
+from utils.usage import record_bedrock_call
+from utils.mongodb_client import MongoDBClient
+from utils.vector_index import LocalVectorIndex
+
+COURSE_ID_PATTERN = re.compile(r"course-\d{6}")
+LEVELS = ("beginner", "intermediate", "advanced")
+PLATFORMS = ("Udemy", "Coursera", "Platzi", "edX", "YouTube")
+CATEGORIES = ("programming", "data", "web", "cloud", "design", "ai")
+WORDS = (
+    "aprenderás fundamentos prácticos proyecto reales datos python modelos web "
+    "servicios despliegue pruebas arquitectura buenas prácticas ejercicios guiados"
+).split()
+
+
+class LatencyModel:
+    """Lognormal latency around a median, in milliseconds; scale 0 turns sleeping off."""
+
+    def __init__(self, median_ms: float, sigma: float = 0.35, scale: float = 1.0, seed: int = 7) -> None:
+        self._median_ms = median_ms
+        self._sigma = sigma
+        self._scale = scale
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample_ms(self) -> float:
+        with self._lock:
+            return self._median_ms * self._random.lognormvariate(0.0, self._sigma)
+
+    def sleep(self, extra_ms: float = 0.0, speed: float = 1.0) -> None:
+        if self._scale > 0:
+            time.sleep((self.sample_ms() + extra_ms) * self._scale / speed / 1000)
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def synthetic_catalog(size: int, dimension: int, seed: int = 11) -> List[Dict[str, Any]]:
+    rng = np.random.default_rng(seed)
+    centroids = rng.normal(size=(len(CATEGORIES), dimension)).astype(np.float32)
+    courses = []
+    for index in range(size):
+        category = index % len(CATEGORIES)
+        vector = centroids[category] + 0.6 * rng.normal(size=dimension).astype(np.float32)
+        courses.append(
+            {
+                "_id": f"course-{index:06d}",
+                "embedding": vector.tolist(),
+                "title": f"Curso {index} de {CATEGORIES[category]}",
+                "description": " ".join(rng.choice(WORDS, size=60)),
+                "url": f"https://example.com/courses/{index}",
+                "platform": PLATFORMS[int(rng.integers(len(PLATFORMS)))],
+                "instructor": f"Instructor {index % 97}",
+                "rating": round(float(rng.uniform(3.5, 5.0)), 1),
+                "duration": f"{int(rng.integers(2, 40))} hours",
+                "price": round(float(rng.uniform(0, 150)), 2) if rng.random() > 0.2 else None,
+                "students_count": int(rng.integers(100, 200000)),
+                "language": "es" if rng.random() > 0.4 else "en",
+                "category": CATEGORIES[category],
+                "level": LEVELS[int(rng.integers(len(LEVELS)))],
+            }
+        )
+    return courses
+
+
+class FakeBedrockClient:
+    """Titan/Nova stand-in with configurable latency and output-length distributions.
+
+    Embeddings are deterministic per query; Nova answers with a valid plan over the
+    course IDs present in the prompt, paying time-to-first-token plus per-token time.
+    Calls go through the production model router; the small tier (NOVA_SMALL_MODEL) runs
+    ``small_model_speedup`` times faster.
+    """
+
+    def __init__(
+        self,
+        dimension: int,
+        embedding_latency: LatencyModel,
+        nova_first_token: LatencyModel,
+        nova_ms_per_token: float = 8.0,
+        reason_words: int = 120,
+        latency_scale: float = 1.0,
+        small_model_speedup: float = 2.5,
+    ) -> None:
+        self._dimension = dimension
+        self._embedding_latency = embedding_latency
+        self._nova_first_token = nova_first_token
+        self._nova_ms_per_token = nova_ms_per_token
+        self._reason_words = reason_words
+        self._latency_scale = latency_scale
+        self._small_model_speedup = small_model_speedup
+        self._router = build_model_router(os.getenv("NOVA_MODEL", "us.amazon.nova-lite-v1:0"))
+        self.calls = {"embedding": 0, "nova": 0}
+        self.tokens = {"input": 0, "output": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, kind: str, input_tokens: int = 0, output_tokens: int = 0) -> None:
+        with self._lock:
+            self.calls[kind] += 1
+            self.tokens["input"] += input_tokens
+            self.tokens["output"] += output_tokens
+
+    def generate_embedding(self, text: str, deadline: Deadline = NO_DEADLINE) -> List[float]:
+        embedding, _ = self.generate_embedding_with_tier(text, deadline)
+        return embedding
+
+    def generate_embedding_with_tier(self, text: str, deadline: Deadline = NO_DEADLINE) -> Tuple[List[float], str]:
+        deadline.check("embedding")
+        start = time.monotonic()
+        self._embedding_latency.sleep()
+        self._count("embedding", input_tokens=estimate_tokens(text))
+        record_bedrock_call(
+            "embedding", "amazon.titan-embed-text-v2:0", estimate_tokens(text), latency_ms=(time.monotonic() - start) * 1000
+        )
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+        vector = np.random.default_rng(seed).normal(size=self._dimension)
+        return vector.tolist(), "miss"
+
+    def invoke_nova(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        max_tokens: Optional[int] = None,
+        deadline: Deadline = NO_DEADLINE,
+        assistant_prefix: Optional[str] = None,
+        expected_items: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        deadline.check("Nova")
+        model, max_tokens, speed = self._route(max_tokens, expected_items)
+        start = time.monotonic()
+        if assistant_prefix:
+            # Continuation: the rest of the full answer after what was already written
+            full_text = self._plan_text(user_prompt, 1 << 20)
+            prefix = assistant_prefix[max(assistant_prefix.find("{"), 0) :]
+            text = full_text[len(prefix) :][: max_tokens * 4] if full_text.startswith(prefix) else ""
+        else:
+            text = self._plan_text(user_prompt, max_tokens)
+        self._nova_first_token.sleep(estimate_tokens(text) * self._nova_ms_per_token, speed=speed)
+        self._router.record(model, time.monotonic() - start, ok=True)
+        input_tokens, output_tokens = estimate_tokens(system_prompt + user_prompt), estimate_tokens(text)
+        self._count("nova", input_tokens, output_tokens)
+        record_bedrock_call("nova", model, input_tokens, output_tokens, latency_ms=(time.monotonic() - start) * 1000)
+        return {
+            "message": {"role": "assistant", "content": [{"text": text}]},
+            "usage": {"inputTokens": input_tokens, "outputTokens": output_tokens},
+            "model": model,
+        }
+
+    def invoke_nova_stream(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        max_tokens: Optional[int] = None,
+        deadline: Deadline = NO_DEADLINE,
+        expected_items: Optional[int] = None,
+    ) -> Iterator[str]:
+        deadline.check("Nova")
+        model, max_tokens, speed = self._route(max_tokens, expected_items)
+        text = self._plan_text(user_prompt, max_tokens)
+        start = time.monotonic()
+        self._nova_first_token.sleep(speed=speed)
+        self._router.record(model, time.monotonic() - start, ok=True)
+        self._count("nova", estimate_tokens(system_prompt + user_prompt), estimate_tokens(text))
+        step = 16
+        for offset in range(0, len(text), step):
+            if self._latency_scale > 0:
+                time.sleep(
+                    estimate_tokens(text[offset : offset + step]) * self._nova_ms_per_token * self._latency_scale / speed / 1000
+                )
+            yield text[offset : offset + step]
+        record_bedrock_call(
+            "nova_stream",
+            model,
+            estimate_tokens(system_prompt + user_prompt),
+            estimate_tokens(text),
+            latency_ms=(time.monotonic() - start) * 1000,
+        )
+
+    def _route(self, max_tokens: Optional[int], expected_items: Optional[int]) -> Tuple[str, int, float]:
+        model = self._router.choose(expected_items)
+        if max_tokens is None:
+            max_tokens = self._router.max_tokens_for(expected_items)
+        speed = self._small_model_speedup if model != self._router.large_model else 1.0
+        return model, max_tokens, speed
+
+    def _plan_text(self, user_prompt: str, max_tokens: int) -> str:
+        """Answer whichever prompt shape arrives: full plan, skeleton, reasons fragment or roadmap."""
+        course_ids = list(dict.fromkeys(COURSE_ID_PATTERN.findall(user_prompt)))
+        rng = random.Random(hashlib.sha256(",".join(course_ids).encode("utf-8")).hexdigest())
+        if '"reasons"' in user_prompt:
+            reasons = {course_id: " ".join(rng.choice(WORDS) for _ in range(self._reason_words)) for course_id in course_ids}
+            return json.dumps({"reasons": reasons}, ensure_ascii=False)[: max_tokens * 4]
+        if '"nodes"' not in user_prompt:
+            return ("## Roadmap\n" + " ".join(rng.choice(WORDS) for _ in range(250)))[: max_tokens * 4]
+        skeleton = '"reason"' not in user_prompt
+        nodes = []
+        for position, course_id in enumerate(course_ids):
+            lane = min(3, position * 4 // max(len(course_ids), 1))
+            nodes.append(
+                {
+                    "course_id": course_id,
+                    "title": course_id,
+                    "reason": " ".join(rng.choice(WORDS) for _ in range(self._reason_words)),
+                    "lane": lane,
+                    "order": sum(1 for node in nodes if node["lane"] == lane),
+                }
+            )
+            if skeleton:
+                del nodes[-1]["reason"]
+        plan = {
+            "name": "Ruta de aprendizaje sintética",
+            "description": " ".join(rng.choice(WORDS) for _ in range(60)),
+            "nodes": nodes,
+            "roadmap_text": "## Roadmap\n" + " ".join(rng.choice(WORDS) for _ in range(250)),
+            "estimated_weeks": 10,
+            "estimated_total_hours": 100,
+            "difficulty_progression": "beginner -> intermediate -> advanced",
+        }
+        if skeleton:
+            del plan["roadmap_text"]
+        return json.dumps(plan, ensure_ascii=False)[: max_tokens * 4]
+
+
+class FakeMongoDBClient(MongoDBClient):
+    """MongoDBClient on the local vector engine over a synthetic catalog, plus simulated latency."""
+
+    def __init__(self, catalog: Sequence[Dict[str, Any]], dimension: int, latency: Optional[LatencyModel] = None) -> None:
+        os.environ.setdefault("ATLAS_URI", "mongodb://benchmark.invalid")
+        super().__init__()
+        self._search_engine = "local"
+        self._local_index = LocalVectorIndex.from_documents(catalog, dimension)
+        self._latency = latency
+
+    def warm_up(self) -> None:
+        return None
+
+    def vector_search(self, query_embedding, limit, num_candidates, filters, deadline: Deadline = NO_DEADLINE):
+        if self._latency is not None:
+            self._latency.sleep()
+        return super().vector_search(query_embedding, limit, num_candidates, filters, deadline)
+
+    def vector_search_many(self, query_embeddings, limits, num_candidates, filters, deadline: Deadline = NO_DEADLINE):
+        if self._latency is not None:
+            self._latency.sleep()
+        return super().vector_search_many(query_embeddings, limits, num_candidates, filters, deadline)
+
+
+class SQLitePostgresClient:
+    """PostgresClient stand-in writing the same two tables to an in-memory SQLite database."""
+
+    def __init__(self, latency: Optional[LatencyModel] = None) -> None:
+        self._latency = latency
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(":memory:", check_same_thread=False)
+        self._conn.executescript(
+            """
+            CREATE TABLE user_learning_paths (
+                path_id TEXT PRIMARY KEY, user_id TEXT NOT NULL, name TEXT, description TEXT,
+                status TEXT, progress_percentage REAL, target_hours_per_week INTEGER,
+                target_completion_date TEXT, priority INTEGER, is_public INTEGER, mongodb_template_id TEXT
+            );
+            CREATE TABLE course_progress (
+                progress_id TEXT PRIMARY KEY, user_id TEXT NOT NULL, path_id TEXT NOT NULL,
+                mongodb_course_id TEXT NOT NULL, status TEXT, progress_percentage REAL, sequence_order INTEGER,
+                UNIQUE (path_id, mongodb_course_id)
+            );
+            """
+        )
+
+    def warm_up(self) -> None:
+        return None
+
+    def close(self) -> None:
+        return None
+
+    def persist_learning_path(
+        self,
+        user_id: str,
+        path_data: Dict[str, Any],
+        course_nodes: Sequence[Dict[str, Any]],
+        deadline: Deadline = NO_DEADLINE,
+    ) -> str:
+        deadline.check("persistence")
+        if self._latency is not None:
+            self._latency.sleep()
+        path_id = path_data.get("path_id", str(uuid.uuid4()))
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO user_learning_paths VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    path_id,
+                    user_id,
+                    path_data.get("name"),
+                    path_data.get("description"),
+                    path_data.get("status", "active"),
+                    float(path_data.get("progress_percentage", 0.0)),
+                    path_data.get("target_hours_per_week", 5),
+                    str(path_data.get("target_completion_date")),
+                    path_data.get("priority", 1),
+                    int(bool(path_data.get("is_public", False))),
+                    path_data.get("mongodb_template_id"),
+                ),
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO course_progress VALUES (?, ?, ?, ?, 'not_started', 0.0, ?)",
+                [
+                    (str(uuid.uuid4()), user_id, path_id, node.get("course_id"), sequence_order)
+                    for sequence_order, node in enumerate(course_nodes, start=1)
+                ],
+            )
+        return path_id
+
+    def persist_learning_paths(
+        self,
+        paths: Sequence[Tuple[str, Dict[str, Any], Sequence[Dict[str, Any]]]],
+        deadline: Deadline = NO_DEADLINE,
+    ) -> None:
+        """Idempotent batch write, as used by the persistence outbox."""
+        deadline.check("persistence")
+        if self._latency is not None:
+            self._latency.sleep()
+        with self._lock, self._conn:
+            for user_id, path_data, course_nodes in paths:
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO user_learning_paths VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        path_data["path_id"],
+                        user_id,
+                        path_data.get("name"),
+                        path_data.get("description"),
+                        path_data.get("status", "active"),
+                        float(path_data.get("progress_percentage", 0.0)),
+                        path_data.get("target_hours_per_week", 5),
+                        str(path_data.get("target_completion_date")),
+                        path_data.get("priority", 1),
+                        int(bool(path_data.get("is_public", False))),
+                        path_data.get("mongodb_template_id"),
+                    ),
+                )
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO course_progress VALUES (?, ?, ?, ?, 'not_started', 0.0, ?)",
+                    [
+                        (str(uuid.uuid4()), user_id, path_data["path_id"], node.get("course_id"), sequence_order)
+                        for sequence_order, node in enumerate(course_nodes, start=1)
+                    ],
+                )
+
+    def count_rows(self, table: str) -> int:
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
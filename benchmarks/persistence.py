@@ -0,0 +1,127 @@
+"""Persistence benchmark: PostgresClient write modes against a real PostgreSQL.
+
+Connects with the usual POSTGRES_* variables (point them at a local server), creates
+TEMP copies of ``user_learning_paths`` and ``course_progress`` on the benchmark
+connection (they shadow any real tables and vanish on exit) and times
+``persist_learning_path`` in each mode: ``statements`` (INSERT, execute_values, COMMIT),
+``single`` and ``single`` without prepared statements.
+
+    POSTGRES_HOST=localhost POSTGRES_PASSWORD=postgres python -m benchmarks.persistence --paths 500
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+import uuid
+from datetime import date, timedelta
+from typing import Any, Dict, List
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+from utils.postgres_client import PostgresClient  # noqa: E402
+
+MODES = (
+    ("statements", {"POSTGRES_PERSIST_MODE": "statements"}),
+    ("single", {"POSTGRES_PERSIST_MODE": "single", "POSTGRES_PREPARED_STATEMENTS": "true"}),
+    ("single_unprepared", {"POSTGRES_PERSIST_MODE": "single", "POSTGRES_PREPARED_STATEMENTS": "false"}),
+)
+
+TEMP_SCHEMA = """
+CREATE TEMP TABLE user_learning_paths (
+    path_id UUID PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    name TEXT,
+    description TEXT,
+    status TEXT,
+    progress_percentage NUMERIC(5, 2),
+    target_hours_per_week INTEGER,
+    target_completion_date DATE,
+    priority INTEGER,
+    is_public BOOLEAN,
+    mongodb_template_id TEXT
+);
+CREATE TEMP TABLE course_progress (
+    progress_id UUID PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    path_id UUID NOT NULL,
+    mongodb_course_id TEXT NOT NULL,
+    status TEXT,
+    progress_percentage NUMERIC(5, 2),
+    sequence_order INTEGER,
+    UNIQUE (path_id, mongodb_course_id)
+);
+"""
+
+
+def build_client(env: Dict[str, str]) -> PostgresClient:
+    # One connection per client, so the TEMP tables and prepared statement live on it
+    os.environ.update({"POSTGRES_POOL_MIN": "1", "POSTGRES_POOL_MAX": "1", **env})
+    client = PostgresClient()
+    with client.connection() as conn:
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute(TEMP_SCHEMA)
+    return client
+
+
+def path_payload(index: int) -> Dict[str, Any]:
+    return {
+        "path_id": str(uuid.uuid4()),
+        "name": f"Ruta de benchmark {index}",
+        "description": "Ruta generada por el benchmark de persistencia",
+        "status": "active",
+        "progress_percentage": 0.0,
+        "target_hours_per_week": 5,
+        "target_completion_date": date.today() + timedelta(weeks=12),
+        "priority": 3,
+        "is_public": False,
+    }
+
+
+def run_mode(client: PostgresClient, paths: int, courses: int) -> List[float]:
+    nodes = [{"course_id": f"course-{index:06d}"} for index in range(courses)]
+    timings = []
+    for index in range(paths):
+        start = time.perf_counter()
+        client.persist_learning_path(f"benchmark-user-{index % 50}", path_payload(index), nodes)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--paths", type=int, default=200)
+    parser.add_argument("--courses", type=int, default=8, help="course_progress rows per path")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    report: Dict[str, Dict[str, float]] = {}
+    for mode, env in MODES:
+        client = build_client(env)
+        run_mode(client, min(20, args.paths), args.courses)  # warm the connection and statement
+        timings = run_mode(client, args.paths, args.courses)
+        ordered = sorted(timings)
+        report[mode] = {
+            "p50_ms": round(statistics.median(timings), 3),
+            "p95_ms": round(ordered[min(len(ordered) - 1, round(0.95 * (len(ordered) - 1)))], 3),
+            "mean_ms": round(statistics.fmean(timings), 3),
+        }
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    baseline = report["statements"]["p50_ms"]
+    print(f"{args.paths} paths x {args.courses} courses")
+    print(f"{'mode':<20}{'p50 ms':>10}{'p95 ms':>10}{'mean ms':>10}{'vs statements':>16}")
+    for mode, values in report.items():
+        ratio = values["p50_ms"] / baseline if baseline else 0.0
+        print(f"{mode:<20}{values['p50_ms']:>10.3f}{values['p95_ms']:>10.3f}{values['mean_ms']:>10.3f}{ratio:>15.2f}x")
+
+
+if __name__ == "__main__":
+    main()
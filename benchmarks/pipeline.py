@@ -0,0 +1,270 @@
+"""Offline benchmark of LearningPathGenerator.handle with local service stand-ins.
+
+Bedrock, Atlas and RDS are replaced by the fakes in ``benchmarks/fakes.py``; every other
+line of the request path is production code. Each stage is timed by wrapping the method
+that implements it, a second pass measures allocations with tracemalloc, and results can
+be saved as a baseline and compared against later runs.
+
+    python -m benchmarks.pipeline --requests 200 --latency-scale 0 --save-baseline /tmp/base.json
+    python -m benchmarks.pipeline --requests 200 --latency-scale 0 --compare /tmp/base.json
+"""
+import argparse
+import functools
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("METRICS_SINK", "memory")
+
+import learning_path_generator  # noqa: E402
+
+from benchmarks.fakes import (  # noqa: E402
+    FakeBedrockClient,
+    FakeMongoDBClient,
+    LatencyModel,
+    SQLitePostgresClient,
+    synthetic_catalog,
+)
+
+# (stage, attribute holding the object, method); nested stages run inside another one:
+# "validation" in "request_parse", "filter" in "search", "response_mapping" in "response_render"
+STAGES: Tuple[Tuple[str, Optional[str], str], ...] = (
+    ("request_parse", None, "parse_request"),
+    ("validation", None, "_validate_request"),
+    ("embedding", None, "generate_embedding"),
+    ("search", "mongo_client", "_search_candidates"),
+    ("filter", "mongo_client", "_apply_filters"),
+    ("prompt_build", None, "_build_nova_prompts"),
+    ("nova", "bedrock", "invoke_nova"),
+    ("parse_validate", None, "_parse_nova_output"),
+    ("enrichment", None, "_build_nodes_with_metadata"),
+    ("persistence", None, "persist_learning_path"),
+    ("response_build", None, "build_response"),
+    ("response_render", None, "render_response"),
+    ("response_mapping", None, "map_to_frontend_format"),
+)
+NESTED_STAGES = {"validation", "filter", "response_mapping"}
+
+QUERIES = (
+    ("Quiero aprender Python desde cero para análisis de datos", "beginner", {"language": "es"}),
+    ("Convertirme en desarrollador full stack con React y Node.js", "intermediate", {}),
+    ("Especializarme en sistemas distribuidos y arquitectura cloud", "advanced", {"max_price": 80}),
+    ("Machine learning aplicado a problemas reales de negocio", "intermediate", {"preferred_platforms": ["Coursera", "edX"]}),
+    ("Diseño de interfaces y experiencia de usuario para apps móviles", "beginner", {}),
+)
+
+
+class StageRecorder:
+    def __init__(self) -> None:
+        self.timings: Dict[str, List[float]] = {}
+        self.allocations: Dict[str, List[int]] = {}
+        self.trace_allocations = False
+
+    def wrap(self, stage: str, func: Callable) -> Callable:
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            track = self.trace_allocations
+            if track:
+                before, _ = tracemalloc.get_traced_memory()
+                if stage not in NESTED_STAGES:
+                    tracemalloc.reset_peak()
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                if track:
+                    current, peak = tracemalloc.get_traced_memory()
+                    allocated = (peak if stage not in NESTED_STAGES else current) - before
+                    self.allocations.setdefault(stage, []).append(max(allocated, 0))
+                else:
+                    self.timings.setdefault(stage, []).append(elapsed_ms)
+
+        return timed
+
+
+def build_generator(args: argparse.Namespace, recorder: StageRecorder):
+    scale = args.latency_scale
+    catalog = synthetic_catalog(args.catalog_size, args.dimension)
+    bedrock = FakeBedrockClient(
+        args.dimension,
+        embedding_latency=LatencyModel(args.embedding_ms, scale=scale),
+        nova_first_token=LatencyModel(args.nova_first_token_ms, scale=scale),
+        nova_ms_per_token=args.nova_ms_per_token,
+        reason_words=args.reason_words,
+        latency_scale=scale,
+    )
+    mongo = FakeMongoDBClient(catalog, args.dimension, LatencyModel(args.search_ms, scale=scale))
+    postgres = SQLitePostgresClient(LatencyModel(args.persist_ms, scale=scale))
+    generator = learning_path_generator.LearningPathGenerator(bedrock, mongo, postgres)
+    for stage, owner, method in STAGES:
+        target = getattr(generator, owner) if owner else generator
+        setattr(target, method, recorder.wrap(stage, getattr(target, method)))
+    learning_path_generator.generator_instance = generator
+    return generator
+
+
+def make_event(index: int, num_courses: int) -> Dict[str, Any]:
+    query, level, preferences = QUERIES[index % len(QUERIES)]
+    return {
+        "requestContext": {"authorizer": {"claims": {"sub": f"benchmark-user-{index % 50}"}}},
+        "body": json.dumps(
+            {
+                "user_query": f"{query} (variante {index})",
+                "user_level": level,
+                "time_per_week": 5 + index % 10,
+                "num_courses": num_courses,
+                "preferences": preferences,
+                "response_format": "both",
+            }
+        ),
+    }
+
+
+def run_requests(count: int, num_courses: int, concurrency: int) -> Tuple[float, List[float], int]:
+    def invoke(index: int) -> Tuple[float, int]:
+        start = time.perf_counter()
+        response = learning_path_generator.lambda_handler(make_event(index, num_courses), None)
+        return (time.perf_counter() - start) * 1000, response["statusCode"]
+
+    start = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(invoke, range(count)))
+    else:
+        results = [invoke(index) for index in range(count)]
+    wall_s = time.perf_counter() - start
+    failures = sum(1 for _, status in results if status != 200)
+    return wall_s, [latency for latency, _ in results], failures
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(recorder: StageRecorder, wall_s: float, totals: List[float], failures: int) -> Dict[str, Any]:
+    stages = {}
+    for stage, _, _ in STAGES:
+        timings = recorder.timings.get(stage, [])
+        if not timings:
+            continue
+        allocations = recorder.allocations.get(stage, [])
+        mean_ms = statistics.fmean(timings)
+        stages[stage] = {
+            "calls": len(timings),
+            "p50_ms": round(statistics.median(timings), 4),
+            "p95_ms": round(percentile(timings, 95), 4),
+            "mean_ms": round(mean_ms, 4),
+            "ops_per_s": round(1000 / mean_ms, 1) if mean_ms else None,
+            "alloc_kb": round(statistics.fmean(allocations) / 1024, 1) if allocations else None,
+        }
+    return {
+        "requests": len(totals),
+        "failures": failures,
+        "throughput_rps": round(len(totals) / wall_s, 2) if wall_s else None,
+        "total_p50_ms": round(statistics.median(totals), 3),
+        "total_p95_ms": round(percentile(totals, 95), 3),
+        "stages": stages,
+    }
+
+
+def print_report(report: Dict[str, Any], baseline: Optional[Dict[str, Any]]) -> None:
+    print(
+        f"{report['requests']} requests, {report['failures']} failures, "
+        f"{report['throughput_rps']} req/s, total p50 {report['total_p50_ms']} ms / p95 {report['total_p95_ms']} ms"
+    )
+    header = f"{'stage':<18}{'p50 ms':>11}{'p95 ms':>11}{'ops/s':>11}{'alloc KB':>11}"
+    if baseline:
+        header += f"{'Δ p50':>12}"
+    print(header)
+    for stage, values in report["stages"].items():
+        line = (
+            f"{stage:<18}{values['p50_ms']:>11.3f}{values['p95_ms']:>11.3f}"
+            f"{values['ops_per_s'] or 0:>11.1f}{values['alloc_kb'] if values['alloc_kb'] is not None else '-':>11}"
+        )
+        previous = (baseline or {}).get("stages", {}).get(stage)
+        if previous and previous["p50_ms"]:
+            line += f"{(values['p50_ms'] / previous['p50_ms'] - 1) * 100:>+11.1f}%"
+        print(line)
+    if baseline and baseline.get("total_p50_ms"):
+        delta = (report["total_p50_ms"] / baseline["total_p50_ms"] - 1) * 100
+        print(f"total p50 vs baseline: {delta:+.1f}%")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--num-courses", type=int, default=8)
+    parser.add_argument("--concurrency", type=int, default=1, help="threads for the throughput pass")
+    parser.add_argument("--catalog-size", type=int, default=2000)
+    parser.add_argument("--dimension", type=int, default=1024)
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="0 = CPU only, no simulated I/O")
+    parser.add_argument("--embedding-ms", type=float, default=60.0)
+    parser.add_argument("--search-ms", type=float, default=40.0)
+    parser.add_argument("--nova-first-token-ms", type=float, default=600.0)
+    parser.add_argument("--nova-ms-per-token", type=float, default=8.0)
+    parser.add_argument("--reason-words", type=int, default=120)
+    parser.add_argument("--persist-ms", type=float, default=30.0)
+    parser.add_argument("--plan-cache", action="store_true", help="keep the Nova plan cache enabled")
+    parser.add_argument("--small-model", help="route small paths to this model id (NOVA_SMALL_MODEL)")
+    parser.add_argument("--no-allocations", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--save-baseline", help="write the report as JSON to this path")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--verbose", action="store_true", help="keep the generator's logging")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        # The request path logs its steps at CRITICAL; formatting them would dominate CPU-only runs
+        logging.disable(logging.CRITICAL)
+
+    if not args.plan_cache:
+        os.environ["NOVA_PLAN_CACHE_SIZE"] = "0"
+    if args.small_model:
+        os.environ["NOVA_SMALL_MODEL"] = args.small_model
+    recorder = StageRecorder()
+    build_generator(args, recorder)
+
+    run_requests(min(5, args.requests), args.num_courses, 1)  # warm caches and code paths
+    recorder.timings.clear()
+    wall_s, totals, failures = run_requests(args.requests, args.num_courses, args.concurrency)
+
+    if not args.no_allocations:
+        recorder.trace_allocations = True
+        tracemalloc.start()
+        run_requests(min(20, args.requests), args.num_courses, 1)
+        tracemalloc.stop()
+        recorder.trace_allocations = False
+
+    report = summarize(recorder, wall_s, totals, failures)
+    report["config"] = {
+        key: value for key, value in vars(args).items() if key not in {"save_baseline", "compare", "json", "verbose"}
+    }
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as handle:
+            baseline = json.load(handle)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report, baseline)
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
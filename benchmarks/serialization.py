@@ -0,0 +1,94 @@
+"""Microbenchmark of the request edge: parsing the event and serializing the response.
+
+Generates one path with the offline fakes, then times ``parse_request`` and, for each
+``response_format``, building the view(s) and encoding them with the stdlib defaults
+(``json.dumps``) versus ``utils.serialization.encode_json`` (orjson when installed).
+
+    python -m benchmarks.serialization --iterations 5000
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import timeit
+from typing import Any, Callable, Dict
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+os.environ.setdefault("METRICS_SINK", "memory")
+
+import learning_path_generator  # noqa: E402
+from utils import serialization  # noqa: E402
+
+from benchmarks.fakes import (  # noqa: E402
+    FakeBedrockClient,
+    FakeMongoDBClient,
+    LatencyModel,
+    SQLitePostgresClient,
+    synthetic_catalog,
+)
+from benchmarks.pipeline import make_event  # noqa: E402
+
+
+def time_us(func: Callable[[], Any], iterations: int, repeat: int) -> float:
+    return min(timeit.repeat(func, number=iterations, repeat=repeat)) / iterations * 1_000_000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--courses", type=int, default=10)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+    # The pipeline logs at CRITICAL; only the code under test should be timed
+    logging.disable(logging.CRITICAL)
+
+    instant = LatencyModel(0, scale=0)
+    generator = learning_path_generator.LearningPathGenerator(
+        FakeBedrockClient(256, embedding_latency=instant, nova_first_token=instant, latency_scale=0),
+        FakeMongoDBClient(synthetic_catalog(500, 256), 256, instant),
+        SQLitePostgresClient(instant),
+    )
+    event = make_event(1, args.courses)
+    result = generator.handle(event)
+
+    def stdlib_view(response_format: str) -> Dict[str, Any]:
+        if response_format == "frontend":
+            return generator.map_to_frontend_format(result)
+        if response_format == "both":
+            return {"backend": result, "frontend": generator.map_to_frontend_format(result)}
+        return result
+
+    report: Dict[str, Any] = {
+        "encoder": "orjson" if serialization.orjson is not None else "stdlib",
+        "parse_request_us": round(time_us(lambda: generator.parse_request(event), args.iterations, args.repeat), 2),
+        "formats": {},
+    }
+    for response_format in ("backend", "frontend", "both"):
+        stdlib_us = time_us(lambda: json.dumps(stdlib_view(response_format)), args.iterations, args.repeat)
+        render_us = time_us(lambda: generator.render_response(result, response_format), args.iterations, args.repeat)
+        report["formats"][response_format] = {
+            "json_dumps_us": round(stdlib_us, 2),
+            "render_response_us": round(render_us, 2),
+            "json_dumps_bytes": len(json.dumps(stdlib_view(response_format)).encode()),
+            "render_response_bytes": len(generator.render_response(result, response_format).encode()),
+        }
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"encoder: {report['encoder']}, parse_request: {report['parse_request_us']} us")
+    print(f"{'format':<10}{'json.dumps us':>15}{'render us':>12}{'speedup':>10}{'bytes before':>14}{'bytes after':>13}")
+    for response_format, values in report["formats"].items():
+        speedup = values["json_dumps_us"] / values["render_response_us"] if values["render_response_us"] else 0.0
+        print(
+            f"{response_format:<10}{values['json_dumps_us']:>15.2f}{values['render_response_us']:>12.2f}"
+            f"{speedup:>9.2f}x{values['json_dumps_bytes']:>14}{values['render_response_bytes']:>13}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Load test of the HTTP server mode: request throughput per worker count.
+
+Starts ``src/server.py`` in-process on a free port, with the generator built on the
+offline fakes, and sends ``--requests`` POST /generate-learning-path calls from
+``--clients`` concurrent connections for each value of ``--workers``. Reports req/s and
+latency percentiles; with simulated I/O latency throughput should grow with the workers
+until the client concurrency or the CPU is the limit.
+
+    python -m benchmarks.server --workers 1 2 4 8 16 --requests 200 --clients 32
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+os.environ.setdefault("METRICS_SINK", "memory")
+
+import learning_path_generator  # noqa: E402
+import server  # noqa: E402
+
+from benchmarks.fakes import (  # noqa: E402
+    FakeBedrockClient,
+    FakeMongoDBClient,
+    LatencyModel,
+    SQLitePostgresClient,
+    synthetic_catalog,
+)
+from benchmarks.pipeline import make_event  # noqa: E402
+
+
+def build_generator(args: argparse.Namespace):
+    scale = args.latency_scale
+    return learning_path_generator.LearningPathGenerator(
+        FakeBedrockClient(
+            args.dimension,
+            embedding_latency=LatencyModel(args.embedding_ms, scale=scale),
+            nova_first_token=LatencyModel(args.nova_first_token_ms, scale=scale),
+            latency_scale=scale,
+        ),
+        FakeMongoDBClient(synthetic_catalog(args.catalog_size, args.dimension), args.dimension, LatencyModel(args.search_ms, scale=scale)),
+        SQLitePostgresClient(LatencyModel(args.persist_ms, scale=scale)),
+    )
+
+
+def post(url: str, body: str) -> float:
+    start = time.perf_counter()
+    request = urllib.request.Request(url, data=body.encode("utf-8"), headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=120) as response:
+        response.read()
+        if response.status != 200:
+            raise RuntimeError(f"Unexpected status {response.status}")
+    return (time.perf_counter() - start) * 1000
+
+
+def run(args: argparse.Namespace, workers: int) -> Dict[str, Any]:
+    http_server = server.build_server("127.0.0.1", 0, workers)
+    thread = threading.Thread(target=http_server.serve_forever, daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{http_server.server_address[1]}{server.GENERATE_PATH}"
+    bodies = [make_event(index, args.num_courses)["body"] for index in range(args.requests)]
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.clients) as clients:
+            latencies: List[float] = list(clients.map(lambda body: post(url, body), bodies))
+        elapsed_s = time.perf_counter() - start
+    finally:
+        http_server.shutdown()
+        http_server.server_close()
+    latencies.sort()
+    return {
+        "workers": workers,
+        "requests_per_second": round(args.requests / elapsed_s, 2),
+        "p50_ms": round(statistics.median(latencies), 1),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--clients", type=int, default=32, help="concurrent client connections")
+    parser.add_argument("--num-courses", type=int, default=8)
+    parser.add_argument("--catalog-size", type=int, default=2000)
+    parser.add_argument("--dimension", type=int, default=1024)
+    parser.add_argument("--latency-scale", type=float, default=0.1, help="0 = CPU only, no simulated I/O")
+    parser.add_argument("--embedding-ms", type=float, default=60.0)
+    parser.add_argument("--search-ms", type=float, default=40.0)
+    parser.add_argument("--nova-first-token-ms", type=float, default=600.0)
+    parser.add_argument("--persist-ms", type=float, default=30.0)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+    # Every request must reach the (simulated) services
+    os.environ["NOVA_PLAN_CACHE_SIZE"] = "0"
+
+    learning_path_generator.generator_instance = build_generator(args)
+    results = [run(args, workers) for workers in args.workers]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    baseline = results[0]["requests_per_second"]
+    print(f"{'workers':>8}{'req/s':>10}{'scaling':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for result in results:
+        scaling = result["requests_per_second"] / baseline if baseline else 0.0
+        print(
+            f"{result['workers']:>8}{result['requests_per_second']:>10.2f}{scaling:>9.2f}x"
+            f"{result['p50_ms']:>10.1f}{result['p95_ms']:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,56 +1,91 @@
+import contextvars
+import dataclasses
 import json
 import logging
+import math
 import os
-
-# Configure logging IMMEDIATELY - BEFORE any other imports
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
-
-# Log IMMEDIATELY to prove Python is running
-print("=" * 80, flush=True)
-print("LAMBDA MODULE LOADING STARTED", flush=True)
-print("=" * 80, flush=True)
-logger.critical("========== CRITICAL: Module import starting ==========")
-
+import threading
 import time
 import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timezone, timedelta
-from typing import Any, Dict, List, Optional, Tuple
-
-logger.critical("Basic imports complete")
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
 
-import numpy as np
-logger.critical("NumPy imported")
-
-import boto3
-from botocore.exceptions import BotoCoreError, ClientError
-logger.critical("Boto3 imported")
-
-logger.info("About to import utils modules...")
+# Heavy SDKs (boto3, pymongo, psycopg2, numpy) are imported by the utils clients on first use
 from utils.bedrock_client import get_bedrock_client
-logger.critical("Bedrock client imported")
-
+from utils.deadline import NO_DEADLINE, Deadline, DeadlineExceeded
+from utils.fallback_planner import PLAN_SOURCE_FALLBACK, PLAN_SOURCE_PARTIAL, build_fallback_plan
+from utils.idempotency import (
+    IdempotencyKeyReusedError,
+    RequestInProgressError,
+    build_idempotency_guard,
+    idempotency_key,
+    request_fingerprint,
+)
+from utils.json_repair import RepairedJson, is_truncated_json, parse_json_object
+from utils.jobs import (
+    FINISHED_STATUSES,
+    JOB_FAILED,
+    JOB_QUEUED,
+    JOB_RUNNING,
+    JOB_SUCCEEDED,
+    Job,
+    SQLiteJobStore,
+    SQSJobQueue,
+    build_job_queue,
+    build_job_store,
+    job_progress,
+    report_job_stage,
+)
+from utils.json_stream import IncrementalNodesParser
+from utils.metrics import build_metrics_recorder
 from utils.mongodb_client import get_mongo_client
-logger.critical("MongoDB client imported")
-
+from utils.outbox import OutboxEntry, OutboxFlusher, SQLiteOutbox, build_outbox
+from utils.plan_cache import PlanCache, plan_cache_key
 from utils.postgres_client import get_postgres_client
-logger.critical("PostgreSQL client imported")
+from utils.prompt_encoder import build_prompt_encoder, estimate_tokens
+from utils.request_context import RequestContext
+from utils.resilience import CircuitOpenError, hedged, set_metrics_hook
+from utils.serialization import encode_json
+from utils.usage import UsageLedger, start_usage, usage_stage
 
-logger.critical("========== ALL IMPORTS SUCCESSFUL ==========")
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
 
 CORS_HEADERS = {
     "Access-Control-Allow-Origin": "https://www.learn-ia.app",
-    "Access-Control-Allow-Methods": "POST, OPTIONS",
-    "Access-Control-Allow-Headers": "Content-Type, Authorization",
+    "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
+    "Access-Control-Allow-Headers": "Content-Type, Authorization, Idempotency-Key",
     "Content-Type": "application/json",
 }
 
 ALLOWED_LEVELS = {"beginner", "intermediate", "advanced"}
 MIN_QUERY_LENGTH = 10
 MAX_QUERY_LENGTH = 500
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+EMBEDDING_CACHE_METRICS = {
+    "memory": "EmbeddingCacheMemoryHitCount",
+    "persistent": "EmbeddingCachePersistentHitCount",
+    "miss": "EmbeddingCacheMissCount",
+}
+NOVA_SYSTEM_PROMPT = (
+    "Eres un arquitecto de rutas de aprendizaje personalizado."
+    " Diseña recorridos pedagógicos eficientes y motivadores."
+)
+# Time kept for enrichment, persistence and the response when the fallback budget is cut by the deadline
+FALLBACK_RESERVE_S = 1.5
+# `persistence` of a response: written to PostgreSQL, accepted by the outbox (written later), or not saved
+PERSISTENCE_PERSISTED = "persisted"
+PERSISTENCE_PENDING = "pending"
+PERSISTENCE_FAILED = "failed"
+LANE_NAMES = {0: "Fundamentos", 1: "Core", 2: "Avanzado", 3: "Capstone"}
+LANE_GUIDE = """   - Lane 0 (Fundamentos): Conceptos básicos necesarios
+   - Lane 1 (Core): Conocimientos principales del objetivo
+   - Lane 2 (Avanzado): Especialización y profundización
+   - Lane 3 (Capstone): Proyecto integrador final"""
 
 
 class ValidationError(Exception):
@@ -58,86 +93,433 @@ class ValidationError(Exception):
 
 
 class LearningPathGenerator:
-    def __init__(self) -> None:
+    def __init__(self, bedrock=None, mongo_client=None, postgres_client=None) -> None:
+        # Clients can be injected (benchmarks, local stand-ins); by default the shared singletons are used
         logger.info("Initializing LearningPathGenerator...")
-        logger.info("Getting Bedrock client...")
-        self.bedrock = get_bedrock_client()
-        logger.info("Bedrock client initialized")
-        
-        logger.info("Getting MongoDB client...")
-        self.mongo_client = get_mongo_client()
-        logger.info("MongoDB client initialized")
-        
-        logger.info("Getting PostgreSQL client...")
-        self.postgres_client = get_postgres_client()
-        logger.info("PostgreSQL client initialized")
+        self.bedrock = bedrock or get_bedrock_client()
+        self.mongo_client = mongo_client or get_mongo_client()
+        self.postgres_client = postgres_client or get_postgres_client()
         
-        logger.info("Creating CloudWatch client...")
-        self.cloudwatch = boto3.client("cloudwatch", region_name="us-east-2")
-        logger.info("CloudWatch client initialized")
+        self.metrics = build_metrics_recorder()
+        # Circuit breaker transitions, exhausted retry budgets and hedges land in the same per-request buffer
+        set_metrics_hook(self._emit_metric)
+        self.warm_up_executor: Optional[ThreadPoolExecutor] = None
+        if os.getenv("PARALLEL_WARM_UP", "false").lower() == "true":
+            self.warm_up_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="warm-up")
+        # Warm-up runs on the first request and after an idle gap this long (a thawed container)
+        self.warm_up_idle_s = int(os.getenv("WARM_UP_IDLE_SECONDS", "300"))
+        self._last_request_at: Optional[float] = None
+        self._warm_up_lock = threading.Lock()
         
         self.max_courses = int(os.getenv("MAX_COURSES_IN_PATH", "10"))
         self.min_courses = int(os.getenv("MIN_COURSES_IN_PATH", "3"))
         self.default_weeks = int(os.getenv("DEFAULT_WEEKS_ESTIMATE", "12"))
+        self.plan_cache = PlanCache(
+            int(os.getenv("NOVA_PLAN_CACHE_SIZE", "256")),
+            int(os.getenv("NOVA_PLAN_CACHE_TTL_SECONDS", "3600")),
+        )
+        self.prompt_encoder = build_prompt_encoder()
+        # Two-phase generation: skeleton plan first, then reasons and roadmap as concurrent Nova calls
+        self.nova_executor: Optional[ThreadPoolExecutor] = None
+        if os.getenv("NOVA_TWO_PHASE", "false").lower() == "true":
+            self.nova_executor = ThreadPoolExecutor(
+                max_workers=int(os.getenv("NOVA_FRAGMENT_CONCURRENCY", "6")),
+                thread_name_prefix="nova",
+            )
+        self.reasons_per_call = int(os.getenv("NOVA_REASONS_PER_CALL", "3"))
+        # Hard ceiling on Nova latency: past it the local fallback plan is returned (0 disables)
+        self.nova_fallback_after_s = int(os.getenv("NOVA_FALLBACK_AFTER_MS", "0")) / 1000
+        # Output tokens allowed for finishing a response cut at maxTokens (0 disables the continuation call)
+        self.nova_continuation_tokens = int(os.getenv("NOVA_CONTINUATION_MAX_TOKENS", "1024"))
+        # Duplicate requests (client retries after the API Gateway timeout) reuse the first response
+        self.idempotency = build_idempotency_guard(self.postgres_client, self._is_replayable)
+        self.derive_idempotency_keys = os.getenv("IDEMPOTENCY_DERIVE_KEYS", "false").lower() == "true"
+        # Write-behind persistence: the response only waits for the outbox, not for RDS
+        self.outbox = build_outbox()
+        self.outbox_flusher: Optional[OutboxFlusher] = None
+        if isinstance(self.outbox, SQLiteOutbox):
+            self.outbox_flusher = OutboxFlusher(
+                self.outbox,
+                self.postgres_client.persist_learning_paths,
+                batch_size=int(os.getenv("OUTBOX_BATCH_SIZE", "25")),
+                interval_s=int(os.getenv("OUTBOX_FLUSH_INTERVAL_MS", "500")) / 1000,
+            )
+        # Async mode: POST ?mode=async stores a job and queues it; GET /jobs/{id} reports its progress
+        self.job_queue = build_job_queue(self.run_job)
+        self.job_store = build_job_store(self.postgres_client) if self.job_queue is not None else None
+        if isinstance(self.job_queue, SQSJobQueue) and isinstance(self.job_store, SQLiteJobStore) and os.getenv("AWS_LAMBDA_FUNCTION_NAME"):
+            # The worker runs in other containers, which cannot see this container's /tmp
+            logger.error(json.dumps({"event": "job_queue_disabled", "error": "the sqs job queue needs JOB_STORE_BACKEND=postgres on Lambda"}))
+            self.job_queue, self.job_store = None, None
+        # Batch generation (batch_handler): bounded fan-out per stage and bulk writes
+        self.batch_max_requests = int(os.getenv("BATCH_MAX_REQUESTS", "500"))
+        self.batch_embedding_concurrency = int(os.getenv("BATCH_EMBEDDING_CONCURRENCY", "8"))
+        self.batch_search_concurrency = int(os.getenv("BATCH_SEARCH_CONCURRENCY", "8"))
+        self.batch_nova_concurrency = int(os.getenv("BATCH_NOVA_CONCURRENCY", "4"))
+        self.batch_persist_size = int(os.getenv("BATCH_PERSIST_SIZE", "100"))
         logger.info("LearningPathGenerator initialization complete")
 
-    def handle(self, event: Dict[str, Any]) -> Dict[str, Any]:
+    def handle(self, event: Dict[str, Any], deadline: Deadline = NO_DEADLINE) -> Dict[str, Any]:
+        return self.run_request(self.parse_request(event), deadline)[0]
+
+    def run_request(self, request: RequestContext, deadline: Deadline = NO_DEADLINE) -> Tuple[Dict[str, Any], bool]:
+        """Generate the path at most once per idempotency key: (response, replayed from an earlier request)."""
+        if self.idempotency is None:
+            return self.handle_request(request, deadline), False
+        fingerprint = request_fingerprint(request)
+        key = idempotency_key(request, fingerprint, self.derive_idempotency_keys)
+        if key is None:
+            return self.handle_request(request, deadline), False
+        return self.idempotency.run(
+            key, request.user_id, fingerprint, lambda: self.handle_request(request, deadline), deadline
+        )
+
+    def _is_replayable(self, response: Dict[str, Any]) -> bool:
+        """Only a complete answer is stored for replay: a Nova plan already in PostgreSQL or durably in the outbox.
+
+        A ``pending`` path keeps its path_id and the outbox write is idempotent on it, so
+        replaying it cannot duplicate the path; regenerating it would.
+        """
+        return response.get("plan_source") == "nova" and response.get("persistence") in (
+            PERSISTENCE_PERSISTED,
+            PERSISTENCE_PENDING,
+        )
+
+    def handle_request(self, request: RequestContext, deadline: Deadline = NO_DEADLINE) -> Dict[str, Any]:
         logger.critical("========== HANDLE METHOD STARTED ==========")
         total_start = time.time()
-        
-        logger.critical("Step 1: Extracting user_id...")
-        user_id = self._extract_user_id(event)
-        logger.critical(f"User ID extracted: {user_id}")
-        
-        logger.critical("Step 2: Parsing body...")
+        warm_ups = self._start_warm_up()
+        try:
+            return self._run_pipeline(request, warm_ups, total_start, deadline)
+        finally:
+            self._cancel_warm_up(warm_ups)
+
+    def submit_job(self, request: RequestContext) -> Job:
+        """Store the validated request as a queued job and hand it to the job queue."""
+        if self.job_queue is None or self.job_store is None:
+            raise ValidationError("El modo asíncrono no está habilitado")
+        job = Job.new(request.user_id, dataclasses.asdict(request))
+        self.job_store.create(job)
+        try:
+            self.job_queue.submit(job.job_id)
+        except Exception:
+            self.job_store.update(job.job_id, status=JOB_FAILED, stage=JOB_FAILED, error={"status": 503, "error": "No se pudo encolar el trabajo"})
+            raise
+        self._emit_metric("JobSubmittedCount", 1)
+        logger.info(json.dumps({"event": "job_submitted", "job_id": job.job_id, "user_id": request.user_id}))
+        return job
+
+    def run_job(self, job_id: str, deadline: Deadline = NO_DEADLINE, final_attempt: bool = False) -> bool:
+        """Worker side of async mode: run the stored request and record its outcome.
+
+        Returns False when the job should be retried later (a dependency circuit is open);
+        the job is then back in ``queued``. On the ``final_attempt`` (the queue will not
+        deliver it again) it fails instead, so it cannot stay pending forever. Jobs already
+        finished are skipped, so a redelivered message does not generate the path twice.
+        """
+        job = self.job_store.get(job_id) if self.job_store is not None else None
+        if job is None:
+            logger.error(json.dumps({"event": "job_not_found", "job_id": job_id}))
+            return True
+        if job.status in FINISHED_STATUSES:
+            return True
+        request = RequestContext(**job.request)
+        self.job_store.update(job_id, status=JOB_RUNNING, attempts=job.attempts + 1)
+        usage = start_usage()
+        self.metrics.start_request()
+        error: Optional[Dict[str, Any]] = None
+        try:
+            with job_progress(self.job_store, job):
+                result, _ = self.run_request(request, deadline)
+        except CircuitOpenError as exc:
+            if final_attempt:
+                error = {"status": 503, "error": "Servicio temporalmente no disponible, intenta de nuevo en unos segundos"}
+            else:
+                logger.warning(json.dumps({"event": "job_deferred", "job_id": job_id, "dependency": exc.dependency}))
+                self.job_store.update(job_id, status=JOB_QUEUED)
+                self.flush_metrics()
+                return False
+        except ValidationError as exc:
+            error = {"status": 400, "error": str(exc)}
+        except DeadlineExceeded:
+            error = {"status": 504, "error": "La generación de la ruta excedió el tiempo disponible"}
+        except Exception as exc:  # noqa: BLE001
+            logger.error(json.dumps({"event": "job_unhandled_error", "job_id": job_id, "error": str(exc)}))
+            error = {"status": 500, "error": "Error interno del servidor"}
+        finally:
+            self.report_usage(usage)
+        if error is not None:
+            self.fail_job(job_id, error)
+        else:
+            stages = {**job.stages, JOB_SUCCEEDED: job.elapsed_ms()}
+            self.job_store.update(job_id, status=JOB_SUCCEEDED, stage=JOB_SUCCEEDED, stages=stages, result=result)
+        status = JOB_FAILED if error is not None else JOB_SUCCEEDED
+        self._emit_metric("JobCompletedCount", 1, {"Status": status})
+        self._emit_metric("JobTotalTimeMs", job.elapsed_ms())
+        logger.info(json.dumps({"event": "job_finished", "job_id": job_id, "status": status, "bedrock_usage": usage.summary()}))
+        self.flush_metrics()
+        return True
+
+    def fail_job(self, job_id: str, error: Dict[str, Any]) -> None:
+        """Record a job as finished with ``error`` (``{"status": ..., "error": ...}``)."""
+        self.job_store.update(job_id, status=JOB_FAILED, stage=JOB_FAILED, error=error)
+
+    def job_status_for_event(self, event: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """GET /jobs/{job_id}: the caller's job status, or None for unknown ids and other users' jobs."""
+        job_id = (event.get("pathParameters") or {}).get("job_id")
+        if not job_id:
+            return None
+        # Outside API Gateway (local runs) the owner comes from ?user_id=, like user_id in the POST body
+        user_id = self._extract_user_id(event, event.get("queryStringParameters") or {})
+        return self.job_status(job_id, user_id)
+
+    def job_status(self, job_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """Progress of a job owned by ``user_id`` (with the path once it succeeded), or None."""
+        job = self.job_store.get(job_id) if self.job_store is not None else None
+        if job is None or job.user_id != user_id:
+            return None
+        view = job.status_view()
+        if job.status == JOB_SUCCEEDED and job.result is not None:
+            view["result"] = self.response_view(job.result, job.request.get("response_format", "backend"))
+        return view
+
+    def generate_batch(self, requests: Sequence[RequestContext], deadline: Deadline = NO_DEADLINE) -> Dict[str, Any]:
+        """Generate many paths stage by stage, sharing work across the batch.
+
+        Embeddings run once per distinct query and searches once per distinct query, size
+        and filters, all in one matrix product when the local index is loaded. Nova runs
+        once per distinct plan (same courses, level and hours, as in the plan cache). Each
+        stage fans out with bounded concurrency and paths are written in bulk transactions.
+        A failure only fails the requests that depend on it: ``results`` holds, in input
+        order, ``{"status": 200, "path": ...}`` or ``{"status": 4xx/5xx, "error": ...}``.
+        """
+        start = time.time()
+        stages_ms: Dict[str, int] = {}
+        errors: Dict[int, BaseException] = {}
+
+        stage_start = time.time()
+        queries = list(dict.fromkeys(request.user_query for request in requests))
+        embeddings = self._batch_map(
+            lambda query: self.generate_embedding(query, deadline), queries, self.batch_embedding_concurrency
+        )
+        stages_ms["embedding"] = int((time.time() - stage_start) * 1000)
+
+        stage_start = time.time()
+        search_keys: Dict[int, str] = {}
+        searches: Dict[str, Tuple[List[float], int, Dict[str, Any]]] = {}
+        for index, request in enumerate(requests):
+            embedding = embeddings[request.user_query]
+            if isinstance(embedding, BaseException):
+                errors[index] = embedding
+                continue
+            filters = self._search_filters(request)
+            key = json.dumps([request.user_query, request.num_courses, filters], sort_keys=True, default=str)
+            search_keys[index] = key
+            searches.setdefault(key, (embedding, request.num_courses, filters))
+        found = self._batch_search(searches, deadline)
+        stages_ms["search"] = int((time.time() - stage_start) * 1000)
+
+        stage_start = time.time()
+        plan_keys: Dict[int, Tuple[str, List[Dict[str, Any]]]] = {}
+        plans: Dict[str, Tuple[RequestContext, List[Dict[str, Any]]]] = {}
+        for index, key in search_keys.items():
+            courses = found[key]
+            if isinstance(courses, BaseException):
+                errors[index] = courses
+                continue
+            if len(courses) < self.min_courses:
+                errors[index] = ValidationError("No se encontraron suficientes cursos relevantes para generar la ruta solicitada")
+                continue
+            request = requests[index]
+            plan_key = plan_cache_key((course["course_id"] for course in courses), request.user_level, request.time_per_week)
+            plan_keys[index] = (plan_key, courses)
+            plans.setdefault(plan_key, (request, courses))
+        nova_responses = self._batch_map(
+            lambda plan_key: self.orchestrate_with_nova(
+                plans[plan_key][0].user_query,
+                plans[plan_key][0].user_level,
+                plans[plan_key][0].time_per_week,
+                plans[plan_key][1],
+                deadline,
+            ),
+            list(plans),
+            self.batch_nova_concurrency,
+        )
+        stages_ms["nova"] = int((time.time() - stage_start) * 1000)
+
+        stage_start = time.time()
+        pending: List[Tuple[int, Dict[str, Any], List[Dict[str, Any]], Dict[str, Any], int, int]] = []
+        for index, (plan_key, courses) in plan_keys.items():
+            nova_response = nova_responses[plan_key]
+            if isinstance(nova_response, BaseException):
+                errors[index] = nova_response
+                continue
+            try:
+                enriched_nodes, path_data, estimated_weeks, estimated_total_hours = self._plan_path(
+                    requests[index], nova_response, courses
+                )
+            except ValidationError as exc:
+                errors[index] = exc
+                continue
+            path_data["path_id"] = str(uuid.uuid4())
+            pending.append((index, nova_response, enriched_nodes, path_data, estimated_weeks, estimated_total_hours))
+        persisted = self._batch_persist(
+            [(requests[item[0]].user_id, item[3], self._ordered_nodes(item[2])) for item in pending], deadline
+        )
+        stages_ms["persistence"] = int((time.time() - stage_start) * 1000)
+
+        results: List[Dict[str, Any]] = [{} for _ in requests]
+        for (index, nova_response, enriched_nodes, path_data, weeks, total_hours), saved in zip(pending, persisted):
+            request = requests[index]
+            response = self.build_response(
+                path_data["path_id"],
+                request,
+                nova_response,
+                enriched_nodes,
+                PERSISTENCE_PERSISTED if saved else PERSISTENCE_FAILED,
+                weeks,
+                total_hours,
+            )
+            results[index] = {"status": 200, "path": self.response_view(response, request.response_format)}
+            self._emit_metric("PathsGeneratedCount", 1, {"UserLevel": request.user_level})
+        for index, exc in errors.items():
+            results[index] = self._batch_error(exc)
+
+        elapsed_s = time.time() - start
+        succeeded = len(pending)
+        summary = {
+            "requests": len(requests),
+            "succeeded": succeeded,
+            "failed": len(requests) - succeeded,
+            # Generated but not written (their chunk's transaction failed)
+            "unsaved": persisted.count(False),
+            "distinct_queries": len(queries),
+            "distinct_searches": len(searches),
+            "nova_plans": len(plans),
+            "elapsed_ms": int(elapsed_s * 1000),
+            "paths_per_second": round(succeeded / elapsed_s, 2) if elapsed_s > 0 else 0.0,
+            "stages_ms": stages_ms,
+        }
+        self._emit_metric("BatchRequestCount", len(requests))
+        self._emit_metric("BatchFailedCount", summary["failed"])
+        self._emit_metric("BatchTotalTimeMs", summary["elapsed_ms"])
+        self._emit_metric("BatchPathsPerSecond", summary["paths_per_second"])
+        return {"results": results, "summary": summary}
+
+    def _batch_map(self, func: Callable[[Any], Any], items: Sequence[Any], concurrency: int) -> Dict[Any, Any]:
+        """``func(item)`` for each distinct item on up to ``concurrency`` threads; exceptions are returned, not raised."""
+        if not items:
+            return {}
+        results: Dict[Any, Any] = {}
+        with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(items))), thread_name_prefix="batch") as pool:
+            # Each task runs in a copy of this context so Bedrock usage lands in the batch ledger
+            futures = {item: pool.submit(contextvars.copy_context().run, func, item) for item in items}
+            for item, future in futures.items():
+                try:
+                    results[item] = future.result()
+                except Exception as exc:  # noqa: BLE001
+                    results[item] = exc
+        return results
+
+    def _batch_search(
+        self,
+        searches: Dict[str, Tuple[List[float], int, Dict[str, Any]]],
+        deadline: Deadline = NO_DEADLINE,
+    ) -> Dict[str, Any]:
+        keys = list(searches)
+        if not keys or not self.mongo_client.supports_search_many():
+            return self._batch_map(
+                lambda key: self.search_relevant_courses(*searches[key], deadline), keys, self.batch_search_concurrency
+            )
+        start = time.time()
+        try:
+            found = self.mongo_client.vector_search_many(
+                [searches[key][0] for key in keys],
+                [searches[key][1] for key in keys],
+                [self._num_candidates(searches[key][1]) for key in keys],
+                [searches[key][2] for key in keys],
+                deadline,
+            )
+        except Exception as exc:  # noqa: BLE001
+            return {key: exc for key in keys}
+        self._emit_metric("VectorSearchTimeMs", int((time.time() - start) * 1000))
+        return dict(zip(keys, found))
+
+    def _batch_persist(
+        self,
+        paths: List[Tuple[str, Dict[str, Any], List[Dict[str, Any]]]],
+        deadline: Deadline = NO_DEADLINE,
+    ) -> List[bool]:
+        """Write paths in transactions of BATCH_PERSIST_SIZE; a failed chunk leaves its paths unpersisted."""
+        persisted: List[bool] = []
+        for offset in range(0, len(paths), self.batch_persist_size):
+            chunk = paths[offset : offset + self.batch_persist_size]
+            start = time.time()
+            try:
+                self.postgres_client.persist_learning_paths(chunk, deadline)
+            except Exception as exc:  # noqa: BLE001
+                logger.error(json.dumps({"event": "batch_persist_failed", "paths": len(chunk), "error": str(exc)}))
+                self._emit_metric("PostgresPersistenceFailedCount", len(chunk))
+                persisted.extend([False] * len(chunk))
+                continue
+            self._emit_metric("PostgresPersistenceTimeMs", int((time.time() - start) * 1000))
+            persisted.extend([True] * len(chunk))
+        return persisted
+
+    def _batch_error(self, exc: BaseException) -> Dict[str, Any]:
+        if isinstance(exc, ValidationError):
+            return {"status": 400, "error": str(exc)}
+        if isinstance(exc, DeadlineExceeded):
+            return {"status": 504, "error": "La generación de la ruta excedió el tiempo disponible"}
+        if isinstance(exc, CircuitOpenError):
+            return {"status": 503, "error": "Servicio temporalmente no disponible, intenta de nuevo en unos segundos"}
+        logger.error(json.dumps({"event": "batch_item_failed", "error": str(exc)}))
+        return {"status": 500, "error": "Error interno del servidor"}
+
+    def parse_request(self, event: Dict[str, Any]) -> RequestContext:
+        """Parse and validate the event body once; the context is what the rest of the request reads."""
+        logger.critical("Step 1: Parsing body...")
         body = self._parse_body(event)
         logger.critical(f"Body parsed successfully")
         
+        logger.critical("Step 2: Extracting user_id...")
+        user_id = self._extract_user_id(event, body)
+        logger.critical(f"User ID extracted: {user_id}")
+        
         logger.critical("Step 3: Validating request...")
         self._validate_request(body)
+        key = self._extract_idempotency_key(event, body)
         logger.critical("Request validated")
         
+        request = RequestContext.from_payload(user_id, body, key)
         logger.info(
             json.dumps(
                 {
                     "event": "path_generation_started",
                     "user_id": user_id,
-                    "user_query": body["user_query"],
-                    "num_courses": body["num_courses"],
+                    "user_query": request.user_query,
+                    "num_courses": request.num_courses,
                 }
             )
         )
-        
-        logger.critical("Step 4: Generating embedding...")
-        embedding_start = time.time()
-        embedding = self.generate_embedding(body["user_query"])
-        embedding_time_ms = int((time.time() - embedding_start) * 1000)
-        logger.critical(f"Embedding generated in {embedding_time_ms}ms")
-        self._emit_metric("EmbeddingGenerationTimeMs", embedding_time_ms)
-        
-        logger.critical("Step 5: Searching relevant courses...")
-        search_start = time.time()
-        courses = self.search_relevant_courses(
-            embedding,
-            body["num_courses"],
-            {
-                "user_level": body["user_level"],
-                "max_price": body.get("preferences", {}).get("max_price"),
-                "language": body.get("preferences", {}).get("language"),
-                "preferred_platforms": body.get("preferences", {}).get("preferred_platforms"),
-            },
-        )
-        search_time_ms = int((time.time() - search_start) * 1000)
-        logger.critical(f"Course search completed in {search_time_ms}ms. Found {len(courses)} courses")
-        
-        if len(courses) < self.min_courses:
-            raise ValidationError("No se encontraron suficientes cursos relevantes para generar la ruta solicitada")
+        return request
+
+    def _run_pipeline(
+        self,
+        request: RequestContext,
+        warm_ups: Dict[str, Future],
+        total_start: float,
+        deadline: Deadline = NO_DEADLINE,
+    ) -> Dict[str, Any]:
+        courses = self._find_courses(request, warm_ups, deadline)
+        report_job_stage("nova")
         nova_start = time.time()
         nova_response = self.orchestrate_with_nova(
-            body["user_query"],
-            body["user_level"],
-            body["time_per_week"],
+            request.user_query,
+            request.user_level,
+            request.time_per_week,
             courses,
+            deadline,
         )
         nova_time_ms = int((time.time() - nova_start) * 1000)
         self._emit_metric("NovaOrchestrationTimeMs", nova_time_ms)
@@ -150,92 +532,512 @@ class LearningPathGenerator:
                 }
             )
         )
-        enriched_nodes = self._build_nodes_with_metadata(nova_response["nodes"], courses)
-        persist_start = time.time()
-        estimated_weeks = self._safe_positive_int(nova_response.get("estimated_weeks"), self.default_weeks)
-        estimated_total_hours = self._safe_positive_int(
-            nova_response.get("estimated_total_hours"),
-            estimated_weeks * body["time_per_week"],
-        )
-        target_completion_date = datetime.now(timezone.utc) + timedelta(weeks=estimated_weeks)
+        return self._finalize_path(request, nova_response, courses, warm_ups, total_start, deadline=deadline)
 
-        path_id, persisted = self.persist_learning_path(
-            user_id,
-            {
-                "name": nova_response["name"],
-                "description": nova_response["description"],
-                "status": "active",
-                "progress_percentage": 0.0,
-                "target_hours_per_week": body["time_per_week"],
-                "target_completion_date": target_completion_date.date(),
-                "priority": 3,
-                "is_public": False,
-            },
-            enriched_nodes,
+    def _find_courses(
+        self,
+        request: RequestContext,
+        warm_ups: Dict[str, Future],
+        deadline: Deadline = NO_DEADLINE,
+    ) -> List[Dict[str, Any]]:
+        logger.critical("Step 4: Generating embedding...")
+        report_job_stage("embedding")
+        embedding_start = time.time()
+        embedding = self.generate_embedding(request.user_query, deadline)
+        embedding_time_ms = int((time.time() - embedding_start) * 1000)
+        logger.critical(f"Embedding generated in {embedding_time_ms}ms")
+        self._emit_metric("EmbeddingGenerationTimeMs", embedding_time_ms)
+        
+        logger.critical("Step 5: Searching relevant courses...")
+        report_job_stage("search")
+        self._await_warm_up(warm_ups, "mongo")
+        search_start = time.time()
+        courses = self.search_relevant_courses(embedding, request.num_courses, self._search_filters(request), deadline)
+        search_time_ms = int((time.time() - search_start) * 1000)
+        logger.critical(f"Course search completed in {search_time_ms}ms. Found {len(courses)} courses")
+        
+        if len(courses) < self.min_courses:
+            raise ValidationError("No se encontraron suficientes cursos relevantes para generar la ruta solicitada")
+        return courses
+
+    def _search_filters(self, request: RequestContext) -> Dict[str, Any]:
+        return {
+            "user_level": request.user_level,
+            "max_price": request.max_price,
+            "language": request.language,
+            "preferred_platforms": request.preferred_platforms,
+        }
+
+    def _finalize_path(
+        self,
+        request: RequestContext,
+        nova_response: Dict[str, Any],
+        courses: List[Dict[str, Any]],
+        warm_ups: Dict[str, Future],
+        total_start: float,
+        path_id: Optional[str] = None,
+        deadline: Deadline = NO_DEADLINE,
+    ) -> Dict[str, Any]:
+        enriched_nodes, path_data, estimated_weeks, estimated_total_hours = self._plan_path(
+            request, nova_response, courses
         )
+        report_job_stage("persistence")
+        self._await_warm_up(warm_ups, "postgres")
+        persist_start = time.time()
+        if path_id:
+            path_data["path_id"] = path_id
+        path_id, persistence = self.persist_learning_path(request.user_id, path_data, enriched_nodes, deadline)
         persistence_ms = int((time.time() - persist_start) * 1000)
         self._emit_metric("PostgresPersistenceTimeMs", persistence_ms)
         response = self.build_response(
             path_id,
-            user_id,
-            body,
+            request,
             nova_response,
             enriched_nodes,
-            persisted,
+            persistence,
             estimated_weeks,
             estimated_total_hours,
         )
         total_time_ms = int((time.time() - total_start) * 1000)
-        self._emit_metric("TotalGenerationTimeMs", total_time_ms)
+        level_dimension = {"UserLevel": request.user_level}
+        self._emit_metric("TotalGenerationTimeMs", total_time_ms, level_dimension)
         self._emit_metric("CoursesInPath", len(enriched_nodes))
-        self._emit_metric("PathsGeneratedCount", 1)
+        self._emit_metric("PathsGeneratedCount", 1, level_dimension)
         return response
 
-    def generate_embedding(self, text: str) -> List[float]:
-        embedding = self.bedrock.generate_embedding(text)
-        vector = np.array(embedding, dtype=float)
-        norm = np.linalg.norm(vector)
+    def _plan_path(
+        self,
+        request: RequestContext,
+        nova_response: Dict[str, Any],
+        courses: List[Dict[str, Any]],
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, Any], int, int]:
+        """(enriched nodes, path row, estimated weeks, estimated total hours) for a Nova plan."""
+        enriched_nodes = self._build_nodes_with_metadata(nova_response["nodes"], courses)
+        estimated_weeks = self._safe_positive_int(nova_response.get("estimated_weeks"), self.default_weeks)
+        estimated_total_hours = self._safe_positive_int(
+            nova_response.get("estimated_total_hours"),
+            estimated_weeks * request.time_per_week,
+        )
+        target_completion_date = datetime.now(timezone.utc) + timedelta(weeks=estimated_weeks)
+
+        path_data: Dict[str, Any] = {
+            "name": nova_response["name"],
+            "description": nova_response["description"],
+            "status": "active",
+            "progress_percentage": 0.0,
+            "target_hours_per_week": request.time_per_week,
+            "target_completion_date": target_completion_date.date(),
+            "priority": 3,
+            "is_public": False,
+        }
+        return enriched_nodes, path_data, estimated_weeks, estimated_total_hours
+
+    def _start_warm_up(self) -> Dict[str, Future]:
+        """Open Mongo and Postgres connections while the embedding is generated on this thread.
+
+        Only on a cold container or after WARM_UP_IDLE_SECONDS without requests (a thaw,
+        when idle connections may have been dropped). A warm container skips it: its
+        connections exist, and pinging on every request would queue requests behind each
+        other's pings on the two warm-up threads.
+        """
+        if self.warm_up_executor is None:
+            return {}
+        with self._warm_up_lock:
+            now = time.monotonic()
+            idle = self._last_request_at is None or now - self._last_request_at >= self.warm_up_idle_s
+            self._last_request_at = now
+        if not idle:
+            return {}
+        return {
+            "mongo": self.warm_up_executor.submit(self.mongo_client.warm_up),
+            "postgres": self.warm_up_executor.submit(self.postgres_client.warm_up),
+        }
+
+    def _await_warm_up(self, warm_ups: Dict[str, Future], name: str) -> None:
+        # Joining before first use avoids opening a second connection next to the warm-up's
+        future = warm_ups.pop(name, None)
+        if future is None:
+            return
+        try:
+            future.result()
+        except Exception as exc:  # noqa: BLE001
+            # The stage itself will retry the connection and surface its own error
+            logger.warning(json.dumps({"event": "warm_up_failed", "dependency": name, "error": str(exc)}))
+
+    def _cancel_warm_up(self, warm_ups: Dict[str, Future]) -> None:
+        for future in warm_ups.values():
+            future.cancel()
+
+    def generate_embedding(self, text: str, deadline: Deadline = NO_DEADLINE) -> List[float]:
+        embedding, cache_tier = self.bedrock.generate_embedding_with_tier(text, deadline)
+        self._emit_metric(EMBEDDING_CACHE_METRICS[cache_tier], 1)
+        norm = math.sqrt(math.fsum(value * value for value in embedding))
         if not norm:
             raise ValueError("Embedding norm is zero")
-        normalized = (vector / norm).tolist()
-        return normalized
+        return [value / norm for value in embedding]
 
     def search_relevant_courses(
         self,
         query_embedding: List[float],
         num_results: int,
         filters: Dict[str, Any],
+        deadline: Deadline = NO_DEADLINE,
     ) -> List[Dict[str, Any]]:
         start = time.time()
-        num_candidates = min(self.max_courses * 10, max(num_results, self.min_courses) * 10)
-        courses = self.mongo_client.vector_search(query_embedding, num_results, num_candidates, filters)
+        courses = self.mongo_client.vector_search(
+            query_embedding, num_results, self._num_candidates(num_results), filters, deadline
+        )
         duration_ms = int((time.time() - start) * 1000)
         self._emit_metric("VectorSearchTimeMs", duration_ms)
         return courses
 
+    def _num_candidates(self, num_results: int) -> int:
+        # Upper bound; with ADAPTIVE_CANDIDATES the Mongo client plans a smaller request from observed selectivity
+        return min(self.max_courses * 10, max(num_results, self.min_courses) * 10)
+
     def orchestrate_with_nova(
         self,
         user_query: str,
         user_level: str,
         time_per_week: int,
         courses: List[Dict[str, Any]],
+        deadline: Deadline = NO_DEADLINE,
+    ) -> Dict[str, Any]:
+        cache_key = plan_cache_key((course["course_id"] for course in courses), user_level, time_per_week)
+        cached_plan = self.plan_cache.get(cache_key)
+        if cached_plan is not None:
+            self._emit_metric("NovaPlanCacheHitCount", 1)
+            logger.info(json.dumps({"event": "nova_plan_cache_hit", "cache_key": cache_key}))
+            return cached_plan
+        if self.nova_fallback_after_s > 0:
+            return self._orchestrate_with_fallback(cache_key, user_query, user_level, time_per_week, courses, deadline)
+        return self._orchestrate_uncached(cache_key, user_query, user_level, time_per_week, courses, deadline)
+
+    def _orchestrate_uncached(
+        self,
+        cache_key: str,
+        user_query: str,
+        user_level: str,
+        time_per_week: int,
+        courses: List[Dict[str, Any]],
+        deadline: Deadline = NO_DEADLINE,
+    ) -> Dict[str, Any]:
+        if self.nova_executor is not None:
+            parsed = self._orchestrate_two_phase(user_query, user_level, time_per_week, courses, deadline)
+            self._remember_plan(cache_key, parsed)
+            return parsed
+        system_prompt, user_prompt = self._build_nova_prompts(user_query, user_level, time_per_week, courses)
+        try:
+            raw_response = self.bedrock.invoke_nova(
+                system_prompt, user_prompt, deadline=deadline, expected_items=len(courses)
+            )
+        except Exception as exc:  # noqa: BLE001
+            logger.error(json.dumps({"event": "nova_invoke_failed", "error": str(exc)}))
+            raise
+        self._report_prompt_tokens(system_prompt, user_prompt, (raw_response or {}).get("usage"))
+        text_output = self._extract_text_from_nova(raw_response)
+        text_output = self._continue_truncated_output(system_prompt, user_prompt, text_output, len(courses), deadline)
+        parsed = self._parse_nova_output(text_output, courses, (user_query, user_level, time_per_week))
+        if parsed.get("plan_source") != PLAN_SOURCE_PARTIAL:
+            self._remember_plan(cache_key, parsed)
+        return parsed
+
+    def _orchestrate_with_fallback(
+        self,
+        cache_key: str,
+        user_query: str,
+        user_level: str,
+        time_per_week: int,
+        courses: List[Dict[str, Any]],
+        deadline: Deadline = NO_DEADLINE,
+    ) -> Dict[str, Any]:
+        """Nova hedged by the local planner: past the budget (or on any Nova error) the fallback plan is used.
+
+        The fallback runs on this thread, so a busy hedge pool cannot delay it. A Nova call that
+        loses the race keeps running (unless it was still queued) and still lands in the plan cache.
+        """
+
+        def fallback() -> Dict[str, Any]:
+            return build_fallback_plan(user_query, user_level, time_per_week, courses)
+
+        budget_s = min(self.nova_fallback_after_s, max(deadline.remaining() - FALLBACK_RESERVE_S, 0.0))
+        try:
+            plan = hedged(
+                lambda: self._orchestrate_uncached(cache_key, user_query, user_level, time_per_week, courses, deadline),
+                fallback,
+                budget_s,
+                "nova",
+                deadline,
+            )
+            reason = "timeout"
+        except Exception as exc:  # noqa: BLE001
+            logger.warning(json.dumps({"event": "nova_failed_using_fallback", "error": str(exc)}))
+            plan = fallback()
+            reason = "error"
+        if plan.get("plan_source") == PLAN_SOURCE_FALLBACK:
+            self._emit_metric("NovaFallbackCount", 1, {"Reason": reason})
+            logger.warning(json.dumps({"event": "nova_fallback_plan", "reason": reason, "budget_ms": int(budget_s * 1000)}))
+        return plan
+
+    def orchestrate_with_nova_stream(
+        self,
+        user_query: str,
+        user_level: str,
+        time_per_week: int,
+        courses: List[Dict[str, Any]],
+        deadline: Deadline = NO_DEADLINE,
+    ) -> Iterator[Tuple[str, Any]]:
+        """Yield ("node", node) as soon as each node is complete, then ("plan", full_response)."""
+        cache_key = plan_cache_key((course["course_id"] for course in courses), user_level, time_per_week)
+        cached_plan = self.plan_cache.get(cache_key)
+        if cached_plan is not None:
+            self._emit_metric("NovaPlanCacheHitCount", 1)
+            for node in cached_plan["nodes"]:
+                yield "node", node
+            yield "plan", cached_plan
+            return
+        valid_ids = {course["course_id"] for course in courses}
+        system_prompt, user_prompt = self._build_nova_prompts(user_query, user_level, time_per_week, courses)
+        self._report_prompt_tokens(system_prompt, user_prompt, None)
+        parser = IncrementalNodesParser()
+        first_node_ms: Optional[int] = None
+        start = time.time()
+        try:
+            for delta in self.bedrock.invoke_nova_stream(
+                system_prompt, user_prompt, deadline=deadline, expected_items=len(courses)
+            ):
+                for node in parser.feed(delta):
+                    self._validate_nova_node(node, valid_ids)
+                    if first_node_ms is None:
+                        first_node_ms = int((time.time() - start) * 1000)
+                        self._emit_metric("NovaTimeToFirstCourseMs", first_node_ms)
+                    yield "node", node
+        except ValidationError:
+            raise
+        except Exception as exc:  # noqa: BLE001
+            logger.error(json.dumps({"event": "nova_stream_failed", "error": str(exc)}))
+            raise
+        parsed = self._parse_nova_output(parser.text, courses, (user_query, user_level, time_per_week))
+        if parsed.get("plan_source") != PLAN_SOURCE_PARTIAL:
+            self._remember_plan(cache_key, parsed)
+        yield "plan", parsed
+
+    def stream_learning_path(self, event: Dict[str, Any], deadline: Deadline = NO_DEADLINE) -> Iterator[Dict[str, Any]]:
+        """Generate a path as a sequence of partial results: header, each course, then roadmap and summary."""
+        total_start = time.time()
+        request = self.parse_request(event)
+        warm_ups = self._start_warm_up()
+        try:
+            courses = self._find_courses(request, warm_ups, deadline)
+            path_id = str(uuid.uuid4())
+            yield {
+                "type": "header",
+                "path_id": path_id,
+                "user_id": request.user_id,
+                "user_query": request.user_query,
+                "num_courses": len(courses),
+            }
+            courses_by_id = {course["course_id"]: course for course in courses}
+            nova_start = time.time()
+            nova_response: Dict[str, Any] = {}
+            for kind, payload in self.orchestrate_with_nova_stream(
+                request.user_query,
+                request.user_level,
+                request.time_per_week,
+                courses,
+                deadline,
+            ):
+                if kind == "node":
+                    node = {**courses_by_id[payload["course_id"]], **payload}
+                    yield {"type": "course", "course": self._response_course(node)}
+                else:
+                    nova_response = payload
+            self._emit_metric("NovaOrchestrationTimeMs", int((time.time() - nova_start) * 1000))
+            response = self._finalize_path(
+                request, nova_response, courses, warm_ups, total_start, path_id, deadline
+            )
+            yield {"type": "roadmap", "roadmap_text": response["roadmap_text"]}
+            yield {"type": "complete", "path": response}
+        finally:
+            self._cancel_warm_up(warm_ups)
+
+    def _build_nova_prompts(
+        self,
+        user_query: str,
+        user_level: str,
+        time_per_week: int,
+        courses: List[Dict[str, Any]],
+    ) -> Tuple[str, str]:
+        courses_payload = [self._project_course_for_prompt(course) for course in courses]
+        courses_block, format_note = self.prompt_encoder.encode(courses_payload)
+        user_prompt = self._build_nova_prompt(user_query, user_level, time_per_week, courses_block, format_note)
+        return NOVA_SYSTEM_PROMPT, user_prompt
+
+    def _orchestrate_two_phase(
+        self,
+        user_query: str,
+        user_level: str,
+        time_per_week: int,
+        courses: List[Dict[str, Any]],
+        deadline: Deadline = NO_DEADLINE,
     ) -> Dict[str, Any]:
+        """Skeleton (lanes, order, estimates) first; then reasons per lane group and the roadmap in parallel.
+
+        Wall-clock time is the skeleton plus the slowest fragment instead of one long serial output.
+        """
         courses_payload = [self._project_course_for_prompt(course) for course in courses]
-        user_prompt = self._build_nova_prompt(user_query, user_level, time_per_week, courses_payload)
-        system_prompt = (
-            "Eres un arquitecto de rutas de aprendizaje personalizado."
-            " Diseña recorridos pedagógicos eficientes y motivadores."
+        courses_block, format_note = self.prompt_encoder.encode(courses_payload)
+        start = time.time()
+        with usage_stage("nova_skeleton"):
+            skeleton = self._invoke_nova_json(
+                self._build_skeleton_prompt(user_query, user_level, time_per_week, courses_block, format_note),
+                512 + 48 * len(courses),
+                deadline,
+                len(courses),
+            )
+        self._emit_metric("NovaSkeletonTimeMs", int((time.time() - start) * 1000))
+        payload_by_id = {course["course_id"]: course for course in courses_payload}
+        nodes = skeleton.get("nodes")
+        if not isinstance(nodes, list) or not nodes:
+            raise ValidationError("La respuesta de Nova debe incluir una lista de nodos")
+        for node in nodes:
+            self._validate_node_placement(node, set(payload_by_id))
+
+        start = time.time()
+        # Fragments run in a copy of this context so their usage lands in this request's ledger
+        with usage_stage("nova_roadmap"):
+            roadmap_future = self.nova_executor.submit(
+                contextvars.copy_context().run,
+                self._invoke_nova_text,
+                self._build_roadmap_prompt(user_query, user_level, time_per_week, skeleton, payload_by_id),
+                2048,
+                deadline,
+                len(nodes),
+            )
+        with usage_stage("nova_reasons"):
+            reason_futures = [
+                self.nova_executor.submit(
+                    contextvars.copy_context().run,
+                    self._invoke_nova_json,
+                    self._build_reasons_prompt(user_query, user_level, skeleton.get("name", ""), group, payload_by_id),
+                    320 * len(group) + 64,
+                    deadline,
+                    len(group),
+                )
+                for group in self._reason_groups(nodes)
+            ]
+        reasons: Dict[str, Any] = {}
+        for future in reason_futures:
+            fragment = future.result().get("reasons")
+            if isinstance(fragment, dict):
+                reasons.update(fragment)
+        skeleton["roadmap_text"] = self._strip_code_fences(roadmap_future.result())
+        fragments_ms = int((time.time() - start) * 1000)
+        self._emit_metric("NovaFragmentsTimeMs", fragments_ms)
+        logger.info(
+            json.dumps(
+                {"event": "nova_two_phase_completed", "fragments": len(reason_futures) + 1, "fragments_ms": fragments_ms}
+            )
         )
+
+        for node in nodes:
+            node["reason"] = reasons.get(node.get("course_id"))
+        self._validate_nova_response(skeleton, set(payload_by_id))
+        return skeleton
+
+    def _reason_groups(self, nodes: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """Nodes grouped by lane, split so no call writes more than reasons_per_call reasons."""
+        by_lane: Dict[int, List[Dict[str, Any]]] = {}
+        for node in sorted(nodes, key=lambda item: (item["lane"], item["order"])):
+            by_lane.setdefault(node["lane"], []).append(node)
+        size = max(1, self.reasons_per_call)
+        return [lane_nodes[i : i + size] for lane_nodes in by_lane.values() for i in range(0, len(lane_nodes), size)]
+
+    def _invoke_nova_text(
+        self,
+        user_prompt: str,
+        max_tokens: int,
+        deadline: Deadline = NO_DEADLINE,
+        expected_items: Optional[int] = None,
+    ) -> str:
         try:
-            raw_response = self.bedrock.invoke_nova(system_prompt, user_prompt)
-        except (ClientError, BotoCoreError, ValueError) as exc:
+            raw_response = self.bedrock.invoke_nova(
+                NOVA_SYSTEM_PROMPT, user_prompt, max_tokens, deadline=deadline, expected_items=expected_items
+            )
+        except Exception as exc:  # noqa: BLE001
             logger.error(json.dumps({"event": "nova_invoke_failed", "error": str(exc)}))
             raise
-        text_output = self._extract_text_from_nova(raw_response)
+        self._report_prompt_tokens(NOVA_SYSTEM_PROMPT, user_prompt, (raw_response or {}).get("usage"))
+        return self._extract_text_from_nova(raw_response)
+
+    def _invoke_nova_json(
+        self,
+        user_prompt: str,
+        max_tokens: int,
+        deadline: Deadline = NO_DEADLINE,
+        expected_items: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        return self._load_nova_json(self._invoke_nova_text(user_prompt, max_tokens, deadline, expected_items))
+
+    def _report_prompt_tokens(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        usage: Optional[Dict[str, Any]],
+    ) -> None:
+        # Estimated size of what we send vs what Bedrock billed, per prompt encoding
+        estimated = estimate_tokens(f"{system_prompt}\n\n{user_prompt}")
+        dimensions = {"PromptEncoding": self.prompt_encoder.encoding}
+        self._emit_metric("NovaPromptEstimatedTokens", estimated, dimensions)
+        input_tokens = (usage or {}).get("inputTokens")
+        if input_tokens is not None:
+            self._emit_metric("NovaInputTokens", input_tokens, dimensions)
+        logger.info(
+            json.dumps(
+                {
+                    "event": "nova_prompt_tokens",
+                    "encoding": self.prompt_encoder.encoding,
+                    "estimated_tokens": estimated,
+                    "input_tokens": input_tokens,
+                }
+            )
+        )
+
+    def _parse_nova_output(
+        self,
+        text_output: str,
+        courses: List[Dict[str, Any]],
+        request: Optional[Tuple[str, str, int]] = None,
+    ) -> Dict[str, Any]:
+        """Parse Nova's plan, salvaging a truncated one when ``request`` (query, level, hours/week) is given.
+
+        From a truncated plan only the fully written nodes are kept; top-level fields cut off
+        after them are filled from the local planner and the plan is marked as partial.
+        """
+        valid_ids = {course["course_id"] for course in courses}
+        result = self._repair_nova_json(text_output)
+        parsed = result.value
+        if result.truncated and request is not None:
+            nodes = parsed.get("nodes") if isinstance(parsed.get("nodes"), list) else []
+            parsed["nodes"] = [node for node in nodes if self._is_complete_node(node, valid_ids)]
+            if parsed["nodes"]:
+                fallback = build_fallback_plan(request[0], request[1], request[2], courses)
+                for field in ("name", "description", "roadmap_text", "estimated_weeks", "estimated_total_hours"):
+                    if not isinstance(parsed.get(field), (str, int)) or parsed.get(field) == "":
+                        parsed[field] = fallback[field]
+                parsed["plan_source"] = PLAN_SOURCE_PARTIAL
+                logger.warning(json.dumps({"event": "nova_partial_plan", "nodes_salvaged": len(parsed["nodes"])}))
+        self._validate_nova_response(parsed, valid_ids)
+        return parsed
+
+    def _load_nova_json(self, text_output: str) -> Dict[str, Any]:
+        return self._repair_nova_json(text_output).value
+
+    def _repair_nova_json(self, text_output: str) -> RepairedJson:
         cleaned = self._strip_code_fences(text_output)
         try:
-            parsed = json.loads(cleaned)
-        except json.JSONDecodeError as exc:
+            result = parse_json_object(cleaned)
+        except ValueError as exc:
             logger.error(
                 json.dumps(
                     {
@@ -246,23 +1048,78 @@ class LearningPathGenerator:
                 )
             )
             raise ValueError("La respuesta del orquestador Nova no es JSON válido")
-        self._validate_nova_response(parsed, {course["course_id"] for course in courses})
-        return parsed
+        if result.repaired:
+            self._emit_metric("NovaJsonRepairedCount", 1, {"Truncated": str(result.truncated).lower()})
+            logger.warning(json.dumps({"event": "nova_json_repaired", "truncated": result.truncated}))
+        return result
+
+    def _continue_truncated_output(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        text_output: str,
+        expected_items: Optional[int] = None,
+        deadline: Deadline = NO_DEADLINE,
+    ) -> str:
+        """Ask Nova to finish a cut-off answer (prefilled with what it already wrote) instead of regenerating it.
+
+        ``expected_items`` must be the first call's, so the continuation is routed to the same
+        model tier as the text it continues.
+        """
+        if self.nova_continuation_tokens <= 0 or not is_truncated_json(text_output):
+            return text_output
+        prefix = text_output.rstrip()
+        self._emit_metric("NovaContinuationCount", 1)
+        try:
+            with usage_stage("nova_continuation"):
+                raw_response = self.bedrock.invoke_nova(
+                    system_prompt,
+                    user_prompt,
+                    self.nova_continuation_tokens,
+                    deadline=deadline,
+                    assistant_prefix=prefix,
+                    expected_items=expected_items,
+                )
+            continuation = self._extract_text_from_nova(raw_response)
+        except DeadlineExceeded:
+            raise
+        except Exception as exc:  # noqa: BLE001
+            # What was already generated may still be salvageable
+            logger.warning(json.dumps({"event": "nova_continuation_failed", "error": str(exc)}))
+            return text_output
+        return prefix + continuation
+
+    def _is_complete_node(self, node: Any, valid_ids: set[str]) -> bool:
+        try:
+            self._validate_nova_node(node, valid_ids)
+        except ValidationError:
+            return False
+        return True
+
+    def _remember_plan(self, cache_key: str, plan: Dict[str, Any]) -> None:
+        self.plan_cache.put(cache_key, plan)
+        if self.plan_cache.enabled:
+            self._emit_metric("NovaPlanCacheMissCount", 1)
 
     def persist_learning_path(
         self,
         user_id: str,
         path_data: Dict[str, Any],
         courses_data: List[Dict[str, Any]],
-    ) -> Tuple[str, bool]:
-        ordered_courses = sorted(
-            courses_data,
-            key=lambda item: (item.get("lane", 0), item.get("order", 0)),
-        )
+        deadline: Deadline = NO_DEADLINE,
+    ) -> Tuple[str, str]:
+        """Write the path (or hand it to the outbox); return its id and the ``persistence`` status."""
+        ordered_courses = self._ordered_nodes(courses_data)
         safe_path_data = {**path_data}
         fallback_path_id = safe_path_data.get("path_id", str(uuid.uuid4()))
+        if self.outbox is not None:
+            queued_path_data = {**safe_path_data, "path_id": fallback_path_id}
+            if self._enqueue_path(user_id, queued_path_data, ordered_courses):
+                return fallback_path_id, PERSISTENCE_PENDING
         try:
-            persisted_path_id = self.postgres_client.persist_learning_path(user_id, safe_path_data, ordered_courses)
+            persisted_path_id = self.postgres_client.persist_learning_path(
+                user_id, safe_path_data, ordered_courses, deadline
+            )
         except Exception as exc:  # noqa: BLE001
             logger.error(
                 json.dumps(
@@ -275,48 +1132,50 @@ class LearningPathGenerator:
                 )
             )
             self._emit_metric("PostgresPersistenceFailedCount", 1)
-            return fallback_path_id, False
-        return persisted_path_id, True
+            return fallback_path_id, PERSISTENCE_FAILED
+        return persisted_path_id, PERSISTENCE_PERSISTED
+
+    def _ordered_nodes(self, courses_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return sorted(courses_data, key=lambda item: (item.get("lane", 0), item.get("order", 0)))
+
+    def _enqueue_path(self, user_id: str, path_data: Dict[str, Any], courses_data: List[Dict[str, Any]]) -> bool:
+        """Durably queue the path for the flusher; False means the caller should write it synchronously."""
+        entry = OutboxEntry(path_data["path_id"], user_id, path_data, [course.get("course_id") for course in courses_data])
+        try:
+            self.outbox.enqueue(entry)
+        except Exception as exc:  # noqa: BLE001
+            logger.error(json.dumps({"event": "outbox_enqueue_failed", "path_id": entry.path_id, "error": str(exc)}))
+            self._emit_metric("OutboxEnqueueFailedCount", 1)
+            return False
+        self._emit_metric("OutboxEnqueuedCount", 1)
+        if self.outbox_flusher is not None:
+            self.outbox_flusher.kick()
+        return True
 
     def build_response(
         self,
         path_id: str,
-        user_id: str,
-        request_payload: Dict[str, Any],
+        request: RequestContext,
         nova_response: Dict[str, Any],
         courses: List[Dict[str, Any]],
-        persisted: bool,
+        persistence: str,
         estimated_weeks: Optional[int] = None,
         estimated_total_hours: Optional[int] = None,
     ) -> Dict[str, Any]:
         created_at = datetime.now(timezone.utc).isoformat()
         nodes = sorted(courses, key=lambda item: (item.get("lane", 0), item.get("order", 0)))
-        response_courses = []
-        for node in nodes:
-            response_courses.append(
-                {
-                    "course_id": node.get("course_id"),
-                    "title": node.get("title"),
-                    "platform": node.get("platform"),
-                    "url": node.get("url"),
-                    "rating": node.get("rating"),
-                    "duration": node.get("duration"),
-                    "lane": node.get("lane", 0),
-                    "order": node.get("order", 0),
-                    "reason": node.get("reason"),
-                }
-            )
+        response_courses = [self._response_course(node) for node in nodes]
         safe_weeks = estimated_weeks if estimated_weeks is not None else self._safe_positive_int(
             nova_response.get("estimated_weeks"),
             self.default_weeks,
         )
         safe_total_hours = estimated_total_hours if estimated_total_hours is not None else self._safe_positive_int(
             nova_response.get("estimated_total_hours"),
-            safe_weeks * request_payload["time_per_week"],
+            safe_weeks * request.time_per_week,
         )
         response = {
             "path_id": path_id,
-            "user_id": user_id,
+            "user_id": request.user_id,
             "name": nova_response.get("name"),
             "description": nova_response.get("description"),
             "courses": response_courses,
@@ -326,11 +1185,38 @@ class LearningPathGenerator:
             "difficulty_progression": nova_response.get("difficulty_progression", ""),
             "created_at": created_at,
             "status": "active",
-            "user_query": request_payload.get("user_query"),
-            "persisted": persisted,
+            "user_query": request.user_query,
+            # True only once the row is in PostgreSQL; an outbox write is "pending" until then
+            "persisted": persistence == PERSISTENCE_PERSISTED,
+            "persistence": persistence,
+            "plan_source": nova_response.get("plan_source", "nova"),
         }
         return response
     
+    def _response_course(self, node: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "course_id": node.get("course_id"),
+            "title": node.get("title"),
+            "platform": node.get("platform"),
+            "url": node.get("url"),
+            "rating": node.get("rating"),
+            "duration": node.get("duration"),
+            "lane": node.get("lane", 0),
+            "order": node.get("order", 0),
+            "reason": node.get("reason"),
+        }
+
+    def render_response(self, result: Dict[str, Any], response_format: str = "backend") -> str:
+        """Serializa la vista pedida (`backend`, `frontend` o ambas) de la ruta generada."""
+        return encode_json(self.response_view(result, response_format))
+
+    def response_view(self, result: Dict[str, Any], response_format: str = "backend") -> Dict[str, Any]:
+        if response_format == "frontend":
+            return self.map_to_frontend_format(result)
+        if response_format == "both":
+            return {"backend": result, "frontend": self.map_to_frontend_format(result)}
+        return result
+
     def map_to_frontend_format(self, backend_response: Dict[str, Any]) -> Dict[str, Any]:
         """
         Mapea la respuesta del backend al formato esperado por el frontend.
@@ -365,6 +1251,7 @@ class LearningPathGenerator:
         estimacion = f"{estimated_weeks} semanas"
         
         persisted = backend_response.get("persisted", True)
+        persistence = backend_response.get("persistence", PERSISTENCE_PERSISTED if persisted else PERSISTENCE_FAILED)
         total_hours = backend_response.get("estimated_total_hours")
         created_at = backend_response.get("created_at", datetime.now(timezone.utc).isoformat())
         
@@ -381,6 +1268,7 @@ class LearningPathGenerator:
             "promptOriginal": backend_response.get("user_query", ""),
             "persisted": persisted,
             "guardado": persisted,
+            "persistence": persistence,
             "estimated_total_hours": total_hours,
             "horasEstimadas": total_hours,
             "created_at": created_at,
@@ -413,28 +1301,48 @@ class LearningPathGenerator:
             enriched.append(merged)
         return enriched
 
-    def _emit_metric(self, name: str, value: float) -> None:
-        try:
-            self.cloudwatch.put_metric_data(
-                Namespace="LearnIA/Lambda/LearningPathGenerator",
-                MetricData=[
-                    {
-                        "MetricName": name,
-                        "Timestamp": datetime.now(timezone.utc),
-                        "Value": float(value),
-                        "Unit": "Milliseconds" if name.endswith("Ms") else "Count",
-                    }
-                ],
-            )
-        except (ClientError, BotoCoreError) as exc:
-            logger.warning(json.dumps({"event": "cloudwatch_metric_failed", "metric": name, "error": str(exc)}))
+    def close(self) -> None:
+        """Finish background work and release connections before the process exits (HTTP server mode)."""
+        if self.job_queue is not None:
+            self.job_queue.close()
+        if self.outbox_flusher is not None:
+            self.outbox_flusher.drain()
+        for executor in (self.warm_up_executor, self.nova_executor):
+            if executor is not None:
+                executor.shutdown(wait=True)
+        self.flush_metrics()
+        self.mongo_client.close()
+        self.postgres_client.close()
 
-    def _extract_user_id(self, event: Dict[str, Any]) -> str:
+    def _emit_metric(self, name: str, value: float, dimensions: Optional[Dict[str, str]] = None) -> None:
+        # Buffered; published once per request by flush_metrics()
+        self.metrics.record(name, value, dimensions)
+
+    def flush_metrics(self) -> None:
+        self.metrics.flush()
+
+    def report_usage(self, usage: UsageLedger) -> None:
+        """Token, retry and cost metrics for the Bedrock calls of one request."""
+        for call in usage.calls:
+            self._emit_metric("BedrockInputTokens", call.input_tokens, {"Stage": call.stage})
+            if call.output_tokens:
+                self._emit_metric("BedrockOutputTokens", call.output_tokens, {"Stage": call.stage})
+                if call.generation_ms > 0:
+                    model_dimension = {"Model": call.model}
+                    self._emit_metric("NovaOutputTokensPerSecond", call.output_tokens * 1000 / call.generation_ms, model_dimension)
+                    self._emit_metric("NovaOutputTokenLatencyMs", call.generation_ms / call.output_tokens, model_dimension)
+            if call.attempts > 1:
+                self._emit_metric("BedrockRetryCount", call.attempts - 1, {"Stage": call.stage})
+        if usage.calls:
+            # Micro-dollars keep the value integral for CloudWatch statistics
+            cost_usd = sum(call.cost_usd for call in usage.calls)
+            self._emit_metric("BedrockEstimatedCostMicroUsd", round(cost_usd * 1_000_000, 2))
+
+    def _extract_user_id(self, event: Dict[str, Any], body: Dict[str, Any]) -> str:
         try:
             return event["requestContext"]["authorizer"]["claims"]["sub"]
         except KeyError:
             pass
-        body = self._parse_body(event)
         user_id = body.get("user_id")
         
         if not user_id:
@@ -443,13 +1351,23 @@ class LearningPathGenerator:
         
         return user_id
 
+    def _extract_idempotency_key(self, event: Dict[str, Any], body: Dict[str, Any]) -> Optional[str]:
+        headers = event.get("headers") or {}
+        key = next((value for name, value in headers.items() if name.lower() == "idempotency-key"), None)
+        key = key or body.get("idempotency_key")
+        if key is None:
+            return None
+        if not isinstance(key, str) or not 1 <= len(key) <= MAX_IDEMPOTENCY_KEY_LENGTH:
+            raise ValidationError(f"Idempotency-Key debe ser un texto de 1 a {MAX_IDEMPOTENCY_KEY_LENGTH} caracteres")
+        return key
+
     def _parse_body(self, event: Dict[str, Any]) -> Dict[str, Any]:
         body = event.get("body")
         if body is None:
             raise ValidationError("El cuerpo de la solicitud es requerido")
         if isinstance(body, str):
             try:
-                return json.loads(body)
+                body = json.loads(body)
             except json.JSONDecodeError as exc:
                 raise ValidationError("El cuerpo de la solicitud debe ser JSON válido") from exc
         if isinstance(body, dict):
@@ -488,9 +1406,10 @@ class LearningPathGenerator:
         user_query: str,
         user_level: str,
         time_per_week: int,
-        courses: List[Dict[str, Any]],
+        courses_block: str,
+        format_note: str = "",
     ) -> str:
-        courses_json = json.dumps(courses, ensure_ascii=False, indent=2)
+        courses_section = f"{format_note}\n{courses_block}" if format_note else courses_block
         prompt = f"""
 Eres un experto diseñador de rutas de aprendizaje educativas.
 
@@ -499,15 +1418,12 @@ NIVEL ACTUAL: {user_level}
 TIEMPO DISPONIBLE: {time_per_week} horas/semana
 
 CURSOS DISPONIBLES (ordenados por relevancia semántica):
-{courses_json}
+{courses_section}
 
 TAREA:
 1. Analiza cada curso y determina su rol en la ruta de aprendizaje
 2. Organízalos en 4 lanes de progresión:
-   - Lane 0 (Fundamentos): Conceptos básicos necesarios
-   - Lane 1 (Core): Conocimientos principales del objetivo
-   - Lane 2 (Avanzado): Especialización y profundización
-   - Lane 3 (Capstone): Proyecto integrador final
+{LANE_GUIDE}
 
 3. Para cada curso genera:
    - reason: Explicación detallada de por qué es relevante (100-150 palabras en español)
@@ -549,6 +1465,138 @@ IMPORTANTE:
 - Los course_id deben coincidir exactamente con los IDs de MongoDB
 - El roadmap_text debe estar en español y usar formato markdown
 - Las explicaciones (reason) deben ser motivadoras y específicas
+"""
+        return prompt.strip()
+
+    def _build_skeleton_prompt(
+        self,
+        user_query: str,
+        user_level: str,
+        time_per_week: int,
+        courses_block: str,
+        format_note: str = "",
+    ) -> str:
+        courses_section = f"{format_note}\n{courses_block}" if format_note else courses_block
+        prompt = f"""
+Eres un experto diseñador de rutas de aprendizaje educativas.
+
+OBJETIVO DEL ESTUDIANTE: {user_query}
+NIVEL ACTUAL: {user_level}
+TIEMPO DISPONIBLE: {time_per_week} horas/semana
+
+CURSOS DISPONIBLES (ordenados por relevancia semántica):
+{courses_section}
+
+TAREA:
+1. Organiza los cursos en 4 lanes de progresión:
+{LANE_GUIDE}
+2. Asigna a cada curso su lane (0-3) y su order dentro del lane
+3. Calcula estimated_weeks (semanas totales) y estimated_total_hours (horas totales aproximadas)
+
+No escribas explicaciones por curso ni el roadmap: se generan en un paso posterior.
+
+FORMATO DE RESPUESTA (JSON estricto, sin markdown):
+{{
+  "name": "Título descriptivo de la ruta",
+  "description": "Resumen ejecutivo de la ruta (50-100 palabras)",
+  "nodes": [
+    {{
+      "course_id": "id_del_curso_en_mongodb",
+      "title": "título del curso",
+      "lane": 0,
+      "order": 0
+    }}
+  ],
+  "estimated_weeks": 12,
+  "estimated_total_hours": 240,
+  "difficulty_progression": "beginner -> intermediate -> advanced"
+}}
+
+IMPORTANTE:
+- Devuelve SOLO el JSON, sin texto adicional ni markdown
+- Asegúrate de incluir TODOS los cursos proporcionados
+- Los course_id deben coincidir exactamente con los IDs de MongoDB
+"""
+        return prompt.strip()
+
+    def _build_reasons_prompt(
+        self,
+        user_query: str,
+        user_level: str,
+        path_name: str,
+        nodes: List[Dict[str, Any]],
+        payload_by_id: Dict[str, Dict[str, Any]],
+    ) -> str:
+        lane = nodes[0]["lane"]
+        courses_block, format_note = self.prompt_encoder.encode([payload_by_id[node["course_id"]] for node in nodes])
+        courses_section = f"{format_note}\n{courses_block}" if format_note else courses_block
+        prompt = f"""
+Eres un experto diseñador de rutas de aprendizaje educativas.
+
+OBJETIVO DEL ESTUDIANTE: {user_query}
+NIVEL ACTUAL: {user_level}
+RUTA: {path_name}
+ETAPA: Lane {lane} ({LANE_NAMES[lane]})
+
+CURSOS DE ESTA ETAPA:
+{courses_section}
+
+TAREA:
+Para cada curso escribe una explicación detallada de por qué es relevante en esta etapa de la ruta
+(100-150 palabras en español), motivadora y específica.
+
+FORMATO DE RESPUESTA (JSON estricto, sin markdown):
+{{
+  "reasons": {{
+    "id_del_curso_en_mongodb": "explicación detallada de relevancia"
+  }}
+}}
+
+IMPORTANTE:
+- Devuelve SOLO el JSON, sin texto adicional ni markdown
+- Incluye una explicación para CADA curso de esta etapa, con su course_id exacto como clave
+"""
+        return prompt.strip()
+
+    def _build_roadmap_prompt(
+        self,
+        user_query: str,
+        user_level: str,
+        time_per_week: int,
+        skeleton: Dict[str, Any],
+        payload_by_id: Dict[str, Dict[str, Any]],
+    ) -> str:
+        stages = []
+        for lane, lane_name in LANE_NAMES.items():
+            titles = [
+                str(payload_by_id[node["course_id"]].get("title") or node.get("title"))
+                for node in sorted(skeleton["nodes"], key=lambda item: item["order"])
+                if node["lane"] == lane
+            ]
+            if titles:
+                stages.append(f"- Lane {lane} ({lane_name}): " + "; ".join(titles))
+        stages_text = "\n".join(stages)
+        prompt = f"""
+Eres un experto diseñador de rutas de aprendizaje educativas.
+
+OBJETIVO DEL ESTUDIANTE: {user_query}
+NIVEL ACTUAL: {user_level}
+TIEMPO DISPONIBLE: {time_per_week} horas/semana
+RUTA: {skeleton.get("name", "")}
+ESTIMACIÓN: {skeleton.get("estimated_weeks", "")} semanas, {skeleton.get("estimated_total_hours", "")} horas
+
+ETAPAS Y CURSOS:
+{stages_text}
+
+TAREA:
+Escribe el roadmap completo de esta ruta en español y en formato markdown, explicando:
+- La progresión lógica entre las 4 etapas
+- Estimaciones de tiempo realistas
+- Consejos prácticos de estudio
+- Proyectos intermedios sugeridos
+
+IMPORTANTE:
+- Devuelve SOLO el texto markdown del roadmap, sin JSON ni bloques de código
 """
         return prompt.strip()
 
@@ -613,15 +1661,23 @@ IMPORTANTE:
         if not isinstance(nodes, list) or not nodes:
             raise ValidationError("La respuesta de Nova debe incluir una lista de nodos")
         for node in nodes:
-            if node.get("course_id") not in valid_ids:
-                raise ValidationError(f"Nova retornó un course_id inválido: {node.get('course_id')}")
-            if not isinstance(node.get("lane"), int) or node["lane"] not in {0, 1, 2, 3}:
-                raise ValidationError("Cada nodo debe incluir lane entre 0 y 3")
-            if not isinstance(node.get("order"), int) or node["order"] < 0:
-                raise ValidationError("Cada nodo debe incluir order como entero >= 0")
-            reason = node.get("reason")
-            if not reason or len(reason.split()) < 10:
-                raise ValidationError("Cada nodo debe incluir una razón detallada")
+            self._validate_nova_node(node, valid_ids)
+
+    def _validate_nova_node(self, node: Dict[str, Any], valid_ids: set[str]) -> None:
+        self._validate_node_placement(node, valid_ids)
+        reason = node.get("reason")
+        if not reason or len(reason.split()) < 10:
+            raise ValidationError("Cada nodo debe incluir una razón detallada")
+
+    def _validate_node_placement(self, node: Dict[str, Any], valid_ids: set[str]) -> None:
+        if not isinstance(node, dict):
+            raise ValidationError("Cada nodo de Nova debe ser un objeto")
+        if node.get("course_id") not in valid_ids:
+            raise ValidationError(f"Nova retornó un course_id inválido: {node.get('course_id')}")
+        if not isinstance(node.get("lane"), int) or node["lane"] not in {0, 1, 2, 3}:
+            raise ValidationError("Cada nodo debe incluir lane entre 0 y 3")
+        if not isinstance(node.get("order"), int) or node["order"] < 0:
+            raise ValidationError("Cada nodo debe incluir order como entero >= 0")
 
     def _safe_positive_int(self, value: Any, fallback: int) -> int:
         try:
@@ -632,70 +1688,310 @@ IMPORTANTE:
 
 
 generator_instance: Optional[LearningPathGenerator] = None
+_generator_lock = threading.Lock()
 
 
 def get_generator() -> LearningPathGenerator:
     global generator_instance
-    if generator_instance is None:
-        generator_instance = LearningPathGenerator()
+    with _generator_lock:
+        if generator_instance is None:
+            generator_instance = LearningPathGenerator()
     return generator_instance
 
 
+def _http_method(event: Dict[str, Any]) -> Optional[str]:
+    return event.get("httpMethod") or event.get("requestContext", {}).get("http", {}).get("method")
+
+
 def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    # Async jobs queued on SQS are delivered to the same function
+    if "Records" in event:
+        return job_worker_handler(event, context)
+    # Direct invocations with {"batch": [...]} pre-generate paths for a cohort
+    if "batch" in event:
+        return batch_handler(event, context)
+    method = _http_method(event)
     # Handle preflight OPTIONS request
-    if event.get("httpMethod") == "OPTIONS" or event.get("requestContext", {}).get("http", {}).get("method") == "OPTIONS":
+    if method == "OPTIONS":
         return {
             "statusCode": 200,
             "headers": CORS_HEADERS,
             "body": "",
         }
+    if method == "GET":
+        return job_status_handler(event, context)
     
     generator = get_generator()
     start = time.time()
+    usage = start_usage()
+    generator.metrics.start_request()
     try:
-        result = generator.handle(event)
-        elapsed_ms = int((time.time() - start) * 1000)
-        logger.info(json.dumps({"event": "path_generation_completed", "total_time_ms": elapsed_ms}))
-        
-        # Verificar si se solicita el formato del frontend
-        body = {}
-        try:
-            body = json.loads(event.get("body", "{}")) if isinstance(event.get("body"), str) else event.get("body", {})
-        except json.JSONDecodeError:
-            pass
-        
-        format_type = body.get("response_format", "backend")
-        
-        if format_type == "frontend":
-            # Devolver solo el formato del frontend
-            frontend_data = generator.map_to_frontend_format(result)
-            response_body = frontend_data
-        elif format_type == "both":
-            # Devolver ambos formatos
-            response_body = {
-                "backend": result,
-                "frontend": generator.map_to_frontend_format(result)
+        request = generator.parse_request(event)
+        if (event.get("queryStringParameters") or {}).get("mode") == "async":
+            job = generator.submit_job(request)
+            status_url = f"/jobs/{job.job_id}"
+            return {
+                "statusCode": 202,
+                "headers": {**CORS_HEADERS, "Location": status_url},
+                "body": encode_json({"job_id": job.job_id, "status": job.status, "status_url": status_url}),
             }
-        else:
-            # Por defecto, devolver formato backend original
-            response_body = result
-        
+        result, replayed = generator.run_request(request, Deadline.from_context(context))
+        elapsed_ms = int((time.time() - start) * 1000)
+        logger.info(
+            json.dumps(
+                {
+                    "event": "path_generation_completed",
+                    "total_time_ms": elapsed_ms,
+                    "idempotent_replay": replayed,
+                    "bedrock_usage": usage.summary(),
+                }
+            )
+        )
+        return {
+            "statusCode": 200,
+            "headers": {**CORS_HEADERS, "Idempotent-Replayed": "true"} if replayed else CORS_HEADERS,
+            "body": generator.render_response(result, request.response_format),
+        }
+    except ValidationError as exc:
+        logger.warning(json.dumps({"event": "validation_error", "error": str(exc)}))
+        return {
+            "statusCode": 400,
+            "headers": CORS_HEADERS,
+            "body": encode_json({"error": str(exc)}),
+        }
+    except IdempotencyKeyReusedError as exc:
+        logger.warning(json.dumps({"event": "idempotency_key_reused", "error": str(exc)}))
+        return {
+            "statusCode": 422,
+            "headers": CORS_HEADERS,
+            "body": encode_json({"error": "La clave de idempotencia ya se usó con una solicitud distinta"}),
+        }
+    except RequestInProgressError as exc:
+        logger.warning(json.dumps({"event": "request_in_progress", "error": str(exc)}))
+        return {
+            "statusCode": 409,
+            "headers": {**CORS_HEADERS, "Retry-After": str(math.ceil(exc.retry_in))},
+            "body": encode_json({"error": "Una solicitud idéntica todavía se está procesando, intenta de nuevo en unos segundos"}),
+        }
+    except DeadlineExceeded as exc:
+        logger.error(json.dumps({"event": "deadline_exceeded", "error": str(exc)}))
+        return {
+            "statusCode": 504,
+            "headers": CORS_HEADERS,
+            "body": encode_json({"error": "La generación de la ruta excedió el tiempo disponible"}),
+        }
+    except CircuitOpenError as exc:
+        logger.error(json.dumps({"event": "circuit_open", "dependency": exc.dependency, "error": str(exc)}))
+        return {
+            "statusCode": 503,
+            "headers": {**CORS_HEADERS, "Retry-After": str(math.ceil(exc.retry_in))},
+            "body": encode_json({"error": "Servicio temporalmente no disponible, intenta de nuevo en unos segundos"}),
+        }
+    except Exception as exc:  # noqa: BLE001
+        logger.error(json.dumps({"event": "unhandled_error", "error": str(exc)}))
+        return {
+            "statusCode": 500,
+            "headers": CORS_HEADERS,
+            "body": encode_json({"error": "Error interno del servidor"}),
+        }
+    finally:
+        generator.report_usage(usage)
+        generator.flush_metrics()
+
+
+def batch_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """Batch generation: ``{"batch": [request, ...]}``, each item a POST body with its ``user_id``.
+
+    Responds 200 with one result per item (``{"status", "path"}`` or ``{"status", "error"}``)
+    and a ``summary`` with counts, time per stage and paths per second.
+    """
+    generator = get_generator()
+    usage = start_usage()
+    generator.metrics.start_request()
+    try:
+        items = event.get("batch")
+        if not isinstance(items, list) or not items:
+            raise ValidationError("batch debe ser una lista no vacía de solicitudes")
+        if len(items) > generator.batch_max_requests:
+            raise ValidationError(f"batch admite como máximo {generator.batch_max_requests} solicitudes")
+        parsed: List[Tuple[int, RequestContext]] = []
+        results: List[Dict[str, Any]] = [{} for _ in items]
+        for index, item in enumerate(items):
+            try:
+                parsed.append((index, generator.parse_request({"body": item})))
+            except ValidationError as exc:
+                results[index] = {"status": 400, "error": str(exc)}
+        budget_ms = int(os.getenv("BATCH_DEADLINE_MS", "840000"))
+        batch = generator.generate_batch([request for _, request in parsed], Deadline.from_context(context, budget_ms))
+        for (index, _), result in zip(parsed, batch["results"]):
+            results[index] = result
+        summary = {**batch["summary"], "requests": len(items), "failed": len(items) - batch["summary"]["succeeded"]}
+        logger.info(json.dumps({"event": "batch_generation_completed", **summary, "bedrock_usage": usage.summary()}))
         return {
             "statusCode": 200,
             "headers": CORS_HEADERS,
-            "body": json.dumps(response_body),
+            "body": encode_json({"results": results, "summary": summary}),
         }
     except ValidationError as exc:
         logger.warning(json.dumps({"event": "validation_error", "error": str(exc)}))
         return {
             "statusCode": 400,
             "headers": CORS_HEADERS,
-            "body": json.dumps({"error": str(exc)}),
+            "body": encode_json({"error": str(exc)}),
         }
     except Exception as exc:  # noqa: BLE001
         logger.error(json.dumps({"event": "unhandled_error", "error": str(exc)}))
         return {
             "statusCode": 500,
             "headers": CORS_HEADERS,
-            "body": json.dumps({"error": "Error interno del servidor"}),
+            "body": encode_json({"error": "Error interno del servidor"}),
+        }
+    finally:
+        generator.report_usage(usage)
+        generator.flush_metrics()
+
+
+def job_status_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """GET /jobs/{job_id}: status and per-stage progress of an async job, with the path once it succeeded."""
+    generator = get_generator()
+    try:
+        view = generator.job_status_for_event(event)
+    except Exception as exc:  # noqa: BLE001
+        job_id = (event.get("pathParameters") or {}).get("job_id")
+        logger.error(json.dumps({"event": "job_status_failed", "job_id": job_id, "error": str(exc)}))
+        return {
+            "statusCode": 500,
+            "headers": CORS_HEADERS,
+            "body": encode_json({"error": "Error interno del servidor"}),
         }
+    if view is None:
+        return {
+            "statusCode": 404,
+            "headers": CORS_HEADERS,
+            "body": encode_json({"error": "Trabajo no encontrado"}),
+        }
+    return {
+        "statusCode": 200,
+        "headers": CORS_HEADERS,
+        "body": encode_json(view),
+    }
+
+
+def job_worker_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """SQS consumer of async generation jobs (JOB_QUEUE_BACKEND=sqs).
+
+    Jobs deferred because a dependency circuit is open, or whose status could not be
+    written, are reported back for redelivery (ReportBatchItemFailures) after a backoff set
+    on the message's visibility. On the last delivery (JOB_MAX_RECEIVES, the queue's
+    maxReceiveCount) the job is marked failed instead of being left pending.
+    """
+    generator = get_generator()
+    budget_ms = int(os.getenv("JOB_DEADLINE_MS", "280000"))
+    max_receives = int(os.getenv("JOB_MAX_RECEIVES", "5"))
+    failures: List[str] = []
+    for record in event.get("Records", []):
+        try:
+            job_id = json.loads(record["body"])["job_id"]
+        except (KeyError, TypeError, ValueError) as exc:
+            # Malformed messages would fail forever; they are dropped and logged
+            logger.error(json.dumps({"event": "job_message_invalid", "message_id": record.get("messageId"), "error": str(exc)}))
+            continue
+        receives = int((record.get("attributes") or {}).get("ApproximateReceiveCount", "1"))
+        final_attempt = receives >= max_receives
+        try:
+            done = generator.run_job(job_id, Deadline.from_context(context, budget_ms), final_attempt)
+        except Exception as exc:  # noqa: BLE001
+            logger.error(json.dumps({"event": "job_worker_failed", "job_id": job_id, "error": str(exc)}))
+            done = final_attempt and _fail_job_quietly(generator, job_id)
+        if done:
+            continue
+        if isinstance(generator.job_queue, SQSJobQueue) and record.get("receiptHandle"):
+            generator.job_queue.defer(record["receiptHandle"], receives)
+        failures.append(record["messageId"])
+    return {"batchItemFailures": [{"itemIdentifier": message_id} for message_id in failures]}
+
+
+def _fail_job_quietly(generator: LearningPathGenerator, job_id: str) -> bool:
+    """Mark a job failed on its last delivery; False (the message goes to the DLQ) if even that fails."""
+    try:
+        generator.fail_job(job_id, {"status": 500, "error": "Error interno del servidor"})
+    except Exception as exc:  # noqa: BLE001
+        logger.error(json.dumps({"event": "job_fail_failed", "job_id": job_id, "error": str(exc)}))
+        return False
+    return True
+
+
+def outbox_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """SQS consumer of the persistence outbox (OUTBOX_BACKEND=sqs).
+
+    Writes the whole batch in one transaction; if that fails, messages are retried one by one
+    and only the ones that still fail are reported back for redelivery (ReportBatchItemFailures).
+    """
+    postgres_client = get_postgres_client()
+    deadline = Deadline.from_context(context)
+    entries: List[Tuple[str, OutboxEntry]] = []
+    for record in event.get("Records", []):
+        try:
+            entries.append((record["messageId"], OutboxEntry.from_json(record["body"])))
+        except (KeyError, TypeError, ValueError) as exc:
+            # Malformed messages would fail forever; they are dropped and logged
+            logger.error(json.dumps({"event": "outbox_message_invalid", "message_id": record.get("messageId"), "error": str(exc)}))
+    if not entries:
+        return {"batchItemFailures": []}
+    failures: List[str] = []
+    try:
+        postgres_client.persist_learning_paths([entry.as_persist_args() for _, entry in entries], deadline)
+    except Exception as exc:  # noqa: BLE001
+        logger.warning(json.dumps({"event": "outbox_batch_failed", "entries": len(entries), "error": str(exc)}))
+        for message_id, entry in entries:
+            try:
+                postgres_client.persist_learning_paths([entry.as_persist_args()], deadline)
+            except Exception as entry_exc:  # noqa: BLE001
+                logger.error(json.dumps({"event": "outbox_entry_failed", "path_id": entry.path_id, "error": str(entry_exc)}))
+                failures.append(message_id)
+    logger.info(json.dumps({"event": "outbox_batch_processed", "entries": len(entries), "failed": len(failures)}))
+    return {"batchItemFailures": [{"itemIdentifier": message_id} for message_id in failures]}
+
+
+def stream_handler(event: Dict[str, Any], context: Any) -> Iterator[str]:
+    """Streaming entry point: yields newline-delimited JSON events (header, course..., roadmap, complete).
+
+    The managed Python runtime cannot stream Lambda responses, so this is meant for
+    response-streaming front ends (e.g. Lambda Web Adapter) and the HTTP server mode.
+    """
+    generator = get_generator()
+    start = time.time()
+    usage = start_usage()
+    generator.metrics.start_request()
+    try:
+        for message in generator.stream_learning_path(event, Deadline.from_context(context)):
+            yield encode_json(message) + "\n"
+        logger.info(
+            json.dumps(
+                {
+                    "event": "path_generation_completed",
+                    "total_time_ms": int((time.time() - start) * 1000),
+                    "streamed": True,
+                    "bedrock_usage": usage.summary(),
+                }
+            )
+        )
+    except ValidationError as exc:
+        logger.warning(json.dumps({"event": "validation_error", "error": str(exc)}))
+        yield encode_json({"type": "error", "status": 400, "error": str(exc)}) + "\n"
+    except DeadlineExceeded as exc:
+        logger.error(json.dumps({"event": "deadline_exceeded", "error": str(exc)}))
+        yield encode_json(
+            {"type": "error", "status": 504, "error": "La generación de la ruta excedió el tiempo disponible"}
+        ) + "\n"
+    except CircuitOpenError as exc:
+        logger.error(json.dumps({"event": "circuit_open", "dependency": exc.dependency, "error": str(exc)}))
+        yield encode_json(
+            {"type": "error", "status": 503, "error": "Servicio temporalmente no disponible, intenta de nuevo en unos segundos"}
+        ) + "\n"
+    except Exception as exc:  # noqa: BLE001
+        logger.error(json.dumps({"event": "unhandled_error", "error": str(exc)}))
+        yield encode_json({"type": "error", "status": 500, "error": "Error interno del servidor"}) + "\n"
+    finally:
+        generator.report_usage(usage)
+        generator.flush_metrics()
@@ -0,0 +1,221 @@
+"""HTTP server mode: the Lambda handlers behind a stdlib HTTP server for container hosts.
+
+One process serves many concurrent requests on a fixed pool of worker threads
+(SERVER_WORKERS) that share the generator and its client pools. SIGTERM/SIGINT stop
+accepting connections, let in-flight requests finish (up to SERVER_SHUTDOWN_TIMEOUT_SECONDS)
+and then flush background work and close the pools.
+
+    SERVER_PORT=8080 SERVER_WORKERS=16 python src/server.py
+"""
+import json
+import logging
+import os
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+import learning_path_generator
+from learning_path_generator import get_generator, lambda_handler, stream_handler
+from utils.resilience import reserve_hedge_workers
+from utils.serialization import encode_json
+
+logger = logging.getLogger(__name__)
+
+GENERATE_PATH = "/generate-learning-path"
+STREAM_PATH = "/generate-learning-path/stream"
+JOBS_PREFIX = "/jobs/"
+HEALTH_PATH = "/health"
+# Methods served on each route; another method on a known route gets 405 with an Allow header
+ROUTE_METHODS = {
+    GENERATE_PATH: ("POST", "OPTIONS"),
+    STREAM_PATH: ("POST",),
+    HEALTH_PATH: ("GET",),
+}
+JOB_METHODS = ("GET", "OPTIONS")
+
+
+def allowed_methods(path: str) -> Optional[Tuple[str, ...]]:
+    """Methods served on ``path``, or None when no route matches."""
+    if path.startswith(JOBS_PREFIX) and len(path) > len(JOBS_PREFIX):
+        return JOB_METHODS
+    return ROUTE_METHODS.get(path)
+
+
+class PooledHTTPServer(HTTPServer):
+    """HTTPServer whose connections are handled by a fixed pool of worker threads.
+
+    Connections beyond ``workers`` wait in the pool's queue (and the listen backlog)
+    instead of each getting a thread, so concurrency stays bounded by the client pools.
+    """
+
+    request_queue_size = 128
+
+    def __init__(self, address: Tuple[str, int], handler: type, workers: int) -> None:
+        super().__init__(address, handler)
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="http-worker")
+        self._inflight = 0
+        self._idle = threading.Condition()
+
+    def process_request(self, request, client_address) -> None:
+        with self._idle:
+            self._inflight += 1
+        self._executor.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address) -> None:
+        try:
+            self.finish_request(request, client_address)
+        except Exception:  # noqa: BLE001
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            with self._idle:
+                self._inflight -= 1
+                self._idle.notify_all()
+
+    def drain(self, timeout_s: float) -> bool:
+        """Wait for accepted connections to be answered; False if some were still running."""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._inflight == 0, timeout_s)
+
+    def server_close(self) -> None:
+        super().server_close()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class LearningPathRequestHandler(BaseHTTPRequestHandler):
+    """Translates HTTP requests into API Gateway proxy events for the Lambda handlers."""
+
+    server_version = "learning-path-generator"
+    # Idle or slow clients must not hold a worker forever
+    timeout = 30
+
+    def do_GET(self) -> None:
+        if urlsplit(self.path).path == HEALTH_PATH:
+            self._send(200, {"Content-Type": "application/json"}, encode_json({"status": "ok"}))
+            return
+        self._dispatch("GET")
+
+    def do_POST(self) -> None:
+        self._dispatch("POST")
+
+    def do_OPTIONS(self) -> None:
+        self._dispatch("OPTIONS")
+
+    def do_PUT(self) -> None:
+        self._dispatch("PUT")
+
+    def do_PATCH(self) -> None:
+        self._dispatch("PATCH")
+
+    def do_DELETE(self) -> None:
+        self._dispatch("DELETE")
+
+    def _dispatch(self, method: str) -> None:
+        url = urlsplit(self.path)
+        allowed = allowed_methods(url.path)
+        if allowed is None:
+            self._send(404, {"Content-Type": "application/json"}, encode_json({"error": "Ruta no encontrada"}))
+            return
+        if method not in allowed:
+            self._send(
+                405,
+                {"Content-Type": "application/json", "Allow": ", ".join(allowed)},
+                encode_json({"error": "Método no permitido"}),
+            )
+            return
+        event = self._build_event(method, url.path, url.query)
+        if url.path == STREAM_PATH:
+            self._stream(event)
+            return
+        if url.path.startswith(JOBS_PREFIX):
+            event["pathParameters"] = {"job_id": url.path[len(JOBS_PREFIX) :]}
+        response = lambda_handler(event, None)
+        self._send(response["statusCode"], response.get("headers") or {}, response.get("body") or "")
+
+    def _build_event(self, method: str, path: str, query: str) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length).decode("utf-8") if length else None
+        return {
+            "httpMethod": method,
+            "path": path,
+            "headers": dict(self.headers.items()),
+            "queryStringParameters": dict(parse_qsl(query)) or None,
+            "pathParameters": None,
+            "requestContext": {},
+            "body": body,
+        }
+
+    def _stream(self, event: Dict[str, Any]) -> None:
+        # HTTP/1.0 without Content-Length: each line is written as it is produced, the close ends the body
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        for line in stream_handler(event, None):
+            self.wfile.write(line.encode("utf-8"))
+            self.wfile.flush()
+
+    def _send(self, status: int, headers: Dict[str, str], body: str) -> None:
+        payload = body.encode("utf-8")
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        # Access logs go through logging (structured, LOG_LEVEL) instead of stderr
+        logger.debug(json.dumps({"event": "http_request", "client": self.client_address[0], "line": format % args}))
+
+
+def build_server(host: Optional[str] = None, port: Optional[int] = None, workers: Optional[int] = None) -> PooledHTTPServer:
+    host = host if host is not None else os.getenv("SERVER_HOST", "0.0.0.0")
+    port = port if port is not None else int(os.getenv("SERVER_PORT", "8080"))
+    workers = workers if workers is not None else int(os.getenv("SERVER_WORKERS", "16"))
+    # Every worker can have a hedged primary in flight, plus one left running by a hedge
+    # that won; a smaller pool queues primaries and starves the hedges behind them
+    reserve_hedge_workers(2 * workers)
+    return PooledHTTPServer((host, port), LearningPathRequestHandler, workers)
+
+
+def shutdown(server: PooledHTTPServer, timeout_s: float) -> None:
+    """Stop after ``serve_forever`` returned: drain requests, then background work and pools."""
+    start = time.time()
+    drained = server.drain(timeout_s)
+    server.server_close()
+    if learning_path_generator.generator_instance is not None:
+        learning_path_generator.generator_instance.close()
+    logger.info(
+        json.dumps(
+            {"event": "server_stopped", "drained": drained, "shutdown_ms": int((time.time() - start) * 1000)}
+        )
+    )
+
+
+def serve() -> None:
+    server = build_server()
+    # Clients are created before the first request instead of on it
+    get_generator()
+
+    def request_stop(signum: int, frame: Any) -> None:
+        logger.info(json.dumps({"event": "server_stopping", "signal": signal.Signals(signum).name}))
+        # shutdown() waits for serve_forever(), which runs on this (the main) thread
+        threading.Thread(target=server.shutdown, name="server-shutdown", daemon=True).start()
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+    host, port = server.server_address[:2]
+    logger.info(json.dumps({"event": "server_started", "host": host, "port": port, "workers": server.workers}))
+    try:
+        server.serve_forever()
+    finally:
+        shutdown(server, float(os.getenv("SERVER_SHUTDOWN_TIMEOUT_SECONDS", "25")))
+
+
+if __name__ == "__main__":
+    serve()
@@ -1,17 +1,46 @@
 import json
 import logging
 import os
-import random
+import threading
 import time
-from functools import lru_cache
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
-import boto3
-from botocore.config import Config
-from botocore.exceptions import BotoCoreError, ClientError
+from utils.deadline import NO_DEADLINE, Deadline, DeadlineExceeded
+from utils.embedding_cache import EmbeddingCache, build_embedding_store
+from utils.model_router import build_model_router
+from utils.resilience import get_policy
+from utils.usage import record_bedrock_call
 
 logger = logging.getLogger(__name__)
 
+MAX_ATTEMPTS = 4
+# botocore fixes read_timeout per client, so there is one client per bucket and each attempt
+# uses the largest bucket that still fits in the request deadline
+READ_TIMEOUT_BUCKETS = (25, 15, 10, 6, 3, 1)
+# Response headers with Bedrock's own view of the invocation
+INVOCATION_LATENCY_HEADER = "x-amzn-bedrock-invocation-latency"
+INPUT_TOKENS_HEADER = "x-amzn-bedrock-input-token-count"
+OUTPUT_TOKENS_HEADER = "x-amzn-bedrock-output-token-count"
+TRANSIENT_ERROR_CODES = {
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "ServiceUnavailableException",
+    "InternalServerException",
+    "ModelNotReadyException",
+    "ModelTimeoutException",
+}
+
+
+def is_transient_error(exc: BaseException) -> bool:
+    """Throttling, 5xx and transport errors; validation/access errors are not worth retrying."""
+    from botocore.exceptions import BotoCoreError, ClientError
+
+    if isinstance(exc, ClientError):
+        code = exc.response.get("Error", {}).get("Code", "")
+        status = exc.response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0)
+        return code in TRANSIENT_ERROR_CODES or status == 429 or status >= 500
+    return isinstance(exc, BotoCoreError)
+
 
 class BedrockClient:
     def __init__(self) -> None:
@@ -19,71 +48,219 @@ class BedrockClient:
         # Use inference profile ARN for Nova Lite
         self._nova_model = os.getenv("NOVA_MODEL", "us.amazon.nova-lite-v1:0")
         self._nova_temperature = float(os.getenv("NOVA_TEMPERATURE", "0.7"))
-        config = Config(
-            region_name="us-east-2",
-            retries={"max_attempts": 3, "mode": "standard"},
-            read_timeout=25,
-            connect_timeout=5,
-            max_pool_connections=10,
+        # Picks NOVA_MODEL or the cheaper NOVA_SMALL_MODEL per call and sizes maxTokens
+        self._router = build_model_router(self._nova_model)
+        self._clients: Dict[int, Any] = {}
+        # boto3 client creation is not thread-safe; the clients themselves are
+        self._clients_lock = threading.Lock()
+        self._max_pool_connections = int(os.getenv("BEDROCK_MAX_POOL_CONNECTIONS", "10"))
+        self._policy = get_policy(
+            "bedrock",
+            is_transient_error,
+            max_attempts=MAX_ATTEMPTS,
+            backoff_base=1.0,
+            min_attempt_s=READ_TIMEOUT_BUCKETS[-1],
+        )
+        self._embedding_cache = EmbeddingCache(
+            self._embedding_model,
+            int(os.getenv("EMBEDDING_DIM", "1024")),
+            max_entries=int(os.getenv("EMBEDDING_CACHE_SIZE", "1000")),
+            store=build_embedding_store(),
+        )
+
+    def _get_client(self, read_timeout: int = READ_TIMEOUT_BUCKETS[0]):
+        """Lazy initialization of the bedrock-runtime client (boto3 is imported on first use)"""
+        client = self._clients.get(read_timeout)
+        if client is not None:
+            return client
+        with self._clients_lock:
+            client = self._clients.get(read_timeout)
+            if client is None:
+                import boto3
+                from botocore.config import Config
+
+                config = Config(
+                    region_name="us-east-2",
+                    # Retries are owned by _invoke_metered, which knows the request deadline
+                    retries={"max_attempts": 1, "mode": "standard"},
+                    read_timeout=read_timeout,
+                    connect_timeout=min(5, read_timeout),
+                    max_pool_connections=self._max_pool_connections,
+                )
+                client = boto3.client("bedrock-runtime", region_name="us-east-2", config=config)
+                self._clients[read_timeout] = client
+        return client
+
+    def _read_timeout_for(self, deadline: Deadline) -> int:
+        remaining = deadline.remaining()
+        for bucket in READ_TIMEOUT_BUCKETS:
+            if bucket <= remaining:
+                return bucket
+        raise DeadlineExceeded("Deadline exceeded before Bedrock call")
+
+    def generate_embedding(self, text: str, deadline: Deadline = NO_DEADLINE) -> List[float]:
+        embedding, _ = self.generate_embedding_with_tier(text, deadline)
+        return embedding
+
+    def generate_embedding_with_tier(self, text: str, deadline: Deadline = NO_DEADLINE) -> Tuple[List[float], str]:
+        """Return the embedding and the cache tier that served it (memory, persistent or miss)."""
+        return self._embedding_cache.get_or_compute(text, lambda value: self._compute_embedding(value, deadline))
+
+    def _compute_embedding(self, text: str, deadline: Deadline = NO_DEADLINE) -> List[float]:
+        # Embeddings are cheap and idempotent, so they may be hedged (BEDROCK_HEDGE_AFTER_MS)
+        (embedding, input_tokens, server_latency_ms), attempts, latency_ms = self._invoke_metered(
+            "embedding", self._embedding_model, self._invoke_embedding, text, deadline=deadline, hedge=True
+        )
+        record_bedrock_call(
+            "embedding", self._embedding_model, input_tokens, 0, attempts, latency_ms, server_latency_ms
+        )
+        return embedding
+
+    def invoke_nova(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        max_tokens: Optional[int] = None,
+        deadline: Deadline = NO_DEADLINE,
+        assistant_prefix: Optional[str] = None,
+        expected_items: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """Invoke the Nova tier chosen for ``expected_items`` courses.
+
+        Without ``max_tokens`` the output budget is sized for a full plan of ``expected_items``
+        courses. ``assistant_prefix`` prefills Nova's turn: the model continues from that text
+        (used to finish truncated output).
+        """
+        model = self._router.choose(expected_items)
+        if max_tokens is None:
+            max_tokens = self._router.max_tokens_for(expected_items)
+        payload = self._build_nova_payload(system_prompt, user_prompt, max_tokens, assistant_prefix)
+        output, attempts, latency_ms = self._invoke_metered("nova", model, self._invoke_nova, payload, model, deadline=deadline)
+        usage = output.get("usage") or {}
+        record_bedrock_call(
+            "nova",
+            model,
+            usage.get("inputTokens", 0),
+            usage.get("outputTokens", 0),
+            attempts,
+            latency_ms,
+            output.get("server_latency_ms"),
         )
-        self._client = boto3.client("bedrock-runtime", region_name="us-east-2", config=config)
+        return output
 
-    def generate_embedding(self, text: str) -> List[float]:
-        return self._cached_embedding(text)
+    def invoke_nova_stream(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        max_tokens: Optional[int] = None,
+        deadline: Deadline = NO_DEADLINE,
+        expected_items: Optional[int] = None,
+    ) -> Iterator[str]:
+        """Yield text deltas as Nova generates them (InvokeModelWithResponseStream).
 
-    @lru_cache(maxsize=1000)
-    def _cached_embedding(self, text: str) -> List[float]:
-        return self._invoke_with_retry(self._invoke_embedding, text)
+        Retries only cover opening the stream; once tokens flow, errors propagate.
+        """
+        model = self._router.choose(expected_items)
+        if max_tokens is None:
+            max_tokens = self._router.max_tokens_for(expected_items)
+        payload = self._build_nova_payload(system_prompt, user_prompt, max_tokens)
+        start = time.monotonic()
+        (response, attempt_start), attempts, _ = self._invoke_metered(
+            "nova_stream", model, self._open_nova_stream, payload, model, deadline=deadline
+        )
+        invocation_metrics: Dict[str, Any] = {}
+        try:
+            for event in response["body"]:
+                chunk = event.get("chunk")
+                if not chunk:
+                    continue
+                data = json.loads(chunk["bytes"])
+                # The last chunk carries the token counts and Bedrock-side latency of the whole stream
+                invocation_metrics = data.get("amazon-bedrock-invocationMetrics") or invocation_metrics
+                text = data.get("contentBlockDelta", {}).get("delta", {}).get("text")
+                if text:
+                    yield text
+        except Exception:
+            self._router.record(model, time.monotonic() - attempt_start, ok=False)
+            raise
+        else:
+            # Open + full generation, comparable with invoke_nova's samples (an abandoned stream records nothing)
+            self._router.record(model, time.monotonic() - attempt_start, ok=True)
+        finally:
+            record_bedrock_call(
+                "nova_stream",
+                model,
+                invocation_metrics.get("inputTokenCount", 0),
+                invocation_metrics.get("outputTokenCount", 0),
+                attempts,
+                (time.monotonic() - start) * 1000,
+                invocation_metrics.get("invocationLatency"),
+                ok=bool(invocation_metrics),
+            )
 
-    def invoke_nova(self, system_prompt: str, user_prompt: str, max_tokens: int = 4096) -> Dict[str, Any]:
+    def _build_nova_payload(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        max_tokens: int,
+        assistant_prefix: Optional[str] = None,
+    ) -> Dict[str, Any]:
         # Nova Lite doesn't support "system" role, so we combine it with user message  
         # Nova requires content as array with text field (but no type field)
         combined_prompt = f"{system_prompt}\n\n{user_prompt}"
-        payload = {
-            "messages": [
-                {
-                    "role": "user",
-                    "content": [{"text": combined_prompt}],
-                },
-            ],
+        messages: List[Dict[str, Any]] = [
+            {
+                "role": "user",
+                "content": [{"text": combined_prompt}],
+            },
+        ]
+        if assistant_prefix:
+            messages.append({"role": "assistant", "content": [{"text": assistant_prefix}]})
+        return {
+            "messages": messages,
             "inferenceConfig": {
                 "temperature": self._nova_temperature,
                 "maxTokens": max_tokens,
                 "topP": 0.9,
             },
         }
-        return self._invoke_with_retry(self._invoke_nova, payload)
-
-    def _invoke_with_retry(self, func, *args):
-        attempts = 0
-        backoff = 1.0
-        last_error: Optional[Exception] = None
-        while attempts < 4:
-            try:
-                return func(*args)
-            except (ClientError, BotoCoreError) as exc:
-                last_error = exc
-                attempts += 1
-                if attempts >= 4:
-                    break
-                sleep_for = backoff * (2 ** (attempts - 1)) * random.uniform(0.75, 1.25)
-                logger.warning(
-                    json.dumps(
-                        {
-                            "event": "bedrock_retry",
-                            "attempt": attempts,
-                            "sleep_for": sleep_for,
-                            "error": str(exc),
-                        }
-                    )
-                )
-                time.sleep(sleep_for)
-        assert last_error is not None
-        raise last_error
 
-    def _invoke_embedding(self, text: str) -> List[float]:
+    def _invoke_metered(
+        self,
+        kind: str,
+        model: str,
+        func,
+        *args,
+        deadline: Deadline = NO_DEADLINE,
+        hedge: bool = False,
+    ) -> Tuple[Any, int, float]:
+        """Run ``func`` under the retry policy; return (result, attempts made, elapsed ms).
+
+        Breaker, retry budget and deadline-aware backoff are shared with the other clients
+        (utils.resilience). A call that finally fails is recorded in the request's usage here.
+        """
+        attempts: List[float] = []
+
+        def attempt():
+            attempts.append(time.monotonic())
+            return func(*args, read_timeout=self._read_timeout_for(deadline))
+
+        start = time.monotonic()
+        try:
+            result = self._policy.call(attempt, deadline, hedge)
+        except Exception:
+            record_bedrock_call(kind, model, attempts=len(attempts), latency_ms=(time.monotonic() - start) * 1000, ok=False)
+            raise
+        return result, len(attempts), (time.monotonic() - start) * 1000
+
+    def _invoke_embedding(
+        self,
+        text: str,
+        read_timeout: int = READ_TIMEOUT_BUCKETS[0],
+    ) -> Tuple[List[float], int, Optional[float]]:
+        """Return (embedding, input tokens, Bedrock invocation latency in ms)."""
         request_body = json.dumps({"inputText": text})
-        response = self._client.invoke_model(
+        response = self._get_client(read_timeout).invoke_model(
             modelId=self._embedding_model,
             contentType="application/json",
             accept="application/json",
@@ -95,27 +272,90 @@ class BedrockClient:
             raise ValueError("Bedrock embedding response missing 'embedding' field")
         if len(embedding) != int(os.getenv("EMBEDDING_DIM", "1024")):
             raise ValueError("Unexpected embedding dimension returned by Bedrock")
-        return embedding
+        headers = _response_headers(response)
+        input_tokens = payload.get("inputTextTokenCount") or headers.get(INPUT_TOKENS_HEADER, 0)
+        return embedding, int(input_tokens), _header_ms(headers, INVOCATION_LATENCY_HEADER)
 
-    def _invoke_nova(self, payload: Dict[str, Any]) -> Dict[str, Any]:
-        response = self._client.invoke_model(
-            modelId=self._nova_model,
-            contentType="application/json",
-            accept="application/json",
-            body=json.dumps(payload),
-        )
-        content = json.loads(response["body"].read())
+    def _open_nova_stream(
+        self,
+        payload: Dict[str, Any],
+        model: str,
+        read_timeout: int = READ_TIMEOUT_BUCKETS[0],
+    ) -> Tuple[Dict[str, Any], float]:
+        """Open the stream; return it with the start time of this attempt.
+
+        Success is recorded in the router by ``invoke_nova_stream`` once the stream is fully
+        read, so streaming samples measure full generation like the non-streaming ones.
+        """
+        start = time.monotonic()
+        try:
+            response = self._get_client(read_timeout).invoke_model_with_response_stream(
+                modelId=model,
+                contentType="application/json",
+                accept="application/json",
+                body=json.dumps(payload),
+            )
+        except Exception:
+            self._router.record(model, time.monotonic() - start, ok=False)
+            raise
+        return response, start
+
+    def _invoke_nova(
+        self,
+        payload: Dict[str, Any],
+        model: str,
+        read_timeout: int = READ_TIMEOUT_BUCKETS[0],
+    ) -> Dict[str, Any]:
+        start = time.monotonic()
+        try:
+            response = self._get_client(read_timeout).invoke_model(
+                modelId=model,
+                contentType="application/json",
+                accept="application/json",
+                body=json.dumps(payload),
+            )
+            content = json.loads(response["body"].read())
+        except Exception:
+            self._router.record(model, time.monotonic() - start, ok=False)
+            raise
+        self._router.record(model, time.monotonic() - start, ok=True)
+        headers = _response_headers(response)
         if "output" in content:
             # Some responses wrap output differently; prefer unified structure
-            return content["output"]
-        return content
+            output = dict(content["output"])
+            if "usage" in content:
+                # Kept for token accounting (inputTokens/outputTokens)
+                output["usage"] = content["usage"]
+        else:
+            output = dict(content)
+        if "usage" not in output and INPUT_TOKENS_HEADER in headers:
+            output["usage"] = {
+                "inputTokens": int(headers[INPUT_TOKENS_HEADER]),
+                "outputTokens": int(headers.get(OUTPUT_TOKENS_HEADER, 0)),
+            }
+        output["model"] = model
+        output["server_latency_ms"] = _header_ms(headers, INVOCATION_LATENCY_HEADER)
+        return output
+
+
+def _response_headers(response: Dict[str, Any]) -> Dict[str, str]:
+    return response.get("ResponseMetadata", {}).get("HTTPHeaders", {}) or {}
+
+
+def _header_ms(headers: Dict[str, str], name: str) -> Optional[float]:
+    try:
+        return float(headers[name])
+    except (KeyError, TypeError, ValueError):
+        return None
 
 
 _bedrock_client: BedrockClient | None = None
+_bedrock_client_lock = threading.Lock()
 
 
 def get_bedrock_client() -> BedrockClient:
     global _bedrock_client
-    if _bedrock_client is None:
-        _bedrock_client = BedrockClient()
+    with _bedrock_client_lock:
+        if _bedrock_client is None:
+            _bedrock_client = BedrockClient()
     return _bedrock_client
@@ -0,0 +1,66 @@
+import math
+import os
+import threading
+from collections import OrderedDict
+from typing import Tuple
+
+# One-sided z-score for the survival-rate lower bound (~95%)
+CONFIDENCE_Z = 1.645
+MIN_SURVIVAL_RATE = 0.02
+MAX_SIGNATURES = 256
+ATLAS_MAX_NUM_CANDIDATES = 10000
+
+
+class CandidatePlanner:
+    """Sizes vector search requests from the observed post-filter survival rate.
+
+    Survival statistics are kept per filter signature as exponentially decayed
+    counts, treated as a Beta posterior. The plan asks for just enough documents
+    that the lower confidence bound of the survival rate still yields ``limit``
+    matches, so unfiltered queries stop paying for the worst case.
+    """
+
+    def __init__(self) -> None:
+        self._decay = float(os.getenv("CANDIDATE_STATS_DECAY", "0.95"))
+        self._ann_ratio = max(1, int(os.getenv("CANDIDATE_ANN_RATIO", "5")))
+        self._stats: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def survival_lower_bound(self, signature: str) -> float:
+        with self._lock:
+            survived, rejected = self._stats.get(signature, (0.0, 0.0))
+        alpha = 1.0 + survived
+        beta = 1.0 + rejected
+        total = alpha + beta
+        mean = alpha / total
+        std = math.sqrt(alpha * beta / (total * total * (total + 1.0)))
+        return max(MIN_SURVIVAL_RATE, mean - CONFIDENCE_Z * std)
+
+    def plan(self, signature: str, limit: int, max_candidates: int) -> Tuple[int, int]:
+        """Return ``(fetch_limit, num_candidates)`` for the first query."""
+        needed = math.ceil(limit / self.survival_lower_bound(signature))
+        return self._bounded(needed, limit, max_candidates)
+
+    def widen(self, signature: str, limit: int, found: int, fetched: int, max_candidates: int) -> Tuple[int, int]:
+        """Size a single follow-up query once the first one came back short."""
+        missing = max(limit - found, 1)
+        needed = fetched + math.ceil(missing / self.survival_lower_bound(signature))
+        return self._bounded(max(needed, fetched * 2), limit, max(max_candidates, fetched * 2))
+
+    def observe(self, signature: str, fetched: int, survived: int) -> None:
+        if fetched <= 0:
+            return
+        with self._lock:
+            prev_survived, prev_rejected = self._stats.pop(signature, (0.0, 0.0))
+            self._stats[signature] = (
+                prev_survived * self._decay + survived,
+                prev_rejected * self._decay + (fetched - survived),
+            )
+            while len(self._stats) > MAX_SIGNATURES:
+                self._stats.popitem(last=False)
+
+    def _bounded(self, needed: int, limit: int, max_candidates: int) -> Tuple[int, int]:
+        ceiling = min(max(max_candidates, limit), ATLAS_MAX_NUM_CANDIDATES)
+        fetch_limit = min(max(needed, limit), ceiling)
+        num_candidates = min(max(fetch_limit * self._ann_ratio, fetch_limit), ceiling)
+        return fetch_limit, num_candidates
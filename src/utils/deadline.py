@@ -0,0 +1,60 @@
+import os
+import time
+from typing import Any, Optional
+
+# API Gateway REST integrations time out at 29s regardless of the Lambda timeout
+API_GATEWAY_TIMEOUT_MS = 29000
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class Deadline:
+    """Time budget of one request on the monotonic clock, shared by every downstream call.
+
+    ``None`` expiry means no deadline (local runs, benchmarks): every check passes and
+    ``timeout(cap)`` simply returns ``cap``.
+    """
+
+    def __init__(self, expires_at: Optional[float] = None) -> None:
+        self._expires_at = expires_at
+
+    @classmethod
+    def after(cls, seconds: float) -> "Deadline":
+        return cls(time.monotonic() + seconds)
+
+    @classmethod
+    def from_context(cls, context: Any, budget_ms: Optional[int] = None) -> "Deadline":
+        """Remaining Lambda time, capped at ``budget_ms`` (default: the API Gateway timeout), minus a margin to build the response."""
+        margin_ms = int(os.getenv("REQUEST_DEADLINE_MARGIN_MS", "750"))
+        if budget_ms is None:
+            budget_ms = int(os.getenv("REQUEST_DEADLINE_MS", str(API_GATEWAY_TIMEOUT_MS)))
+        get_remaining = getattr(context, "get_remaining_time_in_millis", None)
+        if callable(get_remaining):
+            budget_ms = min(budget_ms, int(get_remaining()))
+        return cls.after(max(budget_ms - margin_ms, 0) / 1000)
+
+    @property
+    def bounded(self) -> bool:
+        return self._expires_at is not None
+
+    def remaining(self) -> float:
+        if self._expires_at is None:
+            return float("inf")
+        return max(self._expires_at - time.monotonic(), 0.0)
+
+    def allows(self, seconds: float) -> bool:
+        return self.remaining() > seconds
+
+    def check(self, stage: str) -> None:
+        if self.remaining() <= 0:
+            raise DeadlineExceeded(f"Deadline exceeded before {stage}")
+
+    def timeout(self, cap: float, stage: str = "call") -> float:
+        """Per-attempt timeout: ``cap`` shrunk to what is left of the budget."""
+        self.check(stage)
+        return min(cap, self.remaining())
+
+
+NO_DEADLINE = Deadline()
@@ -0,0 +1,177 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Callable, List, Optional, Protocol, Tuple
+
+logger = logging.getLogger(__name__)
+
+TIER_MEMORY = "memory"
+TIER_PERSISTENT = "persistent"
+TIER_MISS = "miss"
+
+
+def normalize_query(text: str) -> str:
+    """Fold case, accents and whitespace so trivially different queries share an entry."""
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return " ".join(stripped.casefold().split())
+
+
+class EmbeddingStore(Protocol):
+    def get(self, key: str) -> Optional[bytes]:
+        ...
+
+    def put(self, key: str, value: bytes) -> None:
+        ...
+
+
+class SQLiteEmbeddingStore:
+    """File-backed store; survives warm invocations and is shared by threads of one host."""
+
+    def __init__(self, path: str, ttl_seconds: int) -> None:
+        self._ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL, created_at REAL NOT NULL)"
+            )
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT vector FROM embeddings WHERE key = ? AND created_at >= ?",
+                (key, time.time() - self._ttl_seconds),
+            ).fetchone()
+        return row[0] if row else None
+
+    def put(self, key: str, value: bytes) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO embeddings (key, vector, created_at) VALUES (?, ?, ?)",
+                (key, value, time.time()),
+            )
+
+
+class MongoEmbeddingStore:
+    """Atlas-backed store shared by every Lambda container; expiry relies on a TTL index."""
+
+    def __init__(self, collection, ttl_seconds: int) -> None:
+        self._collection = collection
+        self._ttl_seconds = ttl_seconds
+        self._index_ready = False
+
+    def get(self, key: str) -> Optional[bytes]:
+        doc = self._collection.find_one({"_id": key}, {"vector": 1, "created_at": 1})
+        if not doc or doc["created_at"] < time.time() - self._ttl_seconds:
+            return None
+        return bytes(doc["vector"])
+
+    def put(self, key: str, value: bytes) -> None:
+        if not self._index_ready:
+            self._collection.create_index("expires_at", expireAfterSeconds=0)
+            self._index_ready = True
+        self._collection.replace_one(
+            {"_id": key},
+            {
+                "_id": key,
+                "vector": value,
+                "created_at": time.time(),
+                "expires_at": datetime.now(timezone.utc) + timedelta(seconds=self._ttl_seconds),
+            },
+            upsert=True,
+        )
+
+
+class EmbeddingCache:
+    """Two-tier cache: in-process LRU of float32 arrays in front of an optional persistent store.
+
+    Keys include the model id and dimension, so switching EMBEDDING_MODEL never
+    serves vectors from another embedding space.
+    """
+
+    def __init__(
+        self,
+        model_id: str,
+        dimension: int,
+        max_entries: int = 1000,
+        store: Optional[EmbeddingStore] = None,
+    ) -> None:
+        self._model_id = model_id
+        self._dimension = dimension
+        self._max_entries = max_entries
+        self._store = store
+        self._entries: "OrderedDict[str, array]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key_for(self, text: str) -> str:
+        digest = hashlib.sha256(normalize_query(text).encode("utf-8")).hexdigest()
+        return f"{self._model_id}:{self._dimension}:{digest}"
+
+    def get_or_compute(self, text: str, compute: Callable[[str], List[float]]) -> Tuple[List[float], str]:
+        key = self.key_for(text)
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None:
+                self._entries.move_to_end(key)
+        if cached is not None:
+            return cached.tolist(), TIER_MEMORY
+        if self._store is not None:
+            vector = self._load_persistent(key)
+            if vector is not None:
+                self._remember(key, vector)
+                return vector.tolist(), TIER_PERSISTENT
+        embedding = compute(text)
+        vector = array("f", embedding)
+        self._remember(key, vector)
+        if self._store is not None:
+            try:
+                self._store.put(key, vector.tobytes())
+            except Exception as exc:  # noqa: BLE001
+                logger.warning(json.dumps({"event": "embedding_cache_write_failed", "error": str(exc)}))
+        return embedding, TIER_MISS
+
+    def _load_persistent(self, key: str) -> Optional[array]:
+        try:
+            payload = self._store.get(key)
+        except Exception as exc:  # noqa: BLE001
+            logger.warning(json.dumps({"event": "embedding_cache_read_failed", "error": str(exc)}))
+            return None
+        if payload is None:
+            return None
+        vector = array("f")
+        vector.frombytes(payload)
+        if len(vector) != self._dimension:
+            return None
+        return vector
+
+    def _remember(self, key: str, vector: array) -> None:
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+
+def build_embedding_store() -> Optional[EmbeddingStore]:
+    backend = os.getenv("EMBEDDING_CACHE_BACKEND", "none").lower()
+    ttl_seconds = int(os.getenv("EMBEDDING_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+    try:
+        if backend == "sqlite":
+            return SQLiteEmbeddingStore(os.getenv("EMBEDDING_CACHE_PATH", "/tmp/embedding_cache.sqlite3"), ttl_seconds)
+        if backend == "mongo":
+            from utils.mongodb_client import get_mongo_client
+
+            collection = get_mongo_client().get_collection(os.getenv("EMBEDDING_CACHE_COLLECTION", "embedding_cache"))
+            return MongoEmbeddingStore(collection, ttl_seconds)
+    except Exception as exc:  # noqa: BLE001
+        logger.error(json.dumps({"event": "embedding_cache_backend_failed", "backend": backend, "error": str(exc)}))
+    return None
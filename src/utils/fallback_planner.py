@@ -0,0 +1,125 @@
+import math
+import re
+from typing import Any, Dict, List, Sequence
+
+from utils.search_filters import LEVELS_ORDER
+
+PLAN_SOURCE_FALLBACK = "fallback"
+# Nova plan salvaged from a truncated response, with missing fields filled in by this planner
+PLAN_SOURCE_PARTIAL = "nova_partial"
+DEFAULT_COURSE_HOURS = 10.0
+
+LANES = (
+    ("Fundamentos", "asienta las bases que necesitarás en el resto de la ruta"),
+    ("Core", "cubre los conocimientos centrales de tu objetivo"),
+    ("Avanzado", "profundiza y te especializa una vez dominas lo esencial"),
+    ("Capstone", "integra lo aprendido en un proyecto final"),
+)
+LEVEL_LABELS = {"beginner": "nivel básico", "intermediate": "nivel intermedio", "advanced": "nivel avanzado"}
+
+_DURATION_PATTERN = re.compile(r"(\d+(?:[.,]\d+)?)\s*([a-záéíóú]*)", re.IGNORECASE)
+
+
+def duration_hours(duration: Any) -> float:
+    """Best-effort hours from catalog durations like "12 hours", "3h 30m", "45 min" or "6 semanas"."""
+    if isinstance(duration, (int, float)):
+        return float(duration) if duration > 0 else DEFAULT_COURSE_HOURS
+    total = 0.0
+    for amount, unit in _DURATION_PATTERN.findall(str(duration or "")):
+        value = float(amount.replace(",", "."))
+        unit = unit.lower()
+        if unit.startswith("m"):
+            total += value / 60
+        elif unit.startswith(("w", "sem")):
+            total += value * 5
+        elif unit.startswith(("d", "día", "dia")):
+            total += value * 2
+        else:
+            total += value
+    return total if total > 0 else DEFAULT_COURSE_HOURS
+
+
+def _lane_sizes(count: int) -> List[int]:
+    capstone = 1 if count >= 4 else 0
+    rest = count - capstone
+    foundations = max(1, round(rest * 0.3))
+    advanced = round(rest * 0.3) if rest >= 3 else 0
+    core = rest - foundations - advanced
+    return [foundations, core, advanced, capstone]
+
+
+def build_fallback_plan(
+    user_query: str,
+    user_level: str,
+    time_per_week: int,
+    courses: Sequence[Dict[str, Any]],
+) -> Dict[str, Any]:
+    """Deterministic plan in the same shape as Nova's response, built from the search results alone.
+
+    Courses are ordered by level, then length, then lower similarity first (the most relevant
+    material sits later, in Core/Advanced); that order is cut into the four lanes, with the
+    last course as capstone when there are at least four. Reasons and roadmap are templated.
+    """
+    user_rank = LEVELS_ORDER.get(user_level, 1)
+    ranked = sorted(
+        courses,
+        key=lambda course: (
+            LEVELS_ORDER.get(course.get("level"), user_rank),
+            duration_hours(course.get("duration")),
+            float(course.get("score") or 0.0),
+            str(course.get("course_id")),
+        ),
+    )
+    goal = user_query.strip().rstrip(".")
+    nodes: List[Dict[str, Any]] = []
+    position = 0
+    for lane, size in enumerate(_lane_sizes(len(ranked))):
+        lane_name, lane_purpose = LANES[lane]
+        for order, course in enumerate(ranked[position : position + size]):
+            level_label = LEVEL_LABELS.get(course.get("level"), "nivel no especificado")
+            affinity = max(0.0, min(1.0, float(course.get("score") or 0.0)))
+            nodes.append(
+                {
+                    "course_id": course.get("course_id"),
+                    "title": course.get("title"),
+                    "reason": (
+                        f"«{course.get('title')}» forma parte de la etapa {lane_name} de tu ruta para: {goal}. "
+                        f"Es un curso de {level_label}, con una afinidad del {affinity:.0%} con tu objetivo "
+                        f"y una dedicación aproximada de {duration_hours(course.get('duration')):.0f} horas; "
+                        f"en esta etapa {lane_purpose}."
+                    ),
+                    "lane": lane,
+                    "order": order,
+                }
+            )
+        position += size
+
+    total_hours = math.ceil(sum(duration_hours(course.get("duration")) for course in ranked))
+    weeks = max(1, math.ceil(total_hours / max(time_per_week, 1)))
+    stages = []
+    for lane, (lane_name, lane_purpose) in enumerate(LANES):
+        titles = [f"- {node['title']}" for node in nodes if node["lane"] == lane]
+        if titles:
+            stages.append(f"### Etapa {lane + 1}: {lane_name}\nEsta etapa {lane_purpose}.\n" + "\n".join(titles))
+    roadmap_text = (
+        f"## Ruta: {goal}\n\n"
+        + "\n\n".join(stages)
+        + f"\n\n## Tiempo estimado\nAlrededor de {total_hours} horas: unas {weeks} semanas dedicando "
+        f"{time_per_week} horas por semana.\n\n"
+        "## Consejos\n- Sigue las etapas en orden y practica con un pequeño proyecto al cerrar cada una.\n"
+        "- Reserva bloques fijos en tu semana y repasa lo aprendido antes de pasar al siguiente curso."
+    )
+    levels = [course.get("level") for course in ranked if course.get("level") in LEVELS_ORDER]
+    return {
+        "name": f"Ruta de aprendizaje: {goal[:80]}",
+        "description": (
+            f"Ruta de {len(nodes)} cursos ordenados por nivel y dedicación para avanzar desde {LEVEL_LABELS.get(user_level, user_level)} "
+            f"hacia tu objetivo, con una estimación de {weeks} semanas a {time_per_week} horas por semana."
+        ),
+        "nodes": nodes,
+        "roadmap_text": roadmap_text,
+        "estimated_weeks": weeks,
+        "estimated_total_hours": total_hours,
+        "difficulty_progression": " -> ".join(dict.fromkeys(levels)) or user_level,
+        "plan_source": PLAN_SOURCE_FALLBACK,
+    }
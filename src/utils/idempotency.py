@@ -0,0 +1,297 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, Optional, Protocol, Tuple
+
+from utils.deadline import NO_DEADLINE, Deadline
+from utils.request_context import RequestContext
+from utils.resilience import emit_metric
+from utils.serialization import encode_json
+
+logger = logging.getLogger(__name__)
+
+STATUS_CLAIMED = "claimed"
+STATUS_IN_PROGRESS = "in_progress"
+STATUS_COMPLETED = "completed"
+
+# (status, fingerprint, stored response); None when the key is unknown or expired
+KeyState = Optional[Tuple[str, str, Optional[Dict[str, Any]]]]
+
+
+class IdempotencyKeyReusedError(Exception):
+    """The client reused an idempotency key for a different request."""
+
+
+class RequestInProgressError(Exception):
+    """A duplicate of this request is still running and did not finish within the deadline."""
+
+    def __init__(self, retry_in: float) -> None:
+        super().__init__(f"Request with the same idempotency key still in progress; retry in {retry_in:.1f}s")
+        self.retry_in = retry_in
+
+
+def request_fingerprint(request: RequestContext) -> str:
+    """Hash of the fields that determine the generated path (not ``response_format``, applied when rendering)."""
+    canonical = json.dumps(
+        [request.user_query, request.user_level, request.time_per_week, request.num_courses, request.preferences],
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def idempotency_key(request: RequestContext, fingerprint: str, derive: bool = True) -> Optional[str]:
+    """Store key for the request, scoped to its user; derived from the request itself when the client sent none."""
+    if request.idempotency_key:
+        source = f"client:{request.idempotency_key}"
+    elif derive:
+        source = f"derived:{fingerprint}"
+    else:
+        return None
+    return hashlib.sha256(f"{request.user_id}\n{source}".encode("utf-8")).hexdigest()
+
+
+class IdempotencyStore(Protocol):
+    def claim(self, key: str, user_id: str, fingerprint: str, lease_s: float, ttl_s: float, deadline: Deadline) -> KeyState:
+        ...
+
+    def get(self, key: str, deadline: Deadline) -> KeyState:
+        ...
+
+    def complete(self, key: str, response: Dict[str, Any], ttl_s: float, deadline: Deadline) -> None:
+        ...
+
+    def release(self, key: str, deadline: Deadline) -> None:
+        ...
+
+
+class MemoryIdempotencyStore:
+    """Keys of this container only; enough for duplicates that land on the same (warm) instance."""
+
+    def __init__(self, max_entries: int = 1000) -> None:
+        # key -> [status, fingerprint, response, locked_until, expires_at]
+        self._entries: "OrderedDict[str, list]" = OrderedDict()
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+
+    def claim(self, key: str, user_id: str, fingerprint: str, lease_s: float, ttl_s: float, deadline: Deadline) -> KeyState:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[4] >= now and (entry[0] == STATUS_COMPLETED or entry[3] >= now):
+                return entry[0], entry[1], entry[2]
+            self._entries[key] = [STATUS_IN_PROGRESS, fingerprint, None, now + lease_s, now + ttl_s]
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+        return STATUS_CLAIMED, fingerprint, None
+
+    def get(self, key: str, deadline: Deadline) -> KeyState:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[4] < now or (entry[0] == STATUS_IN_PROGRESS and entry[3] < now):
+                return None
+            return entry[0], entry[1], entry[2]
+
+    def complete(self, key: str, response: Dict[str, Any], ttl_s: float, deadline: Deadline) -> None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry[0], entry[2], entry[4] = STATUS_COMPLETED, response, time.time() + ttl_s
+
+    def release(self, key: str, deadline: Deadline) -> None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == STATUS_IN_PROGRESS:
+                del self._entries[key]
+
+
+class PostgresIdempotencyStore:
+    """Keys in the ``idempotency_keys`` table, shared by every container (see README for the DDL)."""
+
+    def __init__(self, postgres_client: Any) -> None:
+        self._client = postgres_client
+
+    def claim(self, key: str, user_id: str, fingerprint: str, lease_s: float, ttl_s: float, deadline: Deadline) -> KeyState:
+        row = self._client.claim_idempotency_key(key, user_id, fingerprint, lease_s, ttl_s, deadline)
+        # No row: a concurrent request claimed the key between our snapshot and our insert
+        return tuple(row) if row is not None else (STATUS_IN_PROGRESS, fingerprint, None)
+
+    def get(self, key: str, deadline: Deadline) -> KeyState:
+        row = self._client.get_idempotency_key(key, deadline)
+        return tuple(row) if row is not None else None
+
+    def complete(self, key: str, response: Dict[str, Any], ttl_s: float, deadline: Deadline) -> None:
+        self._client.complete_idempotency_key(key, encode_json(response), ttl_s, deadline)
+
+    def release(self, key: str, deadline: Deadline) -> None:
+        self._client.release_idempotency_key(key, deadline)
+
+
+class IdempotencyGuard:
+    """Runs each request key at most once and hands its response to the duplicates.
+
+    The first request claims the key (for ``lease_s``) and computes; duplicates in the same
+    container join its in-flight future, duplicates elsewhere poll the store until the
+    response is stored, the owner's lease runs out (they take over) or the deadline is
+    near (RequestInProgressError). A failed request releases its key, and so does a
+    response ``is_storable`` rejects (a degraded answer a retry should not get back). If the
+    store itself fails, the request runs unguarded rather than failing.
+    """
+
+    def __init__(
+        self,
+        store: IdempotencyStore,
+        ttl_s: float = 900.0,
+        lease_s: float = 60.0,
+        poll_s: float = 0.25,
+        is_storable: Optional[Callable[[Dict[str, Any]], bool]] = None,
+    ) -> None:
+        self._store = store
+        self._is_storable = is_storable
+        self._ttl_s = ttl_s
+        self._lease_s = lease_s
+        self._poll_s = poll_s
+        # key -> (future of the owner's response, its fingerprint)
+        self._inflight: Dict[str, Tuple[Future, str]] = {}
+        self._lock = threading.Lock()
+
+    def run(
+        self,
+        key: str,
+        user_id: str,
+        fingerprint: str,
+        compute: Callable[[], Dict[str, Any]],
+        deadline: Deadline = NO_DEADLINE,
+    ) -> Tuple[Dict[str, Any], bool]:
+        """(response, replayed): ``replayed`` is True when the response was produced by an earlier request."""
+        with self._lock:
+            owner = key not in self._inflight
+            if owner:
+                self._inflight[key] = (Future(), fingerprint)
+            inflight, inflight_fingerprint = self._inflight[key]
+        if not owner:
+            if inflight_fingerprint != fingerprint:
+                emit_metric("IdempotencyOutcomeCount", 1, {"Outcome": "key_reused"})
+                raise IdempotencyKeyReusedError("Idempotency key reused with a different request")
+            return self._join(inflight, deadline), True
+        try:
+            response, replayed = self._run_owned(key, user_id, fingerprint, compute, deadline)
+        except BaseException as exc:
+            inflight.set_exception(exc)
+            raise
+        else:
+            inflight.set_result(response)
+            return response, replayed
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _join(self, inflight: Future, deadline: Deadline) -> Dict[str, Any]:
+        emit_metric("IdempotencyOutcomeCount", 1, {"Outcome": "joined"})
+        timeout = None if not deadline.bounded else deadline.remaining()
+        try:
+            return inflight.result(timeout=timeout)
+        except FutureTimeoutError:
+            raise RequestInProgressError(self._poll_s) from None
+
+    def _run_owned(
+        self,
+        key: str,
+        user_id: str,
+        fingerprint: str,
+        compute: Callable[[], Dict[str, Any]],
+        deadline: Deadline,
+    ) -> Tuple[Dict[str, Any], bool]:
+        while True:
+            try:
+                status, stored_fingerprint, response = self._store.claim(
+                    key, user_id, fingerprint, self._lease_s, self._ttl_s, deadline
+                )
+            except Exception as exc:  # noqa: BLE001
+                logger.warning(json.dumps({"event": "idempotency_store_failed", "operation": "claim", "error": str(exc)}))
+                emit_metric("IdempotencyOutcomeCount", 1, {"Outcome": "store_error"})
+                return compute(), False
+            if stored_fingerprint != fingerprint:
+                emit_metric("IdempotencyOutcomeCount", 1, {"Outcome": "key_reused"})
+                raise IdempotencyKeyReusedError("Idempotency key reused with a different request")
+            if status == STATUS_CLAIMED:
+                emit_metric("IdempotencyOutcomeCount", 1, {"Outcome": "claimed"})
+                return self._compute_and_store(key, compute, deadline), False
+            if status == STATUS_COMPLETED and response is not None:
+                emit_metric("IdempotencyOutcomeCount", 1, {"Outcome": "replayed"})
+                return response, True
+            response = self._wait_for_owner(key, deadline)
+            if response is not None:
+                emit_metric("IdempotencyOutcomeCount", 1, {"Outcome": "waited"})
+                return response, True
+            # The owner failed or its lease ran out: try to take the key over
+
+    def _compute_and_store(self, key: str, compute: Callable[[], Dict[str, Any]], deadline: Deadline) -> Dict[str, Any]:
+        try:
+            response = compute()
+        except BaseException:
+            self._release(key)
+            raise
+        if self._is_storable is not None and not self._is_storable(response):
+            emit_metric("IdempotencyOutcomeCount", 1, {"Outcome": "not_stored"})
+            self._release(key)
+            return response
+        try:
+            # The response is already computed; storing it must not be cut short by the deadline
+            self._store.complete(key, response, self._ttl_s, NO_DEADLINE)
+        except Exception as exc:  # noqa: BLE001
+            logger.warning(json.dumps({"event": "idempotency_store_failed", "operation": "complete", "error": str(exc)}))
+        return response
+
+    def _release(self, key: str) -> None:
+        try:
+            self._store.release(key, NO_DEADLINE)
+        except Exception as exc:  # noqa: BLE001
+            logger.warning(json.dumps({"event": "idempotency_store_failed", "operation": "release", "error": str(exc)}))
+
+    def _wait_for_owner(self, key: str, deadline: Deadline) -> Optional[Dict[str, Any]]:
+        """Response stored by the owner, or None when the key was released or its lease expired."""
+        while True:
+            if not deadline.allows(self._poll_s):
+                emit_metric("IdempotencyOutcomeCount", 1, {"Outcome": "in_progress"})
+                raise RequestInProgressError(max(self._poll_s, 1.0))
+            time.sleep(self._poll_s)
+            try:
+                state = self._store.get(key, deadline)
+            except Exception as exc:  # noqa: BLE001
+                # Back to claim(), which runs the request unguarded if the store stays down
+                logger.warning(json.dumps({"event": "idempotency_store_failed", "operation": "get", "error": str(exc)}))
+                return None
+            if state is None:
+                return None
+            status, _, response = state
+            if status == STATUS_COMPLETED:
+                return response
+
+
+def build_idempotency_guard(
+    postgres_client: Any, is_storable: Optional[Callable[[Dict[str, Any]], bool]] = None
+) -> Optional[IdempotencyGuard]:
+    backend = os.getenv("IDEMPOTENCY_BACKEND", "none").lower()
+    if backend == "memory":
+        store: IdempotencyStore = MemoryIdempotencyStore(int(os.getenv("IDEMPOTENCY_MEMORY_MAX_KEYS", "1000")))
+    elif backend == "postgres":
+        store = PostgresIdempotencyStore(postgres_client)
+    else:
+        return None
+    return IdempotencyGuard(
+        store,
+        ttl_s=int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "900")),
+        lease_s=int(os.getenv("IDEMPOTENCY_LEASE_SECONDS", "60")),
+        poll_s=int(os.getenv("IDEMPOTENCY_POLL_MS", "250")) / 1000,
+        is_storable=is_storable,
+    )
@@ -0,0 +1,379 @@
+import contextvars
+import json
+import logging
+import os
+import sqlite3
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional, Protocol, Tuple
+
+from utils.serialization import encode_json
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+FINISHED_STATUSES = (JOB_SUCCEEDED, JOB_FAILED)
+
+# Columns a worker may change after the job is created; the JSON ones are stored encoded
+UPDATABLE_FIELDS = ("status", "stage", "stages", "result", "error", "attempts")
+JSON_FIELDS = ("request", "stages", "result", "error")
+
+
+class Job:
+    """A generation request submitted in async mode, with its progress and outcome."""
+
+    __slots__ = ("job_id", "user_id", "request", "status", "stage", "stages", "result", "error", "attempts", "created_at", "updated_at")
+
+    def __init__(
+        self,
+        job_id: str,
+        user_id: str,
+        request: Dict[str, Any],
+        status: str = JOB_QUEUED,
+        stage: str = JOB_QUEUED,
+        stages: Optional[Dict[str, int]] = None,
+        result: Optional[Dict[str, Any]] = None,
+        error: Optional[Dict[str, Any]] = None,
+        attempts: int = 0,
+        created_at: Optional[str] = None,
+        updated_at: Optional[str] = None,
+    ) -> None:
+        self.job_id = job_id
+        self.user_id = user_id
+        self.request = request
+        self.status = status
+        self.stage = stage
+        # stage -> ms since the job was created when the stage started
+        self.stages = stages if stages is not None else {JOB_QUEUED: 0}
+        self.result = result
+        self.error = error
+        self.attempts = attempts
+        self.created_at = created_at or _now_iso()
+        self.updated_at = updated_at or self.created_at
+
+    @classmethod
+    def new(cls, user_id: str, request: Dict[str, Any]) -> "Job":
+        return cls(str(uuid.uuid4()), user_id, request)
+
+    def elapsed_ms(self) -> int:
+        created = datetime.fromisoformat(self.created_at)
+        return max(int((datetime.now(timezone.utc) - created).total_seconds() * 1000), 0)
+
+    def status_view(self) -> Dict[str, Any]:
+        """What GET /jobs/{id} returns, without the stored request or result."""
+        view: Dict[str, Any] = {
+            "job_id": self.job_id,
+            "status": self.status,
+            "stage": self.stage,
+            "stages": self.stages,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+        if self.error:
+            view["error"] = self.error
+        return view
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class JobStore(Protocol):
+    def create(self, job: Job) -> None:
+        ...
+
+    def get(self, job_id: str) -> Optional[Job]:
+        ...
+
+    def update(self, job_id: str, **fields: Any) -> None:
+        ...
+
+
+class SQLiteJobStore:
+    """Jobs in a local SQLite file (or ``:memory:``), for local runs and single-host deployments."""
+
+    def __init__(self, path: str) -> None:
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS generation_jobs (
+                    job_id TEXT PRIMARY KEY,
+                    user_id TEXT NOT NULL,
+                    request TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    stage TEXT NOT NULL,
+                    stages TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                )
+                """
+            )
+
+    def create(self, job: Job) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO generation_jobs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    job.job_id,
+                    job.user_id,
+                    encode_json(job.request),
+                    job.status,
+                    job.stage,
+                    encode_json(job.stages),
+                    None,
+                    None,
+                    job.attempts,
+                    job.created_at,
+                    job.updated_at,
+                ),
+            )
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT job_id, user_id, request, status, stage, stages, result, error, attempts, created_at, updated_at "
+                "FROM generation_jobs WHERE job_id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        return Job(
+            row[0],
+            row[1],
+            json.loads(row[2]),
+            row[3],
+            row[4],
+            json.loads(row[5]),
+            json.loads(row[6]) if row[6] else None,
+            json.loads(row[7]) if row[7] else None,
+            row[8],
+            row[9],
+            row[10],
+        )
+
+    def update(self, job_id: str, **fields: Any) -> None:
+        columns, values = _update_columns(fields)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"UPDATE generation_jobs SET {', '.join(f'{column} = ?' for column in columns)} WHERE job_id = ?",
+                (*values, job_id),
+            )
+
+
+class PostgresJobStore:
+    """Jobs in the ``generation_jobs`` table, visible to every container (see README for the DDL)."""
+
+    def __init__(self, postgres_client: Any) -> None:
+        self._client = postgres_client
+
+    def create(self, job: Job) -> None:
+        self._client.create_job(
+            {
+                "job_id": job.job_id,
+                "user_id": job.user_id,
+                "request": encode_json(job.request),
+                "status": job.status,
+                "stage": job.stage,
+                "stages": encode_json(job.stages),
+                "attempts": job.attempts,
+                "created_at": job.created_at,
+            }
+        )
+
+    def get(self, job_id: str) -> Optional[Job]:
+        row = self._client.get_job(job_id)
+        if row is None:
+            return None
+        # JSONB columns arrive decoded; timestamps as datetimes
+        return Job(*row[:9], created_at=row[9].isoformat(), updated_at=row[10].isoformat())
+
+    def update(self, job_id: str, **fields: Any) -> None:
+        columns, values = _update_columns(fields)
+        self._client.update_job(job_id, columns, values)
+
+
+def _update_columns(fields: Dict[str, Any]) -> Tuple[List[str], List[Any]]:
+    unknown = set(fields) - set(UPDATABLE_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown job fields: {sorted(unknown)}")
+    columns: List[str] = []
+    values: List[Any] = []
+    for column, value in fields.items():
+        columns.append(column)
+        values.append(encode_json(value) if column in JSON_FIELDS and value is not None else value)
+    columns.append("updated_at")
+    values.append(_now_iso())
+    return columns, values
+
+
+def retry_delay_s(attempt: int, base_s: float, max_s: float) -> float:
+    """Backoff before running again a job deferred on its ``attempt``-th try."""
+    return min(base_s * 2 ** (attempt - 1), max_s)
+
+
+class JobQueue(Protocol):
+    def submit(self, job_id: str) -> None:
+        ...
+
+    def close(self) -> None:
+        ...
+
+
+class LocalJobQueue:
+    """Runs jobs on worker threads of this process: the local stand-in for the SQS queue.
+
+    Not durable, and on Lambda the threads are frozen between invocations, so it is
+    meant for local runs and long-running servers. A deferred job is retried on the same
+    worker after a backoff, up to ``max_attempts`` tries; the last one fails it for good.
+    """
+
+    def __init__(
+        self,
+        run_job: Callable[..., bool],
+        workers: int = 2,
+        max_attempts: int = 5,
+        retry_base_s: float = 30.0,
+        retry_max_s: float = 900.0,
+    ) -> None:
+        self._run_job = run_job
+        self._max_attempts = max(1, max_attempts)
+        self._retry_base_s = retry_base_s
+        self._retry_max_s = retry_max_s
+        self._closing = threading.Event()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job-worker")
+
+    def submit(self, job_id: str) -> None:
+        # A fresh context: the job must not inherit the submitting request's usage ledger
+        self._executor.submit(contextvars.Context().run, self._run, job_id)
+
+    def _run(self, job_id: str) -> None:
+        attempt = 1
+        while True:
+            # Shutting down: no later retry will happen, so this try is the last
+            final_attempt = attempt >= self._max_attempts or self._closing.is_set()
+            try:
+                if self._run_job(job_id, final_attempt=final_attempt) or final_attempt:
+                    return
+            except Exception as exc:  # noqa: BLE001
+                # Nobody waits on the future; without this the error would vanish
+                logger.error(json.dumps({"event": "job_worker_failed", "job_id": job_id, "error": str(exc)}))
+                return
+            # Woken early by close(), which turns the next try into the final one
+            self._closing.wait(retry_delay_s(attempt, self._retry_base_s, self._retry_max_s))
+            attempt += 1
+
+    def close(self) -> None:
+        """Wait for submitted jobs: they exist nowhere else."""
+        self._closing.set()
+        self._executor.shutdown(wait=True)
+
+
+class SQSJobQueue:
+    """Job ids on an SQS queue, consumed by ``job_worker_handler``."""
+
+    def __init__(self, queue_url: str, retry_base_s: float = 30.0, retry_max_s: float = 900.0) -> None:
+        self._queue_url = queue_url
+        self._retry_base_s = retry_base_s
+        self._retry_max_s = retry_max_s
+        self._client = None
+
+    def _get_client(self):
+        if self._client is None:
+            import boto3
+
+            self._client = boto3.client("sqs", region_name="us-east-2")
+        return self._client
+
+    def submit(self, job_id: str) -> None:
+        self._get_client().send_message(QueueUrl=self._queue_url, MessageBody=json.dumps({"job_id": job_id}))
+
+    def defer(self, receipt_handle: str, receives: int) -> None:
+        """Make a deferred message visible again after a backoff instead of the queue's visibility timeout."""
+        delay_s = retry_delay_s(receives, self._retry_base_s, self._retry_max_s)
+        try:
+            self._get_client().change_message_visibility(
+                QueueUrl=self._queue_url, ReceiptHandle=receipt_handle, VisibilityTimeout=int(delay_s)
+            )
+        except Exception as exc:  # noqa: BLE001
+            # The message still comes back, after the queue's own visibility timeout
+            logger.warning(json.dumps({"event": "job_defer_failed", "error": str(exc)}))
+
+    def close(self) -> None:
+        return None
+
+
+class JobProgress:
+    """Stage updates of the job running in the current context."""
+
+    def __init__(self, store: JobStore, job: Job) -> None:
+        self._store = store
+        self._job = job
+
+    def stage(self, stage: str) -> None:
+        self._job.stage = stage
+        self._job.stages = {**self._job.stages, stage: self._job.elapsed_ms()}
+        try:
+            self._store.update(self._job.job_id, stage=stage, stages=self._job.stages)
+        except Exception as exc:  # noqa: BLE001
+            # Progress is informative; losing an update must not fail the generation
+            logger.warning(json.dumps({"event": "job_progress_failed", "job_id": self._job.job_id, "error": str(exc)}))
+
+
+_progress: contextvars.ContextVar[Optional[JobProgress]] = contextvars.ContextVar("job_progress", default=None)
+
+
+@contextmanager
+def job_progress(store: JobStore, job: Job) -> Iterator[JobProgress]:
+    progress = JobProgress(store, job)
+    token = _progress.set(progress)
+    try:
+        yield progress
+    finally:
+        _progress.reset(token)
+
+
+def report_job_stage(stage: str) -> None:
+    """Record that the pipeline entered ``stage``; a no-op outside an async job."""
+    progress = _progress.get()
+    if progress is not None:
+        progress.stage(stage)
+
+
+def build_job_store(postgres_client: Any) -> JobStore:
+    backend = os.getenv("JOB_STORE_BACKEND", "sqlite").lower()
+    if backend == "postgres":
+        return PostgresJobStore(postgres_client)
+    return SQLiteJobStore(os.getenv("JOB_STORE_PATH", "/tmp/generation_jobs.sqlite3"))
+
+
+def build_job_queue(run_job: Callable[..., bool]) -> Optional[JobQueue]:
+    backend = os.getenv("JOB_QUEUE_BACKEND", "none").lower()
+    retry_base_s = float(os.getenv("JOB_RETRY_BASE_SECONDS", "30"))
+    retry_max_s = float(os.getenv("JOB_RETRY_MAX_SECONDS", "900"))
+    if backend == "local":
+        return LocalJobQueue(
+            run_job,
+            int(os.getenv("JOB_LOCAL_WORKERS", "2")),
+            int(os.getenv("JOB_MAX_RECEIVES", "5")),
+            retry_base_s,
+            retry_max_s,
+        )
+    if backend == "sqs":
+        queue_url = os.getenv("JOB_QUEUE_URL")
+        if not queue_url:
+            logger.error(json.dumps({"event": "job_queue_disabled", "error": "JOB_QUEUE_URL is required for the sqs job queue"}))
+            return None
+        return SQSJobQueue(queue_url, retry_base_s, retry_max_s)
+    return None
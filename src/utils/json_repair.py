@@ -0,0 +1,119 @@
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+# Cut points tried (latest first) when closing a truncated object
+MAX_CUT_ATTEMPTS = 64
+
+
+class RepairedJson:
+    __slots__ = ("value", "truncated", "repaired")
+
+    def __init__(self, value: Dict[str, Any], truncated: bool, repaired: bool) -> None:
+        self.value = value
+        self.truncated = truncated
+        self.repaired = repaired
+
+
+def _scan(text: str, start: int) -> Tuple[Optional[int], List[Tuple[int, str]]]:
+    """Find the end of the object opening at ``start``.
+
+    Returns (end index or None if the text stops first, cut points). A cut point is a
+    position where the text can be cut and closed with the given closers to stay valid:
+    just before a comma, or just after a nested value closes.
+    """
+    stack: List[str] = []
+    in_string = False
+    escaped = False
+    cut_points: List[Tuple[int, str]] = []
+    for index in range(start, len(text)):
+        char = text[index]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+        elif char in "}]":
+            if stack:
+                stack.pop()
+            if not stack:
+                return index + 1, cut_points
+            cut_points.append((index + 1, "".join(reversed(stack))))
+        elif char == ",":
+            cut_points.append((index, "".join(reversed(stack))))
+    return None, cut_points
+
+
+def _strip_trailing_commas(text: str) -> str:
+    out: List[str] = []
+    in_string = False
+    escaped = False
+    for index, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == ",":
+            following = text[index + 1 :].lstrip()
+            if following[:1] in ("}", "]"):
+                continue
+        out.append(char)
+    return "".join(out)
+
+
+def _loads_object(text: str) -> Optional[Dict[str, Any]]:
+    # strict=False accepts raw newlines/tabs inside strings, common in markdown fields
+    for candidate in (text, _strip_trailing_commas(text)):
+        try:
+            value = json.loads(candidate, strict=False)
+        except json.JSONDecodeError:
+            continue
+        return value if isinstance(value, dict) else None
+    return None
+
+
+def is_truncated_json(text: str) -> bool:
+    """True when an object starts but the text ends before it closes (e.g. stopped at maxTokens)."""
+    start = text.find("{")
+    return start >= 0 and _scan(text, start)[0] is None
+
+
+def parse_json_object(text: str) -> RepairedJson:
+    """Recover the outermost JSON object from model output.
+
+    Handles leading prose or code fences, trailing commentary, trailing commas and raw
+    control characters in strings. A truncated object is cut back to the last complete
+    value and closed, so everything before the cut (e.g. finished ``nodes``) survives.
+    Raises ValueError when nothing usable is found.
+    """
+    try:
+        value = json.loads(text)
+    except json.JSONDecodeError:
+        value = None
+    if isinstance(value, dict):
+        return RepairedJson(value, truncated=False, repaired=False)
+    start = text.find("{")
+    if start < 0:
+        raise ValueError("No JSON object found")
+    end, cut_points = _scan(text, start)
+    if end is not None:
+        value = _loads_object(text[start:end])
+        if value is None:
+            raise ValueError("JSON object could not be repaired")
+        return RepairedJson(value, truncated=False, repaired=True)
+    for index, closers in reversed(cut_points[-MAX_CUT_ATTEMPTS:]):
+        value = _loads_object(text[start:index] + closers)
+        if value is not None:
+            return RepairedJson(value, truncated=True, repaired=True)
+    raise ValueError("Truncated JSON object could not be recovered")
@@ -0,0 +1,77 @@
+import json
+from typing import Any, Dict, List
+
+
+class IncrementalNodesParser:
+    """Extracts complete ``nodes[]`` elements from a JSON object that arrives in pieces.
+
+    Text before the first ``{`` (e.g. a code fence) is ignored. The scanner keeps
+    string/escape state and nesting depth, so each character is inspected once
+    no matter how the stream is chunked.
+    """
+
+    def __init__(self) -> None:
+        self._position = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._started = False
+        self._last_key = ""
+        self._key_start = -1
+        self._in_nodes = False
+        self._element_start = -1
+        self._text = ""
+
+    @property
+    def text(self) -> str:
+        return self._text
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """Consume a chunk and return the nodes completed by it."""
+        self._text += chunk
+        completed: List[Dict[str, Any]] = []
+        text = self._text
+        for index in range(self._position, len(text)):
+            char = text[index]
+            if not self._started:
+                if char == "{":
+                    self._started = True
+                    self._depth = 1
+                continue
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._key_start >= 0:
+                        self._last_key = text[self._key_start : index]
+                        self._key_start = -1
+                continue
+            if char == '"':
+                self._in_string = True
+                if self._depth == 1:
+                    self._key_start = index + 1
+            elif char in "{[":
+                self._depth += 1
+                if self._depth == 2 and char == "[" and self._last_key == "nodes":
+                    self._in_nodes = True
+                elif self._in_nodes and self._depth == 3 and char == "{":
+                    self._element_start = index
+            elif char in "}]":
+                if self._in_nodes and self._depth == 3 and char == "}" and self._element_start >= 0:
+                    try:
+                        completed.append(json.loads(text[self._element_start : index + 1]))
+                    except json.JSONDecodeError:
+                        pass
+                    self._element_start = -1
+                elif self._in_nodes and self._depth == 2 and char == "]":
+                    self._in_nodes = False
+                self._depth -= 1
+            elif char == ":" and self._depth == 1:
+                self._key_start = -1
+            elif char == "," and self._depth == 1:
+                self._last_key = ""
+        self._position = len(text)
+        return completed
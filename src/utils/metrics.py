@@ -0,0 +1,194 @@
+import contextvars
+import json
+import logging
+import os
+import sys
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Protocol, Tuple
+
+logger = logging.getLogger(__name__)
+
+NAMESPACE = "LearnIA/Lambda/LearningPathGenerator"
+# PutMetricData accepts up to 1000 metric data points per request
+PUT_METRIC_DATA_BATCH = 1000
+
+Dimensions = Tuple[Tuple[str, str], ...]
+
+
+class MetricDatum:
+    __slots__ = ("name", "value", "unit", "dimensions", "timestamp")
+
+    def __init__(self, name: str, value: float, unit: str, dimensions: Dimensions, timestamp: datetime) -> None:
+        self.name = name
+        self.value = value
+        self.unit = unit
+        self.dimensions = dimensions
+        self.timestamp = timestamp
+
+
+def unit_for(name: str) -> str:
+    return "Milliseconds" if name.endswith("Ms") else "Count"
+
+
+class MetricsSink(Protocol):
+    def publish(self, data: List[MetricDatum]) -> None:
+        ...
+
+
+class CloudWatchSink:
+    """One PutMetricData call per flush (chunked at the API limit)."""
+
+    def __init__(self, namespace: str = NAMESPACE) -> None:
+        self._namespace = namespace
+        self._client = None
+
+    def _get_client(self):
+        if self._client is None:
+            import boto3
+
+            self._client = boto3.client("cloudwatch", region_name="us-east-2")
+        return self._client
+
+    def publish(self, data: List[MetricDatum]) -> None:
+        from botocore.exceptions import BotoCoreError, ClientError
+
+        metric_data = [
+            {
+                "MetricName": datum.name,
+                "Timestamp": datum.timestamp,
+                "Value": float(datum.value),
+                "Unit": datum.unit,
+                **({"Dimensions": [{"Name": k, "Value": v} for k, v in datum.dimensions]} if datum.dimensions else {}),
+            }
+            for datum in data
+        ]
+        for start in range(0, len(metric_data), PUT_METRIC_DATA_BATCH):
+            batch = metric_data[start : start + PUT_METRIC_DATA_BATCH]
+            try:
+                self._get_client().put_metric_data(Namespace=self._namespace, MetricData=batch)
+            except (ClientError, BotoCoreError) as exc:
+                logger.warning(
+                    json.dumps({"event": "cloudwatch_metric_failed", "metrics": len(batch), "error": str(exc)})
+                )
+
+
+class EmbeddedMetricFormatSink:
+    """CloudWatch Embedded Metric Format on stdout: Logs extracts the metrics, no network call."""
+
+    def __init__(self, namespace: str = NAMESPACE, stream=None) -> None:
+        self._namespace = namespace
+        self._stream = stream
+
+    def publish(self, data: List[MetricDatum]) -> None:
+        groups: "OrderedDict[Dimensions, List[MetricDatum]]" = OrderedDict()
+        for datum in data:
+            groups.setdefault(datum.dimensions, []).append(datum)
+        stream = self._stream or sys.stdout
+        for dimensions, datums in groups.items():
+            stream.write(json.dumps(self._render(dimensions, datums)) + "\n")
+        stream.flush()
+
+    def _render(self, dimensions: Dimensions, datums: List[MetricDatum]) -> Dict[str, Any]:
+        values: Dict[str, List[float]] = OrderedDict()
+        units: Dict[str, str] = {}
+        for datum in datums:
+            values.setdefault(datum.name, []).append(float(datum.value))
+            units[datum.name] = datum.unit
+        document: Dict[str, Any] = {
+            "_aws": {
+                "Timestamp": int(datums[0].timestamp.timestamp() * 1000),
+                "CloudWatchMetrics": [
+                    {
+                        "Namespace": self._namespace,
+                        "Dimensions": [[name for name, _ in dimensions]],
+                        "Metrics": [{"Name": name, "Unit": units[name]} for name in values],
+                    }
+                ],
+            },
+            **dict(dimensions),
+        }
+        for name, metric_values in values.items():
+            document[name] = metric_values[0] if len(metric_values) == 1 else metric_values
+        return document
+
+
+class InMemorySink:
+    """Local stand-in that keeps every published datum, for tests and benchmarks."""
+
+    def __init__(self) -> None:
+        self.published: List[MetricDatum] = []
+
+    def publish(self, data: List[MetricDatum]) -> None:
+        self.published.extend(data)
+
+    def values(self, name: str) -> List[float]:
+        return [datum.value for datum in self.published if datum.name == name]
+
+
+# The buffer of the request running in this context; like the usage ledger, it follows the
+# request into work submitted with contextvars.copy_context().run
+_request_buffer: contextvars.ContextVar[Optional[List[MetricDatum]]] = contextvars.ContextVar(
+    "request_metrics", default=None
+)
+
+
+class MetricsRecorder:
+    """Buffers data points per request and publishes each request's points in a single flush.
+
+    Concurrent requests (server mode, batch items) keep separate buffers, so one request's
+    flush never publishes another's in-flight points. Points recorded outside any request
+    (background threads such as the outbox flusher) go to a shared buffer, published with
+    the next flush. A datum recorded with dimensions is also recorded without them, so
+    existing dashboards on the dimensionless metric keep working.
+    """
+
+    def __init__(self, sink: Optional[MetricsSink]) -> None:
+        self._sink = sink
+        self._background: List[MetricDatum] = []
+        self._lock = threading.Lock()
+
+    def start_request(self) -> None:
+        """Start a buffer for the request running in the current context."""
+        _request_buffer.set([])
+
+    def record(self, name: str, value: float, dimensions: Optional[Dict[str, str]] = None) -> None:
+        if self._sink is None:
+            return
+        timestamp = datetime.now(timezone.utc)
+        unit = unit_for(name)
+        data = [MetricDatum(name, value, unit, (), timestamp)]
+        if dimensions:
+            dims = tuple(sorted((key, str(val)) for key, val in dimensions.items()))
+            data.append(MetricDatum(name, value, unit, dims, timestamp))
+        buffer = _request_buffer.get()
+        with self._lock:
+            (buffer if buffer is not None else self._background).extend(data)
+
+    def flush(self) -> None:
+        """Publish the current request's points (and any background ones) and end its buffer."""
+        buffer = _request_buffer.get()
+        with self._lock:
+            pending, self._background = self._background, []
+            if buffer is not None:
+                pending = buffer + pending
+                buffer.clear()
+        _request_buffer.set(None)
+        if not pending or self._sink is None:
+            return
+        try:
+            self._sink.publish(pending)
+        except Exception as exc:  # noqa: BLE001
+            logger.warning(json.dumps({"event": "metrics_flush_failed", "metrics": len(pending), "error": str(exc)}))
+
+
+def build_metrics_recorder() -> MetricsRecorder:
+    sink_name = os.getenv("METRICS_SINK", "cloudwatch").lower()
+    sinks = {
+        "cloudwatch": CloudWatchSink,
+        "emf": EmbeddedMetricFormatSink,
+        "memory": InMemorySink,
+    }
+    sink_cls = sinks.get(sink_name)
+    return MetricsRecorder(sink_cls() if sink_cls else None)
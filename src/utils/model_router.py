@@ -0,0 +1,123 @@
+import os
+import statistics
+import threading
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+from utils.resilience import emit_metric
+
+# Samples needed before a model's profile is trusted to route traffic away from it
+MIN_SAMPLES = 5
+
+
+class ModelProfile:
+    """Rolling latency/error window of one model in this container."""
+
+    def __init__(self, window: int = 50) -> None:
+        self._latencies: Deque[float] = deque(maxlen=window)
+        self._outcomes: Deque[bool] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, latency_s: float, ok: bool) -> None:
+        with self._lock:
+            self._outcomes.append(ok)
+            if ok:
+                self._latencies.append(latency_s)
+
+    def snapshot(self) -> Tuple[int, Optional[float], float]:
+        """(calls in window, p50 latency of successful calls or None, error rate)."""
+        with self._lock:
+            calls = len(self._outcomes)
+            p50 = statistics.median(self._latencies) if self._latencies else None
+            errors = sum(1 for ok in self._outcomes if not ok)
+        return calls, p50, errors / calls if calls else 0.0
+
+
+class ModelRouter:
+    """Chooses the Nova model per call and sizes its output budget.
+
+    Calls expected to produce at most ``small_max_items`` courses go to ``small_model``
+    while its observed p50 stays under ``small_max_p50_s`` and its error rate under
+    ``max_error_rate``; everything else goes to ``large_model``. While the small tier is
+    demoted, one eligible call in ``probe_every`` still goes to it so its profile can recover.
+    Without a small model every call uses the large one.
+    """
+
+    def __init__(
+        self,
+        large_model: str,
+        small_model: str = "",
+        small_max_items: int = 5,
+        small_max_p50_s: float = 6.0,
+        max_error_rate: float = 0.2,
+        probe_every: int = 20,
+        window: int = 50,
+        base_output_tokens: int = 1200,
+        output_tokens_per_item: int = 300,
+        max_output_tokens: int = 4096,
+    ) -> None:
+        self.large_model = large_model
+        self.small_model = small_model
+        self._small_max_items = small_max_items
+        self._small_max_p50_s = small_max_p50_s
+        self._max_error_rate = max_error_rate
+        self._probe_every = max(1, probe_every)
+        self._base_output_tokens = base_output_tokens
+        self._output_tokens_per_item = output_tokens_per_item
+        self._max_output_tokens = max_output_tokens
+        self._profiles: Dict[str, ModelProfile] = {
+            model: ModelProfile(window) for model in (large_model, small_model) if model
+        }
+        self._demoted_calls = 0
+        self._lock = threading.Lock()
+
+    def choose(self, expected_items: Optional[int]) -> str:
+        model, reason = self._choose(expected_items)
+        emit_metric("NovaModelRoutedCount", 1, {"Model": model, "Reason": reason})
+        return model
+
+    def _choose(self, expected_items: Optional[int]) -> Tuple[str, str]:
+        if not self.small_model or expected_items is None:
+            return self.large_model, "default"
+        if expected_items > self._small_max_items:
+            return self.large_model, "size"
+        calls, p50, error_rate = self._profiles[self.small_model].snapshot()
+        demoted_by = None
+        if calls >= MIN_SAMPLES:
+            if error_rate > self._max_error_rate:
+                demoted_by = "small_errors"
+            elif p50 is not None and p50 > self._small_max_p50_s:
+                demoted_by = "small_slow"
+        if demoted_by is None:
+            return self.small_model, "size"
+        with self._lock:
+            self._demoted_calls += 1
+            probe = self._demoted_calls % self._probe_every == 0
+        return (self.small_model, "probe") if probe else (self.large_model, demoted_by)
+
+    def max_tokens_for(self, expected_items: Optional[int]) -> int:
+        """Output budget for a full plan of ``expected_items`` courses (header + reasons + roadmap)."""
+        if expected_items is None:
+            return self._max_output_tokens
+        sized = self._base_output_tokens + self._output_tokens_per_item * max(expected_items, 1)
+        return min(sized, self._max_output_tokens)
+
+    def record(self, model: str, latency_s: float, ok: bool) -> None:
+        profile = self._profiles.get(model)
+        if profile is not None:
+            profile.record(latency_s, ok)
+
+
+def build_model_router(large_model: str) -> ModelRouter:
+    return ModelRouter(
+        large_model,
+        os.getenv("NOVA_SMALL_MODEL", ""),
+        small_max_items=int(os.getenv("NOVA_SMALL_MAX_COURSES", "5")),
+        small_max_p50_s=int(os.getenv("NOVA_SMALL_MAX_P50_MS", "6000")) / 1000,
+        max_error_rate=float(os.getenv("NOVA_ROUTER_MAX_ERROR_RATE", "0.2")),
+        probe_every=int(os.getenv("NOVA_ROUTER_PROBE_EVERY", "20")),
+        window=int(os.getenv("NOVA_ROUTER_WINDOW", "50")),
+        base_output_tokens=int(os.getenv("NOVA_OUTPUT_BASE_TOKENS", "1200")),
+        output_tokens_per_item=int(os.getenv("NOVA_OUTPUT_TOKENS_PER_COURSE", "300")),
+        max_output_tokens=int(os.getenv("NOVA_MAX_TOKENS", "4096")),
+    )
@@ -1,16 +1,39 @@
 import json
 import logging
 import os
+import threading
 import time
-from typing import Any, Dict, Iterable, List, Optional
+from contextlib import nullcontext
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Sequence, Tuple
 
-from bson import ObjectId
-from pymongo import MongoClient
-from pymongo.collection import Collection
-from pymongo.errors import PyMongoError
+from utils.candidate_planner import CandidatePlanner
+from utils.deadline import NO_DEADLINE, Deadline
+from utils.resilience import get_policy
+from utils.search_filters import (
+    COURSE_FIELDS,
+    LEVELS_ORDER,
+    compile_atlas_filter,
+    filter_signature,
+    relaxation_stages,
+)
+
+if TYPE_CHECKING:
+    from pymongo import MongoClient
+    from pymongo.collection import Collection
+
+    from utils.vector_index import LocalVectorIndex
 
 logger = logging.getLogger(__name__)
 
+SOCKET_TIMEOUT_MS = 20000
+
+
+def is_transient_error(exc: BaseException) -> bool:
+    """Network errors and server selection timeouts (ConnectionFailure); query errors are not retried."""
+    from pymongo.errors import ConnectionFailure
+
+    return isinstance(exc, ConnectionFailure)
+
 
 class MongoDBClient:
     def __init__(self) -> None:
@@ -20,81 +43,86 @@ class MongoDBClient:
         self._database_name = os.getenv("DATABASE_NAME", "learnia_db")
         self._collection_name = os.getenv("COLLECTION_NAME", "courses")
         self._search_index = os.getenv("ATLAS_SEARCH_INDEX", "default")
+        self._search_engine = os.getenv("VECTOR_SEARCH_ENGINE", "atlas").lower()
+        self._prefilter_enabled = os.getenv("VECTOR_SEARCH_PREFILTER", "false").lower() == "true"
         self._client = None
         self._collection = None
+        self._local_index: Optional["LocalVectorIndex"] = None
+        self._local_index_failed = False
+        # Lazy client, collection and local index are created once even under concurrent requests
+        self._init_lock = threading.RLock()
+        self._planner: Optional[CandidatePlanner] = None
+        if os.getenv("ADAPTIVE_CANDIDATES", "false").lower() == "true":
+            self._planner = CandidatePlanner()
+        self._policy = get_policy("mongodb", is_transient_error, max_attempts=2, backoff_base=0.2, min_attempt_s=0.5)
         logger.info("MongoDBClient initialized (connection will be created on first use)")
 
-    def _get_client(self) -> MongoClient:
+    def _get_client(self) -> "MongoClient":
         """Lazy initialization of MongoDB client"""
-        if self._client is None:
-            logger.info(f"Connecting to MongoDB Atlas database: {self._database_name}")
-            self._client = MongoClient(
-                self._uri,
-                connectTimeoutMS=10000,
-                socketTimeoutMS=20000,
-                serverSelectionTimeoutMS=10000,
-                appname="learning-path-generator",
-                retryWrites=True,
-            )
-            logger.info("MongoDB client created successfully")
+        if self._client is not None:
+            return self._client
+        with self._init_lock:
+            if self._client is None:
+                from pymongo import MongoClient
+
+                logger.info(f"Connecting to MongoDB Atlas database: {self._database_name}")
+                self._client = MongoClient(
+                    self._uri,
+                    connectTimeoutMS=10000,
+                    socketTimeoutMS=SOCKET_TIMEOUT_MS,
+                    serverSelectionTimeoutMS=10000,
+                    appname="learning-path-generator",
+                    retryWrites=True,
+                )
+                logger.info("MongoDB client created successfully")
         return self._client
 
-    def _get_collection(self) -> Collection:
+    def _get_collection(self) -> "Collection":
         """Get the MongoDB collection (lazy initialization)"""
-        if self._collection is None:
-            client = self._get_client()
-            self._collection = client[self._database_name][self._collection_name]
-            logger.info(f"MongoDB collection '{self._collection_name}' ready")
+        if self._collection is not None:
+            return self._collection
+        with self._init_lock:
+            if self._collection is None:
+                client = self._get_client()
+                self._collection = client[self._database_name][self._collection_name]
+                logger.info(f"MongoDB collection '{self._collection_name}' ready")
         return self._collection
 
+    def warm_up(self) -> None:
+        """Force server selection (and TLS) ahead of the first query; loads the local index if enabled"""
+        start = time.time()
+        self._get_client().admin.command("ping")
+        if self._search_engine == "local":
+            self._get_local_index()
+        logger.info(json.dumps({"event": "mongodb_warm_up", "time_ms": int((time.time() - start) * 1000)}))
+
+    def close(self) -> None:
+        with self._init_lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+                self._collection = None
+
+    def get_collection(self, name: str) -> "Collection":
+        return self._get_client()[self._database_name][name]
+
     def vector_search(
         self,
         query_embedding: List[float],
         limit: int,
         num_candidates: int,
         filters: Dict[str, Any],
+        deadline: Deadline = NO_DEADLINE,
     ) -> List[Dict[str, Any]]:
-        pipeline = [
-            {
-                "$vectorSearch": {
-                    "index": self._search_index,
-                    "path": "embedding",
-                    "queryVector": query_embedding,
-                    "numCandidates": num_candidates,
-                    "limit": max(limit, 1),
-                }
-            },
-            {
-                "$project": {
-                    "title": 1,
-                    "description": 1,
-                    "url": 1,
-                    "platform": 1,
-                    "instructor": 1,
-                    "rating": 1,
-                    "duration": 1,
-                    "price": 1,
-                    "students_count": 1,
-                    "language": 1,
-                    "category": 1,
-                    "level": 1,
-                    "score": {"$meta": "vectorSearchScore"},
-                }
-            },
-        ]
         start = time.time()
-        try:
-            candidates = list(self._get_collection().aggregate(pipeline))
-        except PyMongoError as exc:
-            logger.error(json.dumps({"event": "mongodb_vector_search_failed", "error": str(exc)}))
-            raise
+
+        def run_search() -> Tuple[List[Dict[str, Any]], str, int]:
+            with self._operation_timeout(deadline):
+                return self._run_search(query_embedding, limit, num_candidates, filters)
+
+        # Reads are idempotent, so a slow attempt may be hedged (MONGODB_HEDGE_AFTER_MS)
+        filtered, engine, stages_used = self._policy.call(run_search, deadline, hedge=True)
         search_time_ms = int((time.time() - start) * 1000)
-        filtered = self._apply_filters(candidates, filters)
-        if len(filtered) < limit and self._has_active_filters(filters):
-            relaxed = self._apply_filters(candidates, {})
-            filtered = relaxed[:limit]
-        else:
-            filtered = filtered[:limit]
         avg_score = sum(item.get("score", 0.0) for item in filtered) / len(filtered) if filtered else 0.0
         logger.info(
             json.dumps(
@@ -103,12 +131,225 @@ class MongoDBClient:
                     "courses_found": len(filtered),
                     "avg_similarity_score": round(avg_score, 4),
                     "search_time_ms": search_time_ms,
+                    "engine": engine,
+                    "filter_stages": stages_used,
                 }
             )
         )
         return [self._serialize_course(doc) for doc in filtered]
 
+    def _run_search(
+        self,
+        query_embedding: List[float],
+        limit: int,
+        num_candidates: int,
+        filters: Dict[str, Any],
+    ) -> Tuple[List[Dict[str, Any]], str, int]:
+        if self._prefilter_enabled:
+            return self._staged_search(query_embedding, limit, num_candidates, filters)
+        if self._planner is not None:
+            return self._adaptive_search(query_embedding, limit, num_candidates, filters)
+        candidates, engine = self._search_candidates(query_embedding, limit, num_candidates)
+        return self._filter_or_relax(candidates, limit, filters), engine, 1
+
+    def _filter_or_relax(self, candidates: List[Dict[str, Any]], limit: int, filters: Dict[str, Any]) -> List[Dict[str, Any]]:
+        filtered = self._apply_filters(candidates, filters)
+        if len(filtered) < limit and self._has_active_filters(filters):
+            return self._apply_filters(candidates, {})[:limit]
+        return filtered[:limit]
+
+    def supports_search_many(self) -> bool:
+        """Whether ``vector_search_many`` can score a batch in one pass (local engine, post-filtering)."""
+        return self._search_engine == "local" and not self._prefilter_enabled and self._get_local_index() is not None
+
+    def vector_search_many(
+        self,
+        query_embeddings: Sequence[List[float]],
+        limits: Sequence[int],
+        num_candidates: Sequence[int],
+        filters: Sequence[Dict[str, Any]],
+        deadline: Deadline = NO_DEADLINE,
+    ) -> List[List[Dict[str, Any]]]:
+        """``vector_search`` for many queries with a single matrix product over the local index.
+
+        Only valid when ``supports_search_many()``; each query keeps its own candidate count
+        and filters, relaxed as in the single search. ADAPTIVE_CANDIDATES sizing does not
+        apply: on the local index a wider candidate list costs no extra round trip.
+        """
+        start = time.time()
+        deadline.check("vector search")
+        candidate_lists = self._get_local_index().search_many(query_embeddings, max(num_candidates, default=1))
+        results = [
+            [self._serialize_course(doc) for doc in self._filter_or_relax(candidates[:candidate_count], limit, query_filters)]
+            for candidates, limit, candidate_count, query_filters in zip(candidate_lists, limits, num_candidates, filters)
+        ]
+        logger.info(
+            json.dumps(
+                {
+                    "event": "vector_search_batch_completed",
+                    "queries": len(results),
+                    "search_time_ms": int((time.time() - start) * 1000),
+                    "engine": "local",
+                }
+            )
+        )
+        return results
+
+    def _operation_timeout(self, deadline: Deadline):
+        """pymongo.timeout() bounds every operation in the block (all filter stages) by the request deadline."""
+        remaining = deadline.timeout(SOCKET_TIMEOUT_MS / 1000, "vector search")
+        if self._search_engine == "local" or remaining >= SOCKET_TIMEOUT_MS / 1000:
+            return nullcontext()
+        import pymongo
+
+        return pymongo.timeout(remaining)
+
+    def _adaptive_search(
+        self,
+        query_embedding: List[float],
+        limit: int,
+        max_candidates: int,
+        filters: Dict[str, Any],
+    ) -> Tuple[List[Dict[str, Any]], str, int]:
+        """Size the query from observed filter survival and widen once before relaxing preferences"""
+        signature = filter_signature(filters)
+        fetch_limit, num_candidates = self._planner.plan(signature, limit, max_candidates)
+        candidates, engine = self._search_candidates(query_embedding, fetch_limit, num_candidates)
+        filtered = self._apply_filters(candidates, filters)
+        self._planner.observe(signature, len(candidates), len(filtered))
+        stages_used = 1
+        if len(filtered) < limit and len(candidates) >= fetch_limit:
+            # Short only because we fetched too little: one wider query keeps the user's preferences
+            fetch_limit, num_candidates = self._planner.widen(
+                signature, limit, len(filtered), len(candidates), max_candidates
+            )
+            if fetch_limit > len(candidates):
+                candidates, engine = self._search_candidates(query_embedding, fetch_limit, num_candidates)
+                filtered = self._apply_filters(candidates, filters)
+                self._planner.observe(signature, len(candidates), len(filtered))
+                stages_used += 1
+        if len(filtered) < limit and self._has_active_filters(filters):
+            matched_ids = {str(doc.get("_id")) for doc in filtered}
+            relaxed = [
+                doc for doc in self._apply_filters(candidates, {}) if str(doc.get("_id")) not in matched_ids
+            ]
+            filtered = filtered + relaxed
+        logger.debug(
+            json.dumps(
+                {
+                    "event": "candidate_plan",
+                    "filter_signature": signature,
+                    "fetch_limit": fetch_limit,
+                    "num_candidates": num_candidates,
+                    "survivors": len(filtered),
+                }
+            )
+        )
+        return filtered[:limit], engine, stages_used
+
+    def _staged_search(
+        self,
+        query_embedding: List[float],
+        limit: int,
+        num_candidates: int,
+        filters: Dict[str, Any],
+    ) -> Tuple[List[Dict[str, Any]], str, int]:
+        """Filter on the server and only re-query with fewer preferences when a stage comes back short"""
+        selected: List[Dict[str, Any]] = []
+        seen_ids = set()
+        engine = self._search_engine
+        stages_used = 0
+        for stage_filters in relaxation_stages(filters):
+            stages_used += 1
+            candidates, engine = self._search_candidates(query_embedding, limit, num_candidates, stage_filters)
+            # Post-filter stays as a safety net for documents the index cannot express (e.g. missing fields)
+            for doc in self._apply_filters(candidates, stage_filters):
+                doc_id = str(doc.get("_id"))
+                if doc_id not in seen_ids:
+                    seen_ids.add(doc_id)
+                    selected.append(doc)
+            if len(selected) >= limit:
+                break
+        return selected[:limit], engine, stages_used
+
+    def _search_candidates(
+        self,
+        query_embedding: List[float],
+        limit: int,
+        num_candidates: int,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> Tuple[List[Dict[str, Any]], str]:
+        if self._search_engine == "local":
+            local_index = self._get_local_index()
+            if local_index is not None:
+                try:
+                    allowed = None
+                    if filters:
+                        allowed = local_index.filter_mask(
+                            filter_signature(filters),
+                            lambda course: self._matches_filters(course, filters),
+                        )
+                    return local_index.search(query_embedding, num_candidates, allowed), "local"
+                except ValueError as exc:
+                    logger.warning(json.dumps({"event": "local_vector_search_failed", "error": str(exc)}))
+        return self._atlas_search(query_embedding, limit, num_candidates, filters), "atlas"
+
+    def _atlas_search(
+        self,
+        query_embedding: List[float],
+        limit: int,
+        num_candidates: int,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        vector_stage: Dict[str, Any] = {
+            "index": self._search_index,
+            "path": "embedding",
+            "queryVector": query_embedding,
+            "numCandidates": num_candidates,
+            "limit": max(limit, 1),
+        }
+        if filters:
+            compiled = compile_atlas_filter(filters)
+            if compiled:
+                vector_stage["filter"] = compiled
+        pipeline = [
+            {"$vectorSearch": vector_stage},
+            {
+                "$project": {
+                    **{field: 1 for field in COURSE_FIELDS},
+                    "score": {"$meta": "vectorSearchScore"},
+                }
+            },
+        ]
+        from pymongo.errors import PyMongoError
+
+        try:
+            return list(self._get_collection().aggregate(pipeline))
+        except PyMongoError as exc:
+            logger.error(json.dumps({"event": "mongodb_vector_search_failed", "error": str(exc)}))
+            raise
+
+    def _get_local_index(self) -> Optional["LocalVectorIndex"]:
+        """Load the in-process index once; Atlas stays the fallback if it cannot be built"""
+        if self._local_index is not None or self._local_index_failed:
+            return self._local_index
+        with self._init_lock:
+            if self._local_index is None and not self._local_index_failed:
+                from pymongo.errors import PyMongoError
+
+                from utils.vector_index import load_local_index
+
+                try:
+                    self._local_index = load_local_index(self._get_collection())
+                except (PyMongoError, OSError, ValueError) as exc:
+                    self._local_index_failed = True
+                    logger.error(json.dumps({"event": "vector_index_load_failed", "error": str(exc)}))
+        return self._local_index
+
     def fetch_courses_by_ids(self, ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        from bson import ObjectId
+        from pymongo.errors import PyMongoError
+
         object_ids = [ObjectId(course_id) for course_id in ids if ObjectId.is_valid(course_id)]
         if not object_ids:
             return {}
@@ -123,29 +364,28 @@ class MongoDBClient:
         return mapped
 
     def _apply_filters(self, candidates: List[Dict[str, Any]], filters: Dict[str, Any]) -> List[Dict[str, Any]]:
-        def matches(course: Dict[str, Any]) -> bool:
-            if filters.get("user_level") == "beginner" and course.get("level") == "advanced":
+        return [course for course in candidates if self._matches_filters(course, filters)]
+
+    def _matches_filters(self, course: Dict[str, Any], filters: Dict[str, Any]) -> bool:
+        if filters.get("user_level") == "beginner" and course.get("level") == "advanced":
+            return False
+        if language := filters.get("language"):
+            if course.get("language") != language:
+                return False
+        if platforms := filters.get("preferred_platforms"):
+            if course.get("platform") not in set(platforms):
+                return False
+        max_price = filters.get("max_price")
+        if max_price is not None and course.get("price") is not None:
+            if float(course.get("price", 0.0)) > float(max_price):
+                return False
+        desired_level = filters.get("user_level")
+        if desired_level:
+            course_level_num = LEVELS_ORDER.get(course.get("level"), 1)
+            desired_level_num = LEVELS_ORDER.get(desired_level, 1)
+            if course_level_num > desired_level_num + 1:
                 return False
-            if language := filters.get("language"):
-                if course.get("language") != language:
-                    return False
-            if platforms := filters.get("preferred_platforms"):
-                if course.get("platform") not in set(platforms):
-                    return False
-            max_price = filters.get("max_price")
-            if max_price is not None and course.get("price") is not None:
-                if float(course.get("price", 0.0)) > float(max_price):
-                    return False
-            desired_level = filters.get("user_level")
-            if desired_level:
-                levels_order = {"beginner": 0, "intermediate": 1, "advanced": 2}
-                course_level_num = levels_order.get(course.get("level"), 1)
-                desired_level_num = levels_order.get(desired_level, 1)
-                if course_level_num > desired_level_num + 1:
-                    return False
-            return True
-
-        return [course for course in candidates if matches(course)]
+        return True
 
     def _has_active_filters(self, filters: Dict[str, Any]) -> bool:
         return any(value for key, value in filters.items() if key != "user_level")
@@ -158,10 +398,12 @@ class MongoDBClient:
 
 
 _mongo_client: Optional[MongoDBClient] = None
+_mongo_client_lock = threading.Lock()
 
 
 def get_mongo_client() -> MongoDBClient:
     global _mongo_client
-    if _mongo_client is None:
-        _mongo_client = MongoDBClient()
+    with _mongo_client_lock:
+        if _mongo_client is None:
+            _mongo_client = MongoDBClient()
     return _mongo_client
@@ -0,0 +1,255 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Protocol, Sequence, Tuple
+
+from utils.resilience import emit_metric
+
+logger = logging.getLogger(__name__)
+
+# Backoff between flush attempts of one entry: base * 2^(attempts-1), capped
+RETRY_BASE_S = 1.0
+RETRY_CAP_S = 300.0
+
+
+class OutboxEntry:
+    """A generated path waiting to be written to Postgres; ``path_id`` makes every write idempotent."""
+
+    __slots__ = ("path_id", "user_id", "path_data", "course_ids", "enqueued_at", "attempts")
+
+    def __init__(
+        self,
+        path_id: str,
+        user_id: str,
+        path_data: Dict[str, Any],
+        course_ids: List[str],
+        enqueued_at: Optional[float] = None,
+        attempts: int = 0,
+    ) -> None:
+        self.path_id = path_id
+        self.user_id = user_id
+        self.path_data = path_data
+        self.course_ids = course_ids
+        self.enqueued_at = enqueued_at if enqueued_at is not None else time.time()
+        self.attempts = attempts
+
+    def to_json(self) -> str:
+        # Dates (target_completion_date) travel as ISO strings, which Postgres accepts for DATE
+        return json.dumps(
+            {
+                "path_id": self.path_id,
+                "user_id": self.user_id,
+                "path_data": self.path_data,
+                "course_ids": self.course_ids,
+                "enqueued_at": self.enqueued_at,
+            },
+            default=str,
+        )
+
+    @classmethod
+    def from_json(cls, payload: str, attempts: int = 0) -> "OutboxEntry":
+        data = json.loads(payload)
+        return cls(data["path_id"], data["user_id"], data["path_data"], data["course_ids"], data.get("enqueued_at"), attempts)
+
+    def as_persist_args(self) -> Tuple[str, Dict[str, Any], List[Dict[str, str]]]:
+        return self.user_id, self.path_data, [{"course_id": course_id} for course_id in self.course_ids]
+
+
+class Outbox(Protocol):
+    def enqueue(self, entry: OutboxEntry) -> None:
+        ...
+
+    def stats(self) -> Optional[Tuple[int, float]]:
+        """(pending entries, age in seconds of the oldest one), or None if the backend reports it elsewhere."""
+        ...
+
+
+class SQLiteOutbox:
+    """File-backed outbox drained by OutboxFlusher, for local runs and the HTTP server mode.
+
+    An entry is durable once ``enqueue`` returns, as long as the file outlives the process
+    (a persistent disk): on Lambda ``/tmp`` does not, so ``build_outbox`` refuses it there.
+
+    Entries are leased while a flush is in flight, retried with exponential backoff and
+    marked dead after ``max_attempts`` so a poison path cannot block the rest.
+    """
+
+    def __init__(self, path: str, max_attempts: int = 10, lease_s: float = 60.0) -> None:
+        self._max_attempts = max_attempts
+        self._lease_s = lease_s
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=FULL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS outbox (
+                    path_id TEXT PRIMARY KEY,
+                    payload TEXT NOT NULL,
+                    enqueued_at REAL NOT NULL,
+                    available_at REAL NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    dead INTEGER NOT NULL DEFAULT 0,
+                    last_error TEXT
+                )
+                """
+            )
+
+    def enqueue(self, entry: OutboxEntry) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO outbox (path_id, payload, enqueued_at, available_at) VALUES (?, ?, ?, ?)",
+                (entry.path_id, entry.to_json(), entry.enqueued_at, entry.enqueued_at),
+            )
+
+    def claim(self, limit: int) -> List[OutboxEntry]:
+        now = time.time()
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                "SELECT path_id, payload, attempts FROM outbox WHERE dead = 0 AND available_at <= ? "
+                "ORDER BY enqueued_at LIMIT ?",
+                (now, limit),
+            ).fetchall()
+            self._conn.executemany(
+                "UPDATE outbox SET available_at = ?, attempts = attempts + 1 WHERE path_id = ?",
+                [(now + self._lease_s, row[0]) for row in rows],
+            )
+        return [OutboxEntry.from_json(payload, attempts + 1) for _, payload, attempts in rows]
+
+    def ack(self, path_ids: Sequence[str]) -> None:
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM outbox WHERE path_id = ?", [(path_id,) for path_id in path_ids])
+
+    def retry(self, entry: OutboxEntry, error: str) -> bool:
+        """Schedule another attempt; returns False when the entry has been dead-lettered instead."""
+        dead = entry.attempts >= self._max_attempts
+        delay = min(RETRY_BASE_S * (2 ** (entry.attempts - 1)), RETRY_CAP_S)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE outbox SET available_at = ?, dead = ?, last_error = ? WHERE path_id = ?",
+                (time.time() + delay, int(dead), error[:1000], entry.path_id),
+            )
+        return not dead
+
+    def stats(self) -> Optional[Tuple[int, float]]:
+        with self._lock:
+            depth, oldest = self._conn.execute("SELECT COUNT(*), MIN(enqueued_at) FROM outbox WHERE dead = 0").fetchone()
+        return depth, (time.time() - oldest) if oldest is not None else 0.0
+
+
+class SQSOutbox:
+    """Outbox on an SQS queue, drained by ``outbox_handler``; depth and age come from the queue's own metrics."""
+
+    def __init__(self, queue_url: str) -> None:
+        self._queue_url = queue_url
+        self._client = None
+
+    def _get_client(self):
+        if self._client is None:
+            import boto3
+
+            self._client = boto3.client("sqs", region_name="us-east-2")
+        return self._client
+
+    def enqueue(self, entry: OutboxEntry) -> None:
+        self._get_client().send_message(QueueUrl=self._queue_url, MessageBody=entry.to_json())
+
+    def stats(self) -> Optional[Tuple[int, float]]:
+        return None
+
+
+PersistBatch = Callable[[Sequence[Tuple[str, Dict[str, Any], List[Dict[str, str]]]]], None]
+
+
+class OutboxFlusher:
+    """Background thread that writes pending SQLiteOutbox entries to Postgres in batches.
+
+    A failed batch is retried entry by entry, so one bad path only delays itself.
+    """
+
+    def __init__(self, outbox: SQLiteOutbox, persist_batch: PersistBatch, batch_size: int = 25, interval_s: float = 0.5) -> None:
+        self._outbox = outbox
+        self._persist_batch = persist_batch
+        self._batch_size = batch_size
+        self._interval_s = interval_s
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def kick(self) -> None:
+        """Start the thread on first use and wake it to flush now."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="outbox-flusher", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait(self._interval_s)
+            self._wake.clear()
+            self.drain()
+
+    def flush_once(self) -> int:
+        entries = self._outbox.claim(self._batch_size)
+        if entries:
+            try:
+                self._persist_batch([entry.as_persist_args() for entry in entries])
+                self._outbox.ack([entry.path_id for entry in entries])
+            except Exception as exc:  # noqa: BLE001
+                logger.warning(json.dumps({"event": "outbox_batch_failed", "entries": len(entries), "error": str(exc)}))
+                for entry in entries:
+                    self._flush_entry(entry)
+            emit_metric("OutboxFlushedCount", len(entries), {})
+        self.report()
+        return len(entries)
+
+    def drain(self) -> None:
+        """Write what is pending now, on the caller's thread (before the process exits)."""
+        try:
+            while self.flush_once() == self._batch_size:
+                pass
+        except Exception as exc:  # noqa: BLE001
+            logger.error(json.dumps({"event": "outbox_flush_failed", "error": str(exc)}))
+
+    def _flush_entry(self, entry: OutboxEntry) -> None:
+        try:
+            self._persist_batch([entry.as_persist_args()])
+        except Exception as exc:  # noqa: BLE001
+            if not self._outbox.retry(entry, str(exc)):
+                emit_metric("OutboxDeadLetterCount", 1, {})
+                logger.error(json.dumps({"event": "outbox_entry_dead", "path_id": entry.path_id, "error": str(exc)}))
+            return
+        self._outbox.ack([entry.path_id])
+
+    def report(self) -> None:
+        stats = self._outbox.stats()
+        if stats is not None:
+            depth, oldest_age_s = stats
+            emit_metric("OutboxDepth", depth, {})
+            emit_metric("OutboxOldestAgeMs", int(oldest_age_s * 1000), {})
+
+
+def build_outbox() -> Optional[Outbox]:
+    backend = os.getenv("OUTBOX_BACKEND", "none").lower()
+    try:
+        if backend == "sqlite":
+            if os.getenv("AWS_LAMBDA_FUNCTION_NAME"):
+                # /tmp dies with the container and the flusher thread is frozen between invocations
+                raise ValueError("the sqlite outbox is not durable on Lambda; use OUTBOX_BACKEND=sqs")
+            return SQLiteOutbox(
+                os.getenv("OUTBOX_PATH", "/tmp/persistence_outbox.sqlite3"),
+                int(os.getenv("OUTBOX_MAX_ATTEMPTS", "10")),
+            )
+        if backend == "sqs":
+            queue_url = os.getenv("OUTBOX_QUEUE_URL")
+            if not queue_url:
+                raise ValueError("OUTBOX_QUEUE_URL is required for the sqs outbox")
+            return SQSOutbox(queue_url)
+    except Exception as exc:  # noqa: BLE001
+        logger.error(json.dumps({"event": "outbox_backend_failed", "backend": backend, "error": str(exc)}))
+    return None
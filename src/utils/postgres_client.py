@@ -1,17 +1,81 @@
 import json
 import logging
 import os
+import threading
 import time
 import uuid
+import weakref
 from contextlib import contextmanager
-from typing import Dict, Iterable, List, Sequence
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
 
-import psycopg2
-from psycopg2 import pool
-from psycopg2.extras import execute_values
+from utils.deadline import NO_DEADLINE, Deadline
+from utils.resilience import get_policy
 
 logger = logging.getLogger(__name__)
 
+PERSIST_MODE_STATEMENTS = "statements"
+PERSIST_MODE_SINGLE = "single"
+PREPARED_PERSIST_STATEMENT = "persist_learning_path"
+# server_version_num from which gen_random_uuid() is built in, as "single" mode requires
+SINGLE_MODE_MIN_SERVER_VERSION = 130000
+# Path row and every course_progress row in one statement: one round trip, atomic without
+# BEGIN/COMMIT, and progress ids generated by the server (gen_random_uuid, PostgreSQL 13+)
+PERSIST_PATH_SQL = """
+WITH path AS (
+    INSERT INTO user_learning_paths (
+        path_id,
+        user_id,
+        name,
+        description,
+        status,
+        progress_percentage,
+        target_hours_per_week,
+        target_completion_date,
+        priority,
+        is_public,
+        mongodb_template_id
+    )
+    VALUES ({values})
+    RETURNING path_id, user_id
+)
+INSERT INTO course_progress (progress_id, user_id, path_id, mongodb_course_id, status, progress_percentage, sequence_order)
+SELECT gen_random_uuid(), path.user_id, path.path_id, course.course_id, 'not_started', 0.0, course.sequence_order
+FROM path, unnest({courses}::text[]) WITH ORDINALITY AS course(course_id, sequence_order)
+ON CONFLICT (path_id, mongodb_course_id) DO NOTHING
+"""
+
+# Takes the key when it is new, expired, or held by an owner whose lease ran out; otherwise
+# returns the current row. Empty result: another request claimed it after this snapshot.
+CLAIM_IDEMPOTENCY_KEY_SQL = """
+WITH claimed AS (
+    INSERT INTO idempotency_keys AS existing (idempotency_key, user_id, fingerprint, status, response, locked_until, expires_at)
+    VALUES (%(key)s, %(user_id)s, %(fingerprint)s, 'in_progress', NULL,
+            now() + make_interval(secs => %(lease_s)s), now() + make_interval(secs => %(ttl_s)s))
+    ON CONFLICT (idempotency_key) DO UPDATE
+    SET user_id = EXCLUDED.user_id,
+        fingerprint = EXCLUDED.fingerprint,
+        status = 'in_progress',
+        response = NULL,
+        locked_until = EXCLUDED.locked_until,
+        expires_at = EXCLUDED.expires_at
+    WHERE existing.expires_at < now() OR (existing.status = 'in_progress' AND existing.locked_until < now())
+    RETURNING idempotency_key
+)
+SELECT 'claimed', %(fingerprint)s, NULL::jsonb FROM claimed
+UNION ALL
+SELECT status, fingerprint, response FROM idempotency_keys
+WHERE idempotency_key = %(key)s AND NOT EXISTS (SELECT 1 FROM claimed)
+"""
+
+JOB_JSONB_COLUMNS = ("request", "stages", "result", "error")
+
+
+def is_transient_error(exc: BaseException) -> bool:
+    """Connection-level failures (refused, reset, timed out); constraint or SQL errors are not retried."""
+    from psycopg2 import InterfaceError, OperationalError
+
+    return isinstance(exc, (OperationalError, InterfaceError))
+
 
 class PostgresClient:
     def __init__(self) -> None:
@@ -26,50 +90,133 @@ class PostgresClient:
         self._max_conn = int(os.getenv("POSTGRES_POOL_MAX", "5"))
         self._ssl_enabled = os.getenv("DB_SSL", "false").lower() == "true"
         self._pool = None
+        self._pool_lock = threading.Lock()
+        # At most POSTGRES_POOL_MAX connections are checked out; further callers wait for one
+        # (ThreadedConnectionPool raises instead of blocking when it is exhausted)
+        self._slots = threading.BoundedSemaphore(self._max_conn)
+        self._pool_wait_s = int(os.getenv("POSTGRES_POOL_WAIT_MS", "5000")) / 1000
+        # "single" writes the path and its course_progress rows with one statement per request
+        self._persist_mode = os.getenv("POSTGRES_PERSIST_MODE", PERSIST_MODE_STATEMENTS).lower()
+        self._prepared_statements = os.getenv("POSTGRES_PREPARED_STATEMENTS", "true").lower() == "true"
+        # Connections that already hold the server-side prepared statement
+        self._prepared_connections: "weakref.WeakSet[Any]" = weakref.WeakSet()
+        self._server_version: Optional[int] = None
+        self._policy = get_policy("postgres", is_transient_error, max_attempts=2, backoff_base=0.2, min_attempt_s=0.5)
         logger.info("PostgresClient initialized (pool will be created on first use)")
 
     def _get_pool(self):
-        """Lazy initialization of connection pool"""
-        if self._pool is None:
-            logger.info(f"Creating PostgreSQL connection pool to {self._host}:{self._port}")
-            connection_kwargs = {
-                "host": self._host,
-                "port": self._port,
-                "dbname": self._database,
-                "user": self._user,
-                "password": self._password,
-                "connect_timeout": 10,
-            }
-            if self._ssl_enabled:
-                connection_kwargs["sslmode"] = "verify-full"
-                ca_path = os.getenv("DB_CA_PATH")
-                if ca_path:
-                    connection_kwargs["sslrootcert"] = ca_path
-            self._pool = pool.SimpleConnectionPool(self._min_conn, self._max_conn, **connection_kwargs)
-            logger.info("PostgreSQL connection pool created successfully")
+        """Lazy initialization of connection pool (thread-safe: the HTTP server mode shares it)"""
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = self._create_pool()
         return self._pool
 
+    def _create_pool(self):
+        from psycopg2 import pool
+
+        logger.info(f"Creating PostgreSQL connection pool to {self._host}:{self._port}")
+        connection_kwargs = {
+            "host": self._host,
+            "port": self._port,
+            "dbname": self._database,
+            "user": self._user,
+            "password": self._password,
+            "connect_timeout": 10,
+        }
+        if self._ssl_enabled:
+            connection_kwargs["sslmode"] = "verify-full"
+            ca_path = os.getenv("DB_CA_PATH")
+            if ca_path:
+                connection_kwargs["sslrootcert"] = ca_path
+        connection_pool = pool.ThreadedConnectionPool(self._min_conn, self._max_conn, **connection_kwargs)
+        logger.info("PostgreSQL connection pool created successfully")
+        return connection_pool
+
+    def warm_up(self) -> None:
+        """Open the pool's initial connections (TCP + TLS handshake) before they are needed"""
+        start = time.time()
+        self._get_pool()
+        self._uses_single_statement()
+        logger.info(json.dumps({"event": "postgres_warm_up", "time_ms": int((time.time() - start) * 1000)}))
+
     @contextmanager
     def connection(self):
-        conn = self._get_pool().getconn()
+        if not self._slots.acquire(timeout=self._pool_wait_s):
+            from psycopg2.pool import PoolError
+
+            raise PoolError(f"No PostgreSQL connection available after {self._pool_wait_s:.1f}s")
         try:
-            yield conn
+            conn = self._get_pool().getconn()
+            try:
+                yield conn
+            finally:
+                # A connection broken mid-call is discarded instead of being handed to the next request
+                self._get_pool().putconn(conn, close=bool(conn.closed))
         finally:
-            self._get_pool().putconn(conn)
+            self._slots.release()
+
+    def close(self) -> None:
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
 
     def persist_learning_path(
         self,
         user_id: str,
         path_data: Dict[str, str],
         course_nodes: Sequence[Dict[str, str | int]],
+        deadline: Deadline = NO_DEADLINE,
+    ) -> str:
+        # The id is fixed before the first attempt so a retry cannot create a second path
+        path_data = {**path_data, "path_id": path_data.get("path_id", str(uuid.uuid4()))}
+        persist = self._persist_single if self._uses_single_statement() else self._persist
+        return self._policy.call(lambda: persist(user_id, path_data, course_nodes, deadline), deadline)
+
+    def _uses_single_statement(self) -> bool:
+        """Whether to persist in ``single`` mode: configured, and supported by the server.
+
+        The server version is read once per container (at warm-up or on the first write); an
+        older server falls back to ``statements`` instead of failing every write.
+        """
+        if self._persist_mode != PERSIST_MODE_SINGLE:
+            return False
+        if self._server_version is None:
+            with self.connection() as conn:
+                self._server_version = conn.server_version
+            if self._server_version < SINGLE_MODE_MIN_SERVER_VERSION:
+                logger.warning(
+                    json.dumps(
+                        {
+                            "event": "persist_mode_fallback",
+                            "mode": PERSIST_MODE_STATEMENTS,
+                            "server_version": self._server_version,
+                            "error": f"{PERSIST_MODE_SINGLE} mode requires PostgreSQL 13+",
+                        }
+                    )
+                )
+                self._persist_mode = PERSIST_MODE_STATEMENTS
+                return False
+        return True
+
+    def _persist(
+        self,
+        user_id: str,
+        path_data: Dict[str, str],
+        course_nodes: Sequence[Dict[str, str | int]],
+        deadline: Deadline,
     ) -> str:
-        path_id = path_data.get("path_id", str(uuid.uuid4()))
+        path_id = path_data["path_id"]
         persisted_path_id = path_id
+        deadline.check("persistence")
         with self.connection() as conn:
             start = time.time()
             try:
                 conn.autocommit = False
                 with conn.cursor() as cur:
+                    if deadline.bounded:
+                        # Scoped to this transaction; keeps a slow insert from outliving the request
+                        cur.execute("SET LOCAL statement_timeout = %s", (max(int(deadline.remaining() * 1000), 1),))
                     cur.execute(
                         """
                         INSERT INTO user_learning_paths (
@@ -106,7 +253,8 @@ class PostgresClient:
                 self._insert_course_progress(conn, user_id, persisted_path_id, course_nodes)
                 conn.commit()
             except Exception as exc:  # noqa: BLE001
-                conn.rollback()
+                if not conn.closed:
+                    conn.rollback()
                 logger.error(json.dumps({"event": "postgres_persist_failed", "error": str(exc)}))
                 raise
             finally:
@@ -123,6 +271,262 @@ class PostgresClient:
                 )
             return persisted_path_id
 
+    def persist_learning_paths(
+        self,
+        paths: Sequence[Tuple[str, Dict[str, Any], Sequence[Dict[str, str | int]]]],
+        deadline: Deadline = NO_DEADLINE,
+    ) -> None:
+        """Write (user_id, path_data with path_id, course_nodes) batches in one transaction.
+
+        Used by the persistence outbox: rows that already exist are skipped, so a batch that
+        is delivered twice (SQS redelivery, a retry after a lost COMMIT) is harmless.
+        """
+        self._policy.call(lambda: self._persist_batch(paths, deadline), deadline)
+
+    def _persist_batch(
+        self,
+        paths: Sequence[Tuple[str, Dict[str, Any], Sequence[Dict[str, str | int]]]],
+        deadline: Deadline,
+    ) -> None:
+        from psycopg2.extras import execute_values
+
+        deadline.check("persistence")
+        path_rows = []
+        progress_rows = []
+        for user_id, path_data, course_nodes in paths:
+            path_id = path_data["path_id"]
+            path_rows.append(
+                (
+                    path_id,
+                    user_id,
+                    path_data.get("name"),
+                    path_data.get("description"),
+                    path_data.get("status", "active"),
+                    float(path_data.get("progress_percentage", 0.0)),
+                    path_data.get("target_hours_per_week", 5),
+                    path_data.get("target_completion_date"),
+                    path_data.get("priority", 1),
+                    path_data.get("is_public", False),
+                    path_data.get("mongodb_template_id"),
+                )
+            )
+            # Ids are generated here, like _insert_course_progress: gen_random_uuid() needs PostgreSQL 13+
+            progress_rows.extend(
+                (str(uuid.uuid4()), user_id, path_id, node.get("course_id"), "not_started", 0.0, sequence_order)
+                for sequence_order, node in enumerate(course_nodes, start=1)
+            )
+        with self.connection() as conn:
+            start = time.time()
+            try:
+                conn.autocommit = False
+                with conn.cursor() as cur:
+                    if deadline.bounded:
+                        cur.execute("SET LOCAL statement_timeout = %s", (max(int(deadline.remaining() * 1000), 1),))
+                    execute_values(
+                        cur,
+                        """
+                        INSERT INTO user_learning_paths (
+                            path_id, user_id, name, description, status, progress_percentage,
+                            target_hours_per_week, target_completion_date, priority, is_public, mongodb_template_id
+                        )
+                        VALUES %s
+                        ON CONFLICT (path_id) DO NOTHING
+                        """,
+                        path_rows,
+                    )
+                    execute_values(
+                        cur,
+                        """
+                        INSERT INTO course_progress (progress_id, user_id, path_id, mongodb_course_id, status, progress_percentage, sequence_order)
+                        VALUES %s
+                        ON CONFLICT (path_id, mongodb_course_id) DO NOTHING
+                        """,
+                        progress_rows,
+                        page_size=max(len(progress_rows), 1),
+                    )
+                conn.commit()
+            except Exception as exc:  # noqa: BLE001
+                if not conn.closed:
+                    conn.rollback()
+                logger.error(json.dumps({"event": "postgres_batch_persist_failed", "paths": len(paths), "error": str(exc)}))
+                raise
+            logger.info(
+                json.dumps(
+                    {
+                        "event": "paths_persisted",
+                        "paths": len(paths),
+                        "courses_count": len(progress_rows),
+                        "postgres_time_ms": int((time.time() - start) * 1000),
+                    }
+                )
+            )
+
+    def _persist_single(
+        self,
+        user_id: str,
+        path_data: Dict[str, str],
+        course_nodes: Sequence[Dict[str, str | int]],
+        deadline: Deadline,
+    ) -> str:
+        path_id = path_data["path_id"]
+        deadline.check("persistence")
+        with self.connection() as conn:
+            start = time.time()
+            try:
+                # A single statement is atomic on its own; skipping BEGIN/COMMIT saves two round trips
+                conn.autocommit = True
+                query, params = self._single_statement(conn, user_id, path_data, course_nodes, deadline)
+                with conn.cursor() as cur:
+                    cur.execute(query, params)
+                if self._prepared_statements:
+                    self._prepared_connections.add(conn)
+            except Exception as exc:  # noqa: BLE001
+                if self._prepared_statements and not conn.closed:
+                    # Whether the PREPARE survived is unknown; a fresh connection starts clean
+                    self._prepared_connections.discard(conn)
+                    conn.close()
+                logger.error(json.dumps({"event": "postgres_persist_failed", "error": str(exc)}))
+                raise
+            finally:
+                elapsed_ms = int((time.time() - start) * 1000)
+                logger.info(
+                    json.dumps(
+                        {
+                            "event": "path_persisted",
+                            "path_id": path_id,
+                            "courses_count": len(course_nodes),
+                            "postgres_time_ms": elapsed_ms,
+                            "mode": PERSIST_MODE_SINGLE,
+                        }
+                    )
+                )
+            return path_id
+
+    def _single_statement(
+        self,
+        conn,
+        user_id: str,
+        path_data: Dict[str, str],
+        course_nodes: Sequence[Dict[str, str | int]],
+        deadline: Deadline,
+    ) -> Tuple[str, List[Any]]:
+        """Query text and parameters for _persist_single, sent as one simple-query message.
+
+        Statements in one message run in one implicit transaction, so SET LOCAL still scopes
+        the timeout to this write. The statement is prepared on first use per connection.
+        """
+        params: List[Any] = [
+            path_data["path_id"],
+            user_id,
+            path_data.get("name"),
+            path_data.get("description"),
+            path_data.get("status", "active"),
+            float(path_data.get("progress_percentage", 0.0)),
+            path_data.get("target_hours_per_week", 5),
+            path_data.get("target_completion_date"),
+            path_data.get("priority", 1),
+            path_data.get("is_public", False),
+            path_data.get("mongodb_template_id"),
+            [str(node.get("course_id")) for node in course_nodes],
+        ]
+        parts: List[str] = []
+        if deadline.bounded:
+            parts.append("SET LOCAL statement_timeout = %s")
+            params.insert(0, max(int(deadline.remaining() * 1000), 1))
+        if not self._prepared_statements:
+            parts.append(PERSIST_PATH_SQL.format(values=", ".join(["%s"] * 11), courses="%s"))
+            return ";\n".join(parts), params
+        if conn not in self._prepared_connections:
+            parts.append(
+                f"PREPARE {PREPARED_PERSIST_STATEMENT} AS "
+                + PERSIST_PATH_SQL.format(values=", ".join(f"${index}" for index in range(1, 12)), courses="$12")
+            )
+        parts.append(f"EXECUTE {PREPARED_PERSIST_STATEMENT} ({', '.join(['%s'] * 11)}, %s::text[])")
+        return ";\n".join(parts), params
+
+    def claim_idempotency_key(
+        self,
+        key: str,
+        user_id: str,
+        fingerprint: str,
+        lease_s: float,
+        ttl_s: float,
+        deadline: Deadline = NO_DEADLINE,
+    ) -> Optional[Tuple[str, str, Optional[Dict[str, Any]]]]:
+        """(status, fingerprint, stored response) of the key; status ``claimed`` means this caller owns it."""
+        params = {"key": key, "user_id": user_id, "fingerprint": fingerprint, "lease_s": lease_s, "ttl_s": ttl_s}
+        return self._policy.call(lambda: self._fetch_one(CLAIM_IDEMPOTENCY_KEY_SQL, params, deadline), deadline)
+
+    def get_idempotency_key(
+        self, key: str, deadline: Deadline = NO_DEADLINE
+    ) -> Optional[Tuple[str, str, Optional[Dict[str, Any]]]]:
+        query = """
+            SELECT status, fingerprint, response FROM idempotency_keys
+            WHERE idempotency_key = %(key)s
+              AND expires_at >= now()
+              AND (status = 'completed' OR locked_until >= now())
+        """
+        return self._policy.call(lambda: self._fetch_one(query, {"key": key}, deadline), deadline)
+
+    def complete_idempotency_key(
+        self, key: str, response_json: str, ttl_s: float, deadline: Deadline = NO_DEADLINE
+    ) -> None:
+        query = """
+            UPDATE idempotency_keys
+            SET status = 'completed', response = %(response)s::jsonb, expires_at = now() + make_interval(secs => %(ttl_s)s)
+            WHERE idempotency_key = %(key)s
+        """
+        params = {"key": key, "response": response_json, "ttl_s": ttl_s}
+        self._policy.call(lambda: self._fetch_one(query, params, deadline, fetch=False), deadline)
+
+    def release_idempotency_key(self, key: str, deadline: Deadline = NO_DEADLINE) -> None:
+        """Drop an in-progress claim so a retry of a failed request can run again."""
+        query = "DELETE FROM idempotency_keys WHERE idempotency_key = %(key)s AND status = 'in_progress'"
+        self._policy.call(lambda: self._fetch_one(query, {"key": key}, deadline, fetch=False), deadline)
+
+    def create_job(self, job: Dict[str, Any], deadline: Deadline = NO_DEADLINE) -> None:
+        """Insert an async generation job; ``request`` and ``stages`` come JSON-encoded."""
+        query = """
+            INSERT INTO generation_jobs (job_id, user_id, request, status, stage, stages, attempts, created_at, updated_at)
+            VALUES (%(job_id)s, %(user_id)s, %(request)s::jsonb, %(status)s, %(stage)s, %(stages)s::jsonb,
+                    %(attempts)s, %(created_at)s, %(created_at)s)
+        """
+        self._policy.call(lambda: self._fetch_one(query, job, deadline, fetch=False), deadline)
+
+    def get_job(self, job_id: str, deadline: Deadline = NO_DEADLINE) -> Optional[Tuple[Any, ...]]:
+        query = """
+            SELECT job_id, user_id, request, status, stage, stages, result, error, attempts, created_at, updated_at
+            FROM generation_jobs WHERE job_id = %(job_id)s
+        """
+        return self._policy.call(lambda: self._fetch_one(query, {"job_id": job_id}, deadline), deadline)
+
+    def update_job(
+        self, job_id: str, columns: Sequence[str], values: Sequence[Any], deadline: Deadline = NO_DEADLINE
+    ) -> None:
+        """Set ``columns`` (validated by the job store; JSON ones arrive encoded) on one job."""
+        assignments = ", ".join(
+            f"{column} = %(v{index})s" + ("::jsonb" if column in JOB_JSONB_COLUMNS else "")
+            for index, column in enumerate(columns)
+        )
+        params = {f"v{index}": value for index, value in enumerate(values)}
+        params["job_id"] = job_id
+        query = f"UPDATE generation_jobs SET {assignments} WHERE job_id = %(job_id)s"
+        self._policy.call(lambda: self._fetch_one(query, params, deadline, fetch=False), deadline)
+
+    def _fetch_one(
+        self, query: str, params: Dict[str, Any], deadline: Deadline, fetch: bool = True
+    ) -> Optional[Tuple[Any, ...]]:
+        """Run one autocommit statement in a single round trip; the timeout is sent in the same message."""
+        deadline.check("idempotency")
+        if deadline.bounded:
+            query = "SET LOCAL statement_timeout = %(statement_timeout_ms)s;\n" + query
+            params = {**params, "statement_timeout_ms": max(int(deadline.remaining() * 1000), 1)}
+        with self.connection() as conn:
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute(query, params)
+                return cur.fetchone() if fetch else None
+
     def _insert_course_progress(
         self,
         conn,
@@ -144,6 +548,8 @@ class PostgresClient:
                     sequence_order,
                 )
             )
+        from psycopg2.extras import execute_values
+
         with conn.cursor() as cur:
             execute_values(
                 cur,
@@ -157,10 +563,12 @@ class PostgresClient:
 
 
 _postgres_client: PostgresClient | None = None
+_postgres_client_lock = threading.Lock()
 
 
 def get_postgres_client() -> PostgresClient:
     global _postgres_client
-    if _postgres_client is None:
-        _postgres_client = PostgresClient()
+    with _postgres_client_lock:
+        if _postgres_client is None:
+            _postgres_client = PostgresClient()
     return _postgres_client
@@ -0,0 +1,71 @@
+import json
+import os
+from typing import Any, Dict, List, Sequence, Tuple
+
+# Nova does not expose a tokenizer; ~4 characters per token is close for mixed Spanish/English text
+CHARS_PER_TOKEN = 4
+
+# Columns Nova needs to place courses in lanes. URL, price and students_count are left out:
+# they don't affect ordering and _build_nodes_with_metadata merges them back afterwards.
+COMPACT_COLUMNS = ("course_id", "title", "level", "category", "platform", "language", "rating", "duration", "score")
+MIN_DESCRIPTION_CHARS = 40
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, -(-len(text) // CHARS_PER_TOKEN))
+
+
+def _cell(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        value = round(value, 2)
+    return " ".join(str(value).replace("|", "/").split())
+
+
+def _truncate(text: str, max_chars: int) -> str:
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars].rsplit(" ", 1)[0]
+    return cut.rstrip(",.;:") + "…"
+
+
+class PromptEncoder:
+    """Encodes the candidate courses for the Nova prompt within a token budget.
+
+    ``json`` keeps the original indented JSON of every projected field. ``compact`` writes
+    one pipe-separated row per course with only the columns in COMPACT_COLUMNS, and shortens
+    descriptions so the whole block fits ``token_budget``. Courses are never dropped: Nova must
+    place all of them, so if the budget is too small descriptions are omitted entirely.
+    """
+
+    def __init__(self, encoding: str = "json", token_budget: int = 1500, max_description_chars: int = 280) -> None:
+        self.encoding = encoding
+        self._token_budget = token_budget
+        self._max_description_chars = max_description_chars
+
+    def encode(self, courses: Sequence[Dict[str, Any]]) -> Tuple[str, str]:
+        """Return (courses block, format note for the prompt)."""
+        if self.encoding != "compact":
+            return json.dumps(list(courses), ensure_ascii=False, indent=2), ""
+        header = "|".join(COMPACT_COLUMNS + ("description",))
+        rows = ["|".join(_cell(course.get(column)) for column in COMPACT_COLUMNS) for course in courses]
+        fixed_chars = len(header) + sum(len(row) + 2 for row in rows)  # "|" + newline per row
+        spare_chars = self._token_budget * CHARS_PER_TOKEN - fixed_chars
+        per_course = min(self._max_description_chars, spare_chars // max(len(rows), 1))
+        if per_course >= MIN_DESCRIPTION_CHARS:
+            descriptions = [_truncate(_cell(course.get("description")), per_course) for course in courses]
+        else:
+            descriptions = [""] * len(rows)
+        lines: List[str] = [header]
+        lines.extend(f"{row}|{description}" for row, description in zip(rows, descriptions))
+        note = "Formato: una fila por curso, columnas separadas por '|' según la primera fila (descripciones resumidas)."
+        return "\n".join(lines), note
+
+
+def build_prompt_encoder() -> PromptEncoder:
+    return PromptEncoder(
+        os.getenv("PROMPT_ENCODING", "json").lower(),
+        int(os.getenv("PROMPT_TOKEN_BUDGET", "1500")),
+        int(os.getenv("PROMPT_DESCRIPTION_MAX_CHARS", "280")),
+    )
@@ -0,0 +1,48 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+RESPONSE_FORMATS = ("backend", "frontend", "both")
+
+
+@dataclass(frozen=True, slots=True)
+class RequestContext:
+    """A validated generation request, parsed once from the event and carried through the pipeline."""
+
+    user_id: str
+    user_query: str
+    user_level: str
+    time_per_week: int
+    num_courses: int
+    preferences: Dict[str, Any] = field(default_factory=dict)
+    # Unknown values fall back to the backend view, as before
+    response_format: str = "backend"
+    # Client-supplied Idempotency-Key (header or body), if any
+    idempotency_key: Optional[str] = None
+
+    @classmethod
+    def from_payload(
+        cls, user_id: str, payload: Dict[str, Any], idempotency_key: Optional[str] = None
+    ) -> "RequestContext":
+        response_format = payload.get("response_format", "backend")
+        return cls(
+            user_id=user_id,
+            user_query=payload["user_query"],
+            user_level=payload["user_level"],
+            time_per_week=payload["time_per_week"],
+            num_courses=payload["num_courses"],
+            preferences=payload.get("preferences") or {},
+            response_format=response_format if response_format in RESPONSE_FORMATS else "backend",
+            idempotency_key=idempotency_key,
+        )
+
+    @property
+    def max_price(self) -> Optional[float]:
+        return self.preferences.get("max_price")
+
+    @property
+    def language(self) -> Optional[str]:
+        return self.preferences.get("language")
+
+    @property
+    def preferred_platforms(self) -> Optional[List[str]]:
+        return self.preferences.get("preferred_platforms")
@@ -0,0 +1,344 @@
+import contextvars
+import json
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Callable, Dict, Optional, TypeVar
+
+from utils.deadline import NO_DEADLINE, Deadline, DeadlineExceeded
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+MetricsHook = Callable[[str, float, Optional[Dict[str, str]]], None]
+_metrics_hook: Optional[MetricsHook] = None
+
+
+def set_metrics_hook(hook: Optional[MetricsHook]) -> None:
+    """Route breaker/budget/hedge/model-routing metrics to the caller's recorder (the generator's buffered metrics)."""
+    global _metrics_hook
+    _metrics_hook = hook
+
+
+def emit_metric(name: str, value: float, dimensions: Dict[str, str]) -> None:
+    if _metrics_hook is None:
+        return
+    try:
+        _metrics_hook(name, value, dimensions)
+    except Exception as exc:  # noqa: BLE001
+        logger.warning(json.dumps({"event": "resilience_metric_failed", "metric": name, "error": str(exc)}))
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, dependency: str, retry_in: float) -> None:
+        super().__init__(f"Circuit breaker for {dependency} is open; retry in {retry_in:.1f}s")
+        self.dependency = dependency
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker shared by every call to one dependency in this container.
+
+    Open: calls fail immediately until ``reset_timeout`` has passed. Half-open: a single
+    probe goes through; its outcome closes the circuit or opens it again. A threshold of
+    0 disables the breaker.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0) -> None:
+        self._name = name
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._state = STATE_CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def allow(self) -> None:
+        if self._failure_threshold <= 0:
+            return
+        with self._lock:
+            if self._state == STATE_OPEN:
+                retry_in = self._opened_at + self._reset_timeout - time.monotonic()
+                if retry_in > 0:
+                    raise CircuitOpenError(self._name, retry_in)
+                self._transition(STATE_HALF_OPEN)
+            if self._state == STATE_HALF_OPEN:
+                if self._probe_in_flight:
+                    raise CircuitOpenError(self._name, self._reset_timeout)
+                self._probe_in_flight = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._probe_in_flight = False
+            if self._state != STATE_CLOSED:
+                self._transition(STATE_CLOSED)
+
+    def record_failure(self) -> None:
+        if self._failure_threshold <= 0:
+            return
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._state == STATE_HALF_OPEN or self._failures >= self._failure_threshold:
+                self._opened_at = time.monotonic()
+                if self._state != STATE_OPEN:
+                    self._transition(STATE_OPEN)
+
+    def release(self) -> None:
+        """The call ended without telling us anything about the dependency (e.g. our own deadline)."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def _transition(self, state: str) -> None:
+        previous, self._state = self._state, state
+        logger.warning(
+            json.dumps(
+                {
+                    "event": "circuit_breaker_state_change",
+                    "dependency": self._name,
+                    "from": previous,
+                    "to": state,
+                    "consecutive_failures": self._failures,
+                }
+            )
+        )
+        emit_metric("CircuitBreakerStateChangeCount", 1, {"Dependency": self._name, "State": state})
+
+
+class RetryBudget:
+    """Token bucket limiting retries to a fraction of traffic.
+
+    Every call deposits ``ratio`` tokens and every retry spends one, so during an outage
+    retries add at most ~ratio extra load; ``min_per_second`` keeps a few retries available
+    when traffic is low.
+    """
+
+    def __init__(self, ratio: float = 0.2, min_per_second: float = 1.0, capacity: float = 10.0) -> None:
+        self._ratio = ratio
+        self._min_per_second = min_per_second
+        self._capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self._capacity, self._tokens + (now - self._updated_at) * self._min_per_second)
+        self._updated_at = now
+
+    def deposit(self) -> None:
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._capacity, self._tokens + self._ratio)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            self._refill()
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+_hedge_executor: Optional[ThreadPoolExecutor] = None
+_hedge_executor_workers = 0
+_hedge_min_workers = 0
+_hedge_executor_lock = threading.Lock()
+
+
+def _hedge_pool_size() -> int:
+    return max(int(os.getenv("HEDGE_MAX_WORKERS", "8")), _hedge_min_workers)
+
+
+def _get_hedge_executor() -> ThreadPoolExecutor:
+    global _hedge_executor, _hedge_executor_workers
+    with _hedge_executor_lock:
+        if _hedge_executor is None:
+            _hedge_executor_workers = _hedge_pool_size()
+            _hedge_executor = ThreadPoolExecutor(max_workers=_hedge_executor_workers, thread_name_prefix="hedge")
+    return _hedge_executor
+
+
+def reserve_hedge_workers(minimum: int) -> int:
+    """Grow the hedge pool to at least ``minimum`` threads; returns its size.
+
+    Callers that run many requests at once (server mode) size it from their own
+    concurrency, so queued primaries do not turn every call into a hedge. A pool already
+    created smaller is replaced; calls running on the old one finish there.
+    """
+    global _hedge_executor, _hedge_min_workers
+    with _hedge_executor_lock:
+        _hedge_min_workers = max(_hedge_min_workers, minimum)
+        size = _hedge_pool_size()
+        if _hedge_executor is not None and _hedge_executor_workers < size:
+            _hedge_executor.shutdown(wait=False)
+            _hedge_executor = None
+        if size > int(os.getenv("HEDGE_MAX_WORKERS", "8")):
+            logger.info(json.dumps({"event": "hedge_pool_reserved", "workers": size}))
+    return size
+
+
+def _wait_timeout(cap: Optional[float], deadline: Deadline) -> Optional[float]:
+    """Timeout for ``wait()``: ``cap`` shrunk to what is left of ``deadline`` (None = no limit)."""
+    if not deadline.bounded:
+        return cap
+    remaining = deadline.remaining()
+    return remaining if cap is None else min(cap, remaining)
+
+
+def hedged(
+    call: Callable[[], T],
+    hedge: Callable[[], T],
+    delay_s: float,
+    dependency: str,
+    deadline: Deadline = NO_DEADLINE,
+) -> T:
+    """Run ``call``; if it has not finished after ``delay_s``, run ``hedge`` as well.
+
+    ``call`` runs on the shared hedge pool and ``hedge`` on the caller's thread, which would
+    otherwise only be waiting: a pool saturated by other requests can delay the primary but
+    never the hedge, so a local fallback answers within its budget however busy the process
+    is. Returns the hedge's result, or the primary's if the hedge fails; raises the primary's
+    error if both fail, and DeadlineExceeded if ``deadline`` passes while waiting.
+    """
+    # The call runs in a copy of the caller's context so request-scoped state (usage accounting) follows it
+    primary = _get_hedge_executor().submit(contextvars.copy_context().run, call)
+    done, _ = wait([primary], timeout=_wait_timeout(delay_s, deadline))
+    if done:
+        return primary.result()
+    deadline.check(dependency)
+    emit_metric("HedgedRequestCount", 1, {"Dependency": dependency})
+    # Still queued behind other requests' calls: the hedge replaces it instead of racing it
+    primary.cancel()
+    try:
+        result = hedge()
+    except Exception as exc:  # noqa: BLE001
+        if primary.cancelled():
+            raise
+        done, _ = wait([primary], timeout=_wait_timeout(None, deadline))
+        if not done:
+            raise DeadlineExceeded(f"Deadline exceeded waiting for {dependency}") from exc
+        return primary.result()
+    if not (primary.done() and not primary.cancelled() and primary.exception() is None):
+        emit_metric("HedgeWonCount", 1, {"Dependency": dependency})
+    return result
+
+
+class DependencyPolicy:
+    """Breaker + retry budget + deadline-aware backoff (+ optional hedging) for one dependency.
+
+    ``is_transient`` decides which errors are retried and count against the breaker; any
+    other error means the dependency did answer, so it counts as a success for the breaker.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        is_transient: Callable[[BaseException], bool],
+        breaker: CircuitBreaker,
+        budget: RetryBudget,
+        max_attempts: int = 3,
+        backoff_base: float = 0.5,
+        min_attempt_s: float = 1.0,
+        hedge_after_ms: int = 0,
+    ) -> None:
+        self.name = name
+        self.breaker = breaker
+        self.budget = budget
+        self._is_transient = is_transient
+        self._max_attempts = max_attempts
+        self._backoff_base = backoff_base
+        self._min_attempt_s = min_attempt_s
+        self._hedge_after_s = hedge_after_ms / 1000
+
+    def call(self, attempt: Callable[[], T], deadline: Deadline = NO_DEADLINE, hedge: bool = False) -> T:
+        """Run ``attempt`` (re-invoked for each retry) under this dependency's policy."""
+        self.budget.deposit()
+        attempts = 0
+        while True:
+            deadline.check(self.name)
+            self.breaker.allow()
+            try:
+                if hedge and self._hedge_after_s > 0:
+                    result = hedged(attempt, attempt, self._hedge_after_s, self.name, deadline)
+                else:
+                    result = attempt()
+            except DeadlineExceeded:
+                self.breaker.release()
+                raise
+            except Exception as exc:  # noqa: BLE001
+                if not self._is_transient(exc):
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                attempts += 1
+                if attempts >= self._max_attempts:
+                    raise
+                sleep_for = self._backoff_base * (2 ** (attempts - 1)) * random.uniform(0.75, 1.25)
+                self._before_retry(exc, attempts, sleep_for, deadline)
+                time.sleep(sleep_for)
+                continue
+            self.breaker.record_success()
+            return result
+
+    def _before_retry(self, exc: Exception, attempt: int, sleep_for: float, deadline: Deadline) -> None:
+        event = {"dependency": self.name, "attempt": attempt, "error": str(exc)}
+        if not deadline.allows(sleep_for + self._min_attempt_s):
+            # The next attempt could not finish before the caller gives up
+            logger.warning(json.dumps({"event": "retry_skipped", "remaining_s": round(deadline.remaining(), 3), **event}))
+            raise DeadlineExceeded(f"Deadline exceeded before {self.name} retry") from exc
+        if not self.budget.try_spend():
+            logger.warning(json.dumps({"event": "retry_budget_exhausted", **event}))
+            emit_metric("RetryBudgetExhaustedCount", 1, {"Dependency": self.name})
+            raise exc
+        logger.warning(json.dumps({"event": "retry", "sleep_for": sleep_for, **event}))
+
+
+_policies: Dict[str, DependencyPolicy] = {}
+_policies_lock = threading.Lock()
+
+
+def get_policy(
+    name: str,
+    is_transient: Callable[[BaseException], bool],
+    max_attempts: int = 3,
+    backoff_base: float = 0.5,
+    min_attempt_s: float = 1.0,
+) -> DependencyPolicy:
+    """Container-wide policy for ``name``; breaker and budget state is shared by all its callers."""
+    with _policies_lock:
+        policy = _policies.get(name)
+        if policy is None:
+            policy = DependencyPolicy(
+                name,
+                is_transient,
+                CircuitBreaker(
+                    name,
+                    int(os.getenv("CIRCUIT_BREAKER_FAILURES", "5")),
+                    float(os.getenv("CIRCUIT_BREAKER_RESET_SECONDS", "30")),
+                ),
+                RetryBudget(
+                    float(os.getenv("RETRY_BUDGET_RATIO", "0.2")),
+                    float(os.getenv("RETRY_BUDGET_MIN_PER_SECOND", "1")),
+                ),
+                max_attempts=max_attempts,
+                backoff_base=backoff_base,
+                min_attempt_s=min_attempt_s,
+                hedge_after_ms=int(os.getenv(f"{name.upper()}_HEDGE_AFTER_MS", "0")),
+            )
+            _policies[name] = policy
+    return policy
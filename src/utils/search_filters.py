@@ -0,0 +1,79 @@
+import json
+from typing import Any, Dict, List
+
+# Same metadata the Atlas pipeline projects, so both engines return identical documents
+COURSE_FIELDS = (
+    "title",
+    "description",
+    "url",
+    "platform",
+    "instructor",
+    "rating",
+    "duration",
+    "price",
+    "students_count",
+    "language",
+    "category",
+    "level",
+)
+
+LEVELS_ORDER = {"beginner": 0, "intermediate": 1, "advanced": 2}
+
+# Preferences dropped one at a time, least important first, when a stage comes back short
+RELAXATION_ORDER = ("preferred_platforms", "max_price", "language")
+
+
+def is_active(value: Any) -> bool:
+    return value is not None and value != [] and value != ""
+
+
+def compile_atlas_filter(filters: Dict[str, Any]) -> Dict[str, Any]:
+    """Translate request preferences into a $vectorSearch pre-filter.
+
+    Every field used here must be declared as a "filter" field in the Atlas vector index
+    (level, language, platform, price). Returns an empty dict when nothing applies.
+    """
+    clauses: List[Dict[str, Any]] = []
+    desired_level = filters.get("user_level")
+    if desired_level in LEVELS_ORDER:
+        # A course can be at most one level above the user; unknown levels count as intermediate
+        excluded = [level for level, rank in LEVELS_ORDER.items() if rank > LEVELS_ORDER[desired_level] + 1]
+        if excluded:
+            clauses.append({"level": {"$nin": excluded}})
+    if language := filters.get("language"):
+        clauses.append({"language": {"$eq": language}})
+    if platforms := filters.get("preferred_platforms"):
+        clauses.append({"platform": {"$in": list(platforms)}})
+    max_price = filters.get("max_price")
+    if max_price is not None:
+        clauses.append({"$or": [{"price": {"$lte": float(max_price)}}, {"price": {"$eq": None}}]})
+    if not clauses:
+        return {}
+    if len(clauses) == 1:
+        return clauses[0]
+    return {"$and": clauses}
+
+
+def relaxation_stages(filters: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Strict filters first, then progressively fewer preferences.
+
+    When there were preferences to drop, a last stage also drops user_level: the
+    post-filter path falls back to unfiltered candidates in that case, and pre-filtering
+    must not turn the same request into a "too few courses" error.
+    """
+    stages = [filters]
+    relaxed = dict(filters)
+    for key in RELAXATION_ORDER:
+        if is_active(relaxed.get(key)):
+            relaxed = {**relaxed, key: None}
+            stages.append(relaxed)
+    if len(stages) > 1 and is_active(relaxed.get("user_level")):
+        stages.append({**relaxed, "user_level": None})
+    return stages
+
+
+def filter_signature(filters: Dict[str, Any]) -> str:
+    active = {key: value for key, value in filters.items() if is_active(value)}
+    if isinstance(active.get("preferred_platforms"), list):
+        active["preferred_platforms"] = sorted(active["preferred_platforms"])
+    return json.dumps(active, sort_keys=True, ensure_ascii=False)
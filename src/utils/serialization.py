@@ -0,0 +1,26 @@
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Fallback without orjson: json.dumps output minus the separator spaces. Built once, since
+# json.dumps creates a new encoder on every call that passes options.
+_encoder = json.JSONEncoder(default=str, separators=(",", ":"))
+
+
+def encode_json(value: Any) -> str:
+    """Serialize a response body; uses orjson when it is installed, the stdlib C encoder otherwise.
+
+    Values JSON does not know (dates, Decimals) are written as ``str`` in both cases,
+    except dates and datetimes, which orjson writes in ISO 8601.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(value, default=str).decode()
+        except TypeError:
+            # e.g. integers beyond 64 bits or non-string keys, which the stdlib accepts
+            pass
+    return _encoder.encode(value)
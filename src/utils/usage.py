@@ -0,0 +1,166 @@
+import contextvars
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# On-demand USD per 1000 tokens (input, output), matched by substring of the model id.
+# Override with BEDROCK_PRICES_JSON, e.g. {"nova-lite": [0.00006, 0.00024]}
+DEFAULT_PRICES_PER_1K = {
+    "nova-micro": (0.000035, 0.00014),
+    "nova-lite": (0.00006, 0.00024),
+    "nova-pro": (0.0008, 0.0032),
+    "titan-embed-text-v2": (0.00002, 0.0),
+}
+
+
+def _load_prices() -> Dict[str, Tuple[float, float]]:
+    prices = dict(DEFAULT_PRICES_PER_1K)
+    raw = os.getenv("BEDROCK_PRICES_JSON", "")
+    if raw:
+        try:
+            prices.update({key: tuple(value) for key, value in json.loads(raw).items()})
+        except (ValueError, TypeError, AttributeError) as exc:
+            logger.warning(json.dumps({"event": "bedrock_prices_invalid", "error": str(exc)}))
+    return prices
+
+
+_prices = _load_prices()
+
+
+def estimate_cost_usd(model: str, input_tokens: int, output_tokens: int) -> float:
+    for key, (input_price, output_price) in _prices.items():
+        if key in model:
+            return (input_tokens * input_price + output_tokens * output_price) / 1000
+    return 0.0
+
+
+class BedrockCall:
+    __slots__ = ("kind", "stage", "model", "input_tokens", "output_tokens", "attempts", "latency_ms", "server_latency_ms", "ok")
+
+    def __init__(
+        self,
+        kind: str,
+        stage: str,
+        model: str,
+        input_tokens: int,
+        output_tokens: int,
+        attempts: int,
+        latency_ms: float,
+        server_latency_ms: Optional[float],
+        ok: bool,
+    ) -> None:
+        self.kind = kind
+        self.stage = stage
+        self.model = model
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+        self.attempts = attempts
+        self.latency_ms = latency_ms
+        self.server_latency_ms = server_latency_ms
+        self.ok = ok
+
+    @property
+    def generation_ms(self) -> float:
+        """Bedrock's own invocation latency when reported, else what the client observed."""
+        return self.server_latency_ms if self.server_latency_ms else self.latency_ms
+
+    @property
+    def cost_usd(self) -> float:
+        return estimate_cost_usd(self.model, self.input_tokens, self.output_tokens)
+
+
+class UsageLedger:
+    """Every Bedrock call made for one request: tokens, model, attempts and latency."""
+
+    def __init__(self) -> None:
+        self.calls: List[BedrockCall] = []
+        self._lock = threading.Lock()
+
+    def record(self, call: BedrockCall) -> None:
+        with self._lock:
+            self.calls.append(call)
+
+    def summary(self) -> Dict[str, Any]:
+        """Totals plus a breakdown per stage, for the structured completion log."""
+        with self._lock:
+            calls = list(self.calls)
+        stages: Dict[str, Dict[str, Any]] = {}
+        for call in calls:
+            stage = stages.setdefault(
+                call.stage,
+                {"model": call.model, "calls": 0, "attempts": 0, "input_tokens": 0, "output_tokens": 0, "latency_ms": 0},
+            )
+            stage["calls"] += 1
+            stage["attempts"] += call.attempts
+            stage["input_tokens"] += call.input_tokens
+            stage["output_tokens"] += call.output_tokens
+            stage["latency_ms"] += int(call.latency_ms)
+        return {
+            "calls": len(calls),
+            "failed_calls": sum(1 for call in calls if not call.ok),
+            "attempts": sum(call.attempts for call in calls),
+            "input_tokens": sum(call.input_tokens for call in calls),
+            "output_tokens": sum(call.output_tokens for call in calls),
+            "cost_usd": round(sum(call.cost_usd for call in calls), 6),
+            "stages": stages,
+        }
+
+
+# Context variables follow the request across threads only when work is submitted with
+# contextvars.copy_context().run (see resilience.hedged and the two-phase Nova fragments)
+_ledger: contextvars.ContextVar[Optional[UsageLedger]] = contextvars.ContextVar("bedrock_usage", default=None)
+_stage: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("bedrock_usage_stage", default=None)
+
+
+def start_usage() -> UsageLedger:
+    """Start accounting for the request running in the current context."""
+    ledger = UsageLedger()
+    _ledger.set(ledger)
+    return ledger
+
+
+def current_usage() -> Optional[UsageLedger]:
+    return _ledger.get()
+
+
+@contextmanager
+def usage_stage(stage: str) -> Iterator[None]:
+    """Label the Bedrock calls made inside the block (and in work submitted from it)."""
+    token = _stage.set(stage)
+    try:
+        yield
+    finally:
+        _stage.reset(token)
+
+
+def record_bedrock_call(
+    kind: str,
+    model: str,
+    input_tokens: int = 0,
+    output_tokens: int = 0,
+    attempts: int = 1,
+    latency_ms: float = 0.0,
+    server_latency_ms: Optional[float] = None,
+    ok: bool = True,
+) -> None:
+    ledger = _ledger.get()
+    if ledger is None:
+        return
+    ledger.record(
+        BedrockCall(
+            kind,
+            _stage.get() or kind,
+            model,
+            int(input_tokens or 0),
+            int(output_tokens or 0),
+            attempts,
+            latency_ms,
+            server_latency_ms,
+            ok,
+        )
+    )
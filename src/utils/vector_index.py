@@ -0,0 +1,190 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from utils.search_filters import COURSE_FIELDS
+
+logger = logging.getLogger(__name__)
+
+MAX_CACHED_MASKS = 64
+
+
+class LocalVectorIndex:
+    """In-memory cosine index over the course catalog.
+
+    Embeddings are held as one contiguous, L2-normalized float32 matrix so a query
+    is a single matmul followed by an argpartition for the top candidates.
+    """
+
+    def __init__(self, matrix: np.ndarray, documents: List[Dict[str, Any]]) -> None:
+        if matrix.ndim != 2 or matrix.shape[0] != len(documents):
+            raise ValueError("Vector index matrix and documents are out of sync")
+        self._matrix = matrix
+        self._documents = documents
+        # Shared by the request threads of the server mode (and hedged calls)
+        self._mask_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._mask_lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        return self._matrix.shape[0]
+
+    @property
+    def dimension(self) -> int:
+        return self._matrix.shape[1]
+
+    @classmethod
+    def from_documents(cls, documents: Iterable[Dict[str, Any]], dimension: int) -> "LocalVectorIndex":
+        metadata: List[Dict[str, Any]] = []
+        vectors: List[List[float]] = []
+        for doc in documents:
+            embedding = doc.get("embedding")
+            if not embedding or len(embedding) != dimension:
+                continue
+            vectors.append(embedding)
+            metadata.append({"_id": doc.get("_id"), **{field: doc.get(field) for field in COURSE_FIELDS if field in doc}})
+        matrix = np.asarray(vectors, dtype=np.float32).reshape(len(vectors), dimension)
+        return cls(_normalize_rows(matrix), metadata)
+
+    @classmethod
+    def from_collection(cls, collection, dimension: int) -> "LocalVectorIndex":
+        start = time.time()
+        projection = {"embedding": 1, **{field: 1 for field in COURSE_FIELDS}}
+        index = cls.from_documents(collection.find({}, projection, batch_size=1000), dimension)
+        logger.info(
+            json.dumps(
+                {
+                    "event": "vector_index_loaded",
+                    "source": "collection",
+                    "courses": index.size,
+                    "load_time_ms": int((time.time() - start) * 1000),
+                }
+            )
+        )
+        return index
+
+    @classmethod
+    def from_snapshot(cls, snapshot_path: str, dimension: Optional[int] = None) -> "LocalVectorIndex":
+        start = time.time()
+        # Memory-mapped: pages are faulted in on first query instead of copied at load time
+        matrix = np.load(f"{snapshot_path}.npy", mmap_mode="r")
+        if dimension is not None and (matrix.ndim != 2 or matrix.shape[1] != dimension):
+            # A snapshot of another embedding model would only fail later, inside the matmul
+            raise ValueError(f"Vector index snapshot has shape {matrix.shape}; expected {dimension} columns")
+        with open(f"{snapshot_path}.json", "r", encoding="utf-8") as handle:
+            documents = json.load(handle)
+        index = cls(matrix, documents)
+        logger.info(
+            json.dumps(
+                {
+                    "event": "vector_index_loaded",
+                    "source": "snapshot",
+                    "courses": index.size,
+                    "load_time_ms": int((time.time() - start) * 1000),
+                }
+            )
+        )
+        return index
+
+    def save_snapshot(self, snapshot_path: str) -> None:
+        np.save(f"{snapshot_path}.npy", np.ascontiguousarray(self._matrix, dtype=np.float32))
+        documents = [{**doc, "_id": str(doc.get("_id"))} for doc in self._documents]
+        with open(f"{snapshot_path}.json", "w", encoding="utf-8") as handle:
+            json.dump(documents, handle, ensure_ascii=False)
+
+    def filter_mask(self, signature: str, predicate: Callable[[Dict[str, Any]], bool]) -> np.ndarray:
+        """Boolean row mask for a filter combination, computed once per signature (LRU of MAX_CACHED_MASKS)."""
+        with self._mask_lock:
+            mask = self._mask_cache.get(signature)
+            if mask is not None:
+                self._mask_cache.move_to_end(signature)
+                return mask
+        # Built outside the lock; two threads missing on one signature just compute it twice
+        mask = np.fromiter((predicate(doc) for doc in self._documents), dtype=bool, count=self.size)
+        with self._mask_lock:
+            self._mask_cache[signature] = mask
+            self._mask_cache.move_to_end(signature)
+            while len(self._mask_cache) > MAX_CACHED_MASKS:
+                self._mask_cache.popitem(last=False)
+        return mask
+
+    def search(
+        self,
+        query_embedding: List[float],
+        num_candidates: int,
+        allowed: Optional[np.ndarray] = None,
+    ) -> List[Dict[str, Any]]:
+        if not self.size:
+            return []
+        query = np.asarray(query_embedding, dtype=np.float32)
+        if query.shape != (self.dimension,):
+            raise ValueError("Query embedding dimension does not match the vector index")
+        norm = float(np.linalg.norm(query))
+        if not norm:
+            raise ValueError("Embedding norm is zero")
+        similarities = self._matrix @ (query / norm)
+        if allowed is not None:
+            eligible = np.flatnonzero(allowed)
+        else:
+            eligible = np.arange(self.size)
+        k = min(max(num_candidates, 1), eligible.size)
+        if not k:
+            return []
+        eligible_scores = similarities[eligible]
+        if k < eligible.size:
+            top = np.argpartition(-eligible_scores, k - 1)[:k]
+        else:
+            top = np.arange(eligible.size)
+        top = top[np.argsort(-eligible_scores[top], kind="stable")]
+        ranked = eligible[top]
+        # Match Atlas vectorSearchScore for cosine indexes: (1 + cosine) / 2
+        scores = (1.0 + eligible_scores[top]) / 2.0
+        return [
+            {**self._documents[position], "score": float(score)}
+            for position, score in zip(ranked.tolist(), scores.tolist())
+        ]
+
+    def search_many(self, query_embeddings: Sequence[List[float]], num_candidates: int) -> List[List[Dict[str, Any]]]:
+        """Top candidates of several queries at once: one (queries x dimension) @ matrix.T product."""
+        if not self.size:
+            return [[] for _ in query_embeddings]
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if queries.ndim != 2 or queries.shape[1] != self.dimension:
+            raise ValueError("Query embedding dimension does not match the vector index")
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        if not norms.all():
+            raise ValueError("Embedding norm is zero")
+        similarities = (queries / norms) @ self._matrix.T
+        k = min(max(num_candidates, 1), self.size)
+        if k < self.size:
+            top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        else:
+            top = np.broadcast_to(np.arange(self.size), similarities.shape)
+        top_scores = np.take_along_axis(similarities, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        ranked = np.take_along_axis(top, order, axis=1)
+        scores = (1.0 + np.take_along_axis(top_scores, order, axis=1)) / 2.0
+        return [
+            [{**self._documents[position], "score": float(score)} for position, score in zip(row.tolist(), row_scores.tolist())]
+            for row, row_scores in zip(ranked, scores)
+        ]
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(matrix / norms, dtype=np.float32)
+
+
+def load_local_index(collection, dimension: Optional[int] = None) -> LocalVectorIndex:
+    dimension = dimension or int(os.getenv("EMBEDDING_DIM", "1024"))
+    snapshot_path = os.getenv("VECTOR_INDEX_SNAPSHOT")
+    if snapshot_path and os.path.exists(f"{snapshot_path}.npy"):
+        return LocalVectorIndex.from_snapshot(snapshot_path, dimension)
+    return LocalVectorIndex.from_collection(collection, dimension)
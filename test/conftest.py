@@ -0,0 +1,51 @@
+import json
+import os
+import sys
+from typing import Any, Dict, Optional
+
+import pytest
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+SRC_DIR = os.path.join(ROOT_DIR, "src")
+for path in (SRC_DIR, ROOT_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+os.environ.setdefault("METRICS_SINK", "memory")
+
+DIMENSION = 32
+
+
+@pytest.fixture
+def make_generator(monkeypatch):
+    """Build a LearningPathGenerator on the offline fakes (no latency), with extra env vars set."""
+    import learning_path_generator
+    from benchmarks.fakes import FakeBedrockClient, FakeMongoDBClient, LatencyModel, SQLitePostgresClient, synthetic_catalog
+
+    built = []
+
+    def build(postgres_client: Optional[Any] = None, **env: str):
+        for name, value in env.items():
+            monkeypatch.setenv(name, value)
+        generator = learning_path_generator.LearningPathGenerator(
+            FakeBedrockClient(
+                DIMENSION,
+                embedding_latency=LatencyModel(1, scale=0),
+                nova_first_token=LatencyModel(1, scale=0),
+                latency_scale=0,
+            ),
+            FakeMongoDBClient(synthetic_catalog(200, DIMENSION), DIMENSION),
+            postgres_client or SQLitePostgresClient(),
+        )
+        built.append(generator)
+        monkeypatch.setattr(learning_path_generator, "generator_instance", generator)
+        return generator
+
+    yield build
+    for generator in built:
+        generator.close()
+
+
+def generation_event(user_id: str = "user-1", query: str = "Quiero aprender Python desde cero para análisis de datos", **body: Any) -> Dict[str, Any]:
+    payload = {"user_query": query, "user_level": "beginner", "time_per_week": 5, "num_courses": 4, **body}
+    return {"requestContext": {"authorizer": {"claims": {"sub": user_id}}}, "body": json.dumps(payload)}
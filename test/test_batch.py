@@ -0,0 +1,111 @@
+import json
+
+import pytest
+
+import learning_path_generator
+from benchmarks.fakes import SQLitePostgresClient
+from utils.deadline import DeadlineExceeded
+from utils.request_context import RequestContext
+from utils.resilience import CircuitOpenError
+
+QUERY = "Quiero aprender Python desde cero para análisis de datos"
+
+
+def batch_request(user_id: str, query: str = QUERY, **payload) -> RequestContext:
+    body = {"user_query": query, "user_level": "beginner", "time_per_week": 5, "num_courses": 4, **payload}
+    return RequestContext.from_payload(user_id, body)
+
+
+class FailingChunkPostgres(SQLitePostgresClient):
+    """Fails every batch write that contains a path of ``bad_user``."""
+
+    def __init__(self, bad_user: str):
+        super().__init__()
+        self.bad_user = bad_user
+        self.chunks = []
+
+    def persist_learning_paths(self, paths, deadline=None):
+        self.chunks.append([user_id for user_id, _, _ in paths])
+        if any(user_id == self.bad_user for user_id, _, _ in paths):
+            raise ConnectionError("chunk rejected")
+        super().persist_learning_paths(paths)
+
+
+def test_failed_chunk_only_marks_its_own_paths_unsaved(make_generator):
+    postgres = FailingChunkPostgres("user-2")
+    generator = make_generator(postgres, BATCH_PERSIST_SIZE="2")
+    requests = [batch_request(f"user-{index}") for index in range(5)]
+
+    batch = generator.generate_batch(requests)
+
+    assert postgres.chunks == [["user-0", "user-1"], ["user-2", "user-3"], ["user-4"]]
+    paths = [result["path"] for result in batch["results"]]
+    assert [path["user_id"] for path in paths] == [request.user_id for request in requests]
+    assert [path["persistence"] for path in paths] == ["persisted", "persisted", "failed", "failed", "persisted"]
+    assert all(result["status"] == 200 for result in batch["results"])
+    assert batch["summary"]["unsaved"] == 2
+    assert postgres.count_rows("user_learning_paths") == 3
+
+
+def batch_item(user_id, query=QUERY, **payload):
+    return {"user_id": user_id, "user_query": query, "user_level": "beginner", "time_per_week": 5, "num_courses": 4, **payload}
+
+
+@pytest.mark.parametrize(
+    "error, status",
+    [
+        (DeadlineExceeded("Deadline exceeded before embedding"), 504),
+        (CircuitOpenError("bedrock", 10.0), 503),
+        (learning_path_generator.ValidationError("Consulta inválida"), 400),
+        (RuntimeError("boom"), 500),
+    ],
+)
+def test_an_item_failure_maps_to_its_own_status(make_generator, error, status):
+    generator = make_generator()
+    generate_embedding = generator.generate_embedding
+
+    def embed(query, deadline=None):
+        if query.startswith("Falla"):
+            raise error
+        return generate_embedding(query, deadline)
+
+    generator.generate_embedding = embed
+    batch = generator.generate_batch([batch_request("user-1"), batch_request("user-2", "Falla esta consulta de prueba")])
+
+    assert [result["status"] for result in batch["results"]] == [200, status]
+    assert "path" not in batch["results"][1] and batch["results"][1]["error"]
+    assert (batch["summary"]["succeeded"], batch["summary"]["failed"]) == (1, 1)
+
+
+def test_identical_requests_share_embedding_search_and_plan(make_generator):
+    generator = make_generator(NOVA_PLAN_CACHE_SIZE="0")
+
+    batch = generator.generate_batch([batch_request(f"user-{index}") for index in range(3)])
+
+    summary = batch["summary"]
+    assert (summary["distinct_queries"], summary["distinct_searches"], summary["nova_plans"]) == (1, 1, 1)
+    assert generator.bedrock.calls == {"embedding": 1, "nova": 1}
+    assert len({result["path"]["path_id"] for result in batch["results"]}) == 3
+
+
+def test_handler_reports_invalid_items_and_runs_the_rest(make_generator):
+    make_generator()
+    event = {"batch": [batch_item("user-1"), batch_item("user-2", user_level="expert"), batch_item("user-3")]}
+
+    response = learning_path_generator.batch_handler(event, None)
+
+    body = json.loads(response["body"])
+    assert response["statusCode"] == 200
+    assert [result["status"] for result in body["results"]] == [200, 400, 200]
+    assert "user_level" in body["results"][1]["error"]
+    assert (body["summary"]["requests"], body["summary"]["succeeded"], body["summary"]["failed"]) == (3, 2, 1)
+
+
+@pytest.mark.parametrize("items", [None, [], [batch_item("user-1")] * 3], ids=["missing", "empty", "too-many"])
+def test_handler_rejects_empty_or_oversized_batches(make_generator, items):
+    make_generator(BATCH_MAX_REQUESTS="2")
+
+    response = learning_path_generator.batch_handler({"batch": items}, None)
+
+    assert response["statusCode"] == 400
+    assert "batch" in json.loads(response["body"])["error"]
@@ -0,0 +1,83 @@
+import argparse
+import json
+
+import learning_path_generator
+from benchmarks import pipeline
+from benchmarks.fakes import COURSE_ID_PATTERN, FakeBedrockClient, LatencyModel, SQLitePostgresClient, synthetic_catalog
+
+
+def benchmark_args(**overrides):
+    values = {
+        "catalog_size": 120,
+        "dimension": 16,
+        "latency_scale": 0.0,
+        "embedding_ms": 60.0,
+        "search_ms": 40.0,
+        "nova_first_token_ms": 600.0,
+        "nova_ms_per_token": 8.0,
+        "reason_words": 10,
+        "persist_ms": 30.0,
+        **overrides,
+    }
+    return argparse.Namespace(**values)
+
+
+def path(path_id, course_ids):
+    return {"path_id": path_id, "name": "Ruta"}, [{"course_id": course_id} for course_id in course_ids]
+
+
+def test_synthetic_catalog_is_deterministic_per_seed():
+    first = synthetic_catalog(20, 8)
+
+    assert first == synthetic_catalog(20, 8)
+    assert first != synthetic_catalog(20, 8, seed=12)
+    assert all(len(course["embedding"]) == 8 for course in first)
+    assert [course["_id"] for course in first[:2]] == ["course-000000", "course-000001"]
+
+
+def test_zero_scale_latency_does_not_sleep(monkeypatch):
+    slept = []
+    monkeypatch.setattr("time.sleep", slept.append)
+
+    LatencyModel(500, scale=0).sleep(extra_ms=100)
+    LatencyModel(500, scale=0.001).sleep()
+
+    assert len(slept) == 1
+
+
+def test_fake_nova_plans_over_the_courses_in_the_prompt():
+    bedrock = FakeBedrockClient(8, LatencyModel(1, scale=0), LatencyModel(1, scale=0), latency_scale=0)
+    prompt = 'Devuelve {"nodes": [...], "reason": ...} para course-000003 y course-000007'
+
+    response = bedrock.invoke_nova("system", prompt, max_tokens=4000)
+
+    plan = json.loads(response["message"]["content"][0]["text"])
+    assert [node["course_id"] for node in plan["nodes"]] == COURSE_ID_PATTERN.findall(prompt)
+    assert bedrock.calls == {"embedding": 0, "nova": 1}
+
+
+def test_sqlite_batch_writes_are_idempotent():
+    postgres = SQLitePostgresClient()
+    batch = [("user-1", *path("p1", ["c1", "c2"])), ("user-2", *path("p2", ["c3"]))]
+
+    postgres.persist_learning_paths(batch)
+    postgres.persist_learning_paths(batch)
+
+    assert postgres.count_rows("user_learning_paths") == 2
+    assert postgres.count_rows("course_progress") == 3
+
+
+def test_pipeline_times_every_stage_without_simulated_latency(monkeypatch):
+    monkeypatch.setenv("NOVA_PLAN_CACHE_SIZE", "0")
+    monkeypatch.setattr(learning_path_generator, "generator_instance", None)
+    recorder = pipeline.StageRecorder()
+    generator = pipeline.build_generator(benchmark_args(), recorder)
+    try:
+        wall_s, totals, failures = pipeline.run_requests(3, 4, 2)
+        report = pipeline.summarize(recorder, wall_s, totals, failures)
+    finally:
+        generator.close()
+
+    assert (report["requests"], report["failures"]) == (3, 0)
+    assert {"embedding", "search", "nova", "persistence"} <= set(report["stages"])
+    assert report["stages"]["nova"]["calls"] == 3
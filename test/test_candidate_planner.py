@@ -0,0 +1,88 @@
+import pytest
+
+from benchmarks.fakes import FakeMongoDBClient
+from utils import candidate_planner
+from utils.candidate_planner import ATLAS_MAX_NUM_CANDIDATES, MIN_SURVIVAL_RATE, CandidatePlanner
+from utils.search_filters import filter_signature
+
+
+@pytest.fixture
+def planner(monkeypatch):
+    monkeypatch.setenv("CANDIDATE_STATS_DECAY", "0.95")
+    monkeypatch.setenv("CANDIDATE_ANN_RATIO", "5")
+    return CandidatePlanner()
+
+
+def test_unseen_signature_plans_for_a_low_survival_rate(planner):
+    assert planner.survival_lower_bound("new") == pytest.approx(0.025, abs=0.001)
+    # ceil(10 / 0.025) = 400 documents, capped by the caller's maximum
+    assert planner.plan("new", 10, 100) == (100, 100)
+
+
+def test_filters_that_always_pass_shrink_the_query_to_the_limit(planner):
+    for _ in range(20):
+        planner.observe("unfiltered", 100, 100)
+
+    fetch_limit, num_candidates = planner.plan("unfiltered", 10, 1000)
+
+    assert 10 <= fetch_limit <= 11
+    assert num_candidates == fetch_limit * 5
+
+
+def test_selective_filters_fetch_more_than_permissive_ones(planner):
+    for _ in range(20):
+        planner.observe("selective", 100, 10)
+        planner.observe("permissive", 100, 80)
+
+    assert planner.plan("selective", 10, 1000)[0] > planner.plan("permissive", 10, 1000)[0]
+    assert planner.survival_lower_bound("selective") < 0.1
+
+
+def test_survival_bound_never_drops_below_the_floor(planner):
+    for _ in range(20):
+        planner.observe("nothing-survives", 100, 0)
+    assert planner.survival_lower_bound("nothing-survives") == MIN_SURVIVAL_RATE
+
+
+def test_widen_at_least_doubles_the_first_query(planner):
+    for _ in range(20):
+        planner.observe("sig", 100, 90)
+
+    fetch_limit, _ = planner.widen("sig", 10, found=4, fetched=12, max_candidates=20)
+
+    assert fetch_limit >= 24
+
+
+def test_plans_respect_the_atlas_candidate_limit(planner):
+    assert max(planner.plan("new", 500, 50000)) == ATLAS_MAX_NUM_CANDIDATES
+
+
+def test_empty_results_are_not_observed(planner):
+    planner.observe("sig", 0, 0)
+    assert planner.survival_lower_bound("sig") == planner.survival_lower_bound("other")
+
+
+def test_oldest_signatures_are_evicted(planner, monkeypatch):
+    monkeypatch.setattr(candidate_planner, "MAX_SIGNATURES", 2)
+    for signature in ("a", "b", "c"):
+        planner.observe(signature, 10, 10)
+    assert list(planner._stats) == ["b", "c"]
+
+
+def test_adaptive_search_widens_before_relaxing_preferences(monkeypatch):
+    monkeypatch.setenv("ADAPTIVE_CANDIDATES", "true")
+    # The four Spanish courses are the least similar to the query
+    catalog = [
+        {"_id": f"c{index}", "embedding": [1.0, index / 100, 0.0], "title": f"c{index}", "language": "en" if index < 16 else "es"}
+        for index in range(20)
+    ]
+    client = FakeMongoDBClient(catalog, 3)
+    filters = {"language": "es"}
+    for _ in range(20):
+        client._planner.observe(filter_signature(filters), 100, 50)
+    first_fetch, _ = client._planner.plan(filter_signature(filters), 4, 20)
+
+    results = client.vector_search([1.0, 0.0, 0.0], 4, 20, filters)
+
+    assert first_fetch < 16
+    assert [course["course_id"] for course in results] == ["c16", "c17", "c18", "c19"]
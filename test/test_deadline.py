@@ -0,0 +1,72 @@
+import time
+
+import pytest
+
+import learning_path_generator
+from conftest import generation_event
+from utils.bedrock_client import BedrockClient
+from utils.deadline import API_GATEWAY_TIMEOUT_MS, NO_DEADLINE, Deadline, DeadlineExceeded
+
+
+class FakeLambdaContext:
+    def __init__(self, remaining_ms):
+        self.remaining_ms = remaining_ms
+
+    def get_remaining_time_in_millis(self):
+        return self.remaining_ms
+
+
+def test_no_deadline_never_expires():
+    assert not NO_DEADLINE.bounded
+    assert NO_DEADLINE.remaining() == float("inf")
+    assert NO_DEADLINE.timeout(3.0) == 3.0
+    NO_DEADLINE.check("anything")
+
+
+def test_timeout_shrinks_to_the_remaining_budget():
+    deadline = Deadline.after(0.5)
+
+    assert deadline.timeout(10.0) <= 0.5
+    assert deadline.timeout(0.1) == 0.1
+    assert deadline.allows(0.2) and not deadline.allows(1.0)
+
+
+def test_expired_deadline_names_the_stage():
+    deadline = Deadline(time.monotonic() - 1)
+
+    assert deadline.remaining() == 0.0
+    with pytest.raises(DeadlineExceeded, match="before Nova"):
+        deadline.check("Nova")
+    with pytest.raises(DeadlineExceeded):
+        deadline.timeout(1.0, "persistence")
+
+
+def test_lambda_context_caps_the_api_gateway_budget(monkeypatch):
+    monkeypatch.setenv("REQUEST_DEADLINE_MARGIN_MS", "500")
+
+    short = Deadline.from_context(FakeLambdaContext(2000))
+    long = Deadline.from_context(FakeLambdaContext(900_000))
+
+    assert 1.4 < short.remaining() <= 1.5
+    assert long.remaining() <= (API_GATEWAY_TIMEOUT_MS - 500) / 1000
+    assert Deadline.from_context(None, budget_ms=400).remaining() == 0.0
+
+
+@pytest.mark.parametrize("remaining_s, read_timeout", [(None, 25), (12.0, 10), (3.5, 3)])
+def test_bedrock_attempts_use_the_largest_read_timeout_that_fits(remaining_s, read_timeout):
+    deadline = NO_DEADLINE if remaining_s is None else Deadline.after(remaining_s)
+    assert BedrockClient()._read_timeout_for(deadline) == read_timeout
+
+
+def test_bedrock_call_is_not_started_without_a_second_left():
+    with pytest.raises(DeadlineExceeded):
+        BedrockClient()._read_timeout_for(Deadline.after(0.5))
+
+
+def test_handler_answers_504_when_the_budget_is_already_spent(make_generator, monkeypatch):
+    make_generator(NOVA_PLAN_CACHE_SIZE="0")
+    monkeypatch.setenv("REQUEST_DEADLINE_MARGIN_MS", "750")
+
+    response = learning_path_generator.lambda_handler(generation_event(), FakeLambdaContext(500))
+
+    assert response["statusCode"] == 504
@@ -0,0 +1,103 @@
+import time
+
+import pytest
+
+from utils.embedding_cache import (
+    TIER_MEMORY,
+    TIER_MISS,
+    TIER_PERSISTENT,
+    EmbeddingCache,
+    SQLiteEmbeddingStore,
+    build_embedding_store,
+    normalize_query,
+)
+
+
+class CountingEmbedder:
+    def __init__(self, dimension=3):
+        self.dimension = dimension
+        self.calls = []
+
+    def __call__(self, text):
+        self.calls.append(text)
+        return [float(len(text))] + [0.5] * (self.dimension - 1)
+
+
+class BrokenStore:
+    def get(self, key):
+        raise ConnectionError("store down")
+
+    def put(self, key, value):
+        raise ConnectionError("store down")
+
+
+def test_queries_are_normalized_for_case_accents_and_spaces():
+    assert normalize_query("  Análisis   de DATOS ") == "analisis de datos"
+
+
+def test_second_lookup_is_served_from_memory():
+    cache = EmbeddingCache("titan", 3)
+    embed = CountingEmbedder()
+
+    first, first_tier = cache.get_or_compute("Python básico", embed)
+    second, second_tier = cache.get_or_compute("python BASICO", embed)
+
+    assert (first_tier, second_tier) == (TIER_MISS, TIER_MEMORY)
+    assert second == pytest.approx(first)
+    assert len(embed.calls) == 1
+
+
+def test_persistent_store_is_shared_by_new_instances(tmp_path):
+    store = SQLiteEmbeddingStore(str(tmp_path / "cache.sqlite3"), ttl_seconds=60)
+    embed = CountingEmbedder()
+    EmbeddingCache("titan", 3, store=store).get_or_compute("python", embed)
+
+    vector, tier = EmbeddingCache("titan", 3, store=store).get_or_compute("python", embed)
+
+    assert tier == TIER_PERSISTENT
+    assert vector == pytest.approx([6.0, 0.5, 0.5])
+    assert len(embed.calls) == 1
+
+
+def test_keys_separate_models_and_dimensions(tmp_path):
+    store = SQLiteEmbeddingStore(str(tmp_path / "cache.sqlite3"), ttl_seconds=60)
+    EmbeddingCache("titan", 3, store=store).get_or_compute("python", CountingEmbedder())
+
+    _, other_model = EmbeddingCache("titan-v3", 3, store=store).get_or_compute("python", CountingEmbedder())
+    _, other_dimension = EmbeddingCache("titan", 4, store=store).get_or_compute("python", CountingEmbedder(4))
+
+    assert (other_model, other_dimension) == (TIER_MISS, TIER_MISS)
+
+
+def test_expired_entries_are_not_served(tmp_path, monkeypatch):
+    store = SQLiteEmbeddingStore(str(tmp_path / "cache.sqlite3"), ttl_seconds=60)
+    EmbeddingCache("titan", 3, store=store).get_or_compute("python", CountingEmbedder())
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+
+    _, tier = EmbeddingCache("titan", 3, store=store).get_or_compute("python", CountingEmbedder())
+
+    assert tier == TIER_MISS
+
+
+def test_memory_tier_evicts_the_least_recently_used_entry():
+    cache = EmbeddingCache("titan", 3, max_entries=2)
+    embed = CountingEmbedder()
+    for text in ("a", "b", "a", "c"):
+        cache.get_or_compute(text, embed)
+
+    assert cache.get_or_compute("a", embed)[1] == TIER_MEMORY
+    assert cache.get_or_compute("b", embed)[1] == TIER_MISS
+
+
+def test_store_failures_fall_back_to_computing():
+    embed = CountingEmbedder()
+    vector, tier = EmbeddingCache("titan", 3, store=BrokenStore()).get_or_compute("python", embed)
+
+    assert tier == TIER_MISS
+    assert vector == [6.0, 0.5, 0.5]
+
+
+def test_unknown_backend_builds_no_store(monkeypatch):
+    monkeypatch.setenv("EMBEDDING_CACHE_BACKEND", "none")
+    assert build_embedding_store() is None
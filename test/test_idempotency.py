@@ -0,0 +1,201 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from conftest import generation_event
+from utils.deadline import Deadline
+from utils.idempotency import (
+    IdempotencyGuard,
+    IdempotencyKeyReusedError,
+    MemoryIdempotencyStore,
+    RequestInProgressError,
+    idempotency_key,
+    request_fingerprint,
+)
+from utils.request_context import RequestContext
+
+
+class Compute:
+    """compute() double counting its calls; optionally blocks until released or raises."""
+
+    def __init__(self, response=None, error=None, release=None):
+        self.response = response or {"path_id": "path-1"}
+        self.error = error
+        self.release = release
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.release is not None:
+            self.release.wait(5)
+        if self.error is not None:
+            raise self.error
+        return dict(self.response)
+
+
+def guard(store=None, **kwargs) -> IdempotencyGuard:
+    return IdempotencyGuard(store or MemoryIdempotencyStore(), ttl_s=60, lease_s=5, poll_s=0.01, **kwargs)
+
+
+def test_completed_request_is_replayed_without_recomputing():
+    idempotency = guard()
+    compute = Compute()
+
+    assert idempotency.run("key", "user-1", "fp", compute) == ({"path_id": "path-1"}, False)
+    assert idempotency.run("key", "user-1", "fp", compute) == ({"path_id": "path-1"}, True)
+    assert compute.calls == 1
+
+
+def test_key_reused_for_another_request_is_rejected():
+    idempotency = guard()
+    idempotency.run("key", "user-1", "fp", Compute())
+    with pytest.raises(IdempotencyKeyReusedError):
+        idempotency.run("key", "user-1", "other-fp", Compute())
+
+
+def test_failed_request_releases_its_key():
+    idempotency = guard()
+    with pytest.raises(RuntimeError):
+        idempotency.run("key", "user-1", "fp", Compute(error=RuntimeError("nova down")))
+    compute = Compute()
+    assert idempotency.run("key", "user-1", "fp", compute) == ({"path_id": "path-1"}, False)
+    assert compute.calls == 1
+
+
+def test_response_rejected_by_is_storable_is_not_replayed():
+    idempotency = guard(is_storable=lambda response: response.get("plan_source") == "nova")
+    compute = Compute(response={"path_id": "path-1", "plan_source": "fallback"})
+
+    idempotency.run("key", "user-1", "fp", compute)
+    _, replayed = idempotency.run("key", "user-1", "fp", compute)
+    assert not replayed
+    assert compute.calls == 2
+
+
+def test_concurrent_duplicates_in_one_container_share_the_first_computation():
+    idempotency = guard()
+    release = threading.Event()
+    compute = Compute(release=release)
+    with ThreadPoolExecutor(max_workers=4) as callers:
+        futures = [callers.submit(idempotency.run, "key", "user-1", "fp", compute) for _ in range(4)]
+        time.sleep(0.05)
+        release.set()
+        outcomes = [future.result(timeout=5) for future in futures]
+    assert compute.calls == 1
+    assert sorted(replayed for _, replayed in outcomes) == [False, True, True, True]
+
+
+def test_duplicate_in_another_container_waits_for_the_stored_response():
+    store = MemoryIdempotencyStore()
+    owner, duplicate = guard(store), guard(store)
+    release = threading.Event()
+    with ThreadPoolExecutor(max_workers=1) as runner:
+        first = runner.submit(owner.run, "key", "user-1", "fp", Compute(release=release))
+        time.sleep(0.05)
+        threading.Timer(0.1, release.set).start()
+        compute = Compute()
+        assert duplicate.run("key", "user-1", "fp", compute) == ({"path_id": "path-1"}, True)
+        assert first.result(timeout=5)[1] is False
+    assert compute.calls == 0
+
+
+def test_duplicate_gives_up_when_the_deadline_is_near():
+    store = MemoryIdempotencyStore()
+    owner, duplicate = guard(store), guard(store)
+    release = threading.Event()
+    with ThreadPoolExecutor(max_workers=1) as runner:
+        first = runner.submit(owner.run, "key", "user-1", "fp", Compute(release=release))
+        time.sleep(0.05)
+        try:
+            with pytest.raises(RequestInProgressError):
+                duplicate.run("key", "user-1", "fp", Compute(), Deadline.after(0.1))
+        finally:
+            release.set()
+        first.result(timeout=5)
+
+
+def test_request_runs_unguarded_when_the_store_fails():
+    class BrokenStore(MemoryIdempotencyStore):
+        def claim(self, *args, **kwargs):
+            raise ConnectionError("store down")
+
+    compute = Compute()
+    assert guard(BrokenStore()).run("key", "user-1", "fp", compute) == ({"path_id": "path-1"}, False)
+    assert compute.calls == 1
+
+
+def test_keys_are_derived_only_when_enabled():
+    payload = {"user_query": "python", "user_level": "beginner", "time_per_week": 5, "num_courses": 4}
+    request = RequestContext.from_payload("user-1", payload)
+    fingerprint = request_fingerprint(request)
+
+    assert idempotency_key(request, fingerprint, derive=False) is None
+    assert idempotency_key(request, fingerprint, derive=True) is not None
+    with_client_key = RequestContext.from_payload("user-1", payload, idempotency_key="abc")
+    assert idempotency_key(with_client_key, fingerprint, derive=False) is not None
+
+
+def test_generator_replays_a_persisted_nova_path(make_generator):
+    generator = make_generator(IDEMPOTENCY_BACKEND="memory")
+    event = generation_event(idempotency_key="retry-1")
+
+    first, replayed_first = generator.run_request(generator.parse_request(event))
+    second, replayed_second = generator.run_request(generator.parse_request(event))
+
+    assert (replayed_first, replayed_second) == (False, True)
+    assert second["path_id"] == first["path_id"]
+    assert generator.bedrock.calls["nova"] == 1
+
+
+def test_generator_does_not_derive_keys_by_default(make_generator):
+    generator = make_generator(IDEMPOTENCY_BACKEND="memory", NOVA_PLAN_CACHE_SIZE="0")
+    event = generation_event()
+
+    first = generator.handle(event)
+    second = generator.handle(event)
+
+    assert second["path_id"] != first["path_id"]
+
+
+def test_generator_does_not_replay_an_unsaved_path(make_generator):
+    from benchmarks.fakes import SQLitePostgresClient
+
+    class FailingPostgres(SQLitePostgresClient):
+        def persist_learning_path(self, *args, **kwargs):
+            raise ConnectionError("RDS unreachable")
+
+    generator = make_generator(FailingPostgres(), IDEMPOTENCY_BACKEND="memory")
+    event = generation_event(idempotency_key="retry-2")
+
+    first, _ = generator.run_request(generator.parse_request(event))
+    second, replayed = generator.run_request(generator.parse_request(event))
+
+    assert first["persistence"] == "failed"
+    assert not replayed
+    assert second["path_id"] != first["path_id"]
+
+
+def test_generator_replays_a_path_pending_in_the_sqs_outbox(make_generator):
+    class FakeSQS:
+        def __init__(self):
+            self.messages = []
+
+        def send_message(self, QueueUrl, MessageBody):
+            self.messages.append(MessageBody)
+
+    generator = make_generator(
+        IDEMPOTENCY_BACKEND="memory", OUTBOX_BACKEND="sqs", OUTBOX_QUEUE_URL="https://sqs.example/outbox"
+    )
+    generator.outbox._client = sqs = FakeSQS()
+    event = generation_event(idempotency_key="retry-3")
+
+    first, _ = generator.run_request(generator.parse_request(event))
+    second, replayed = generator.run_request(generator.parse_request(event))
+
+    assert first["persistence"] == "pending"
+    assert replayed
+    assert second["path_id"] == first["path_id"]
+    assert len(sqs.messages) == 1
+    assert generator.bedrock.calls["nova"] == 1
@@ -0,0 +1,211 @@
+import json
+import threading
+import time
+
+import pytest
+
+import learning_path_generator
+from conftest import generation_event
+from utils.jobs import JOB_FAILED, JOB_QUEUED, JOB_SUCCEEDED, LocalJobQueue, SQSJobQueue, retry_delay_s
+from utils.resilience import CircuitOpenError
+
+
+class RecordingQueue:
+    """Job queue double: keeps submitted ids so each test runs the job itself."""
+
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, job_id):
+        self.submitted.append(job_id)
+
+    def close(self):
+        pass
+
+
+class DeferringSQSQueue(SQSJobQueue):
+    """SQSJobQueue without boto3: records the visibility backoffs it would set."""
+
+    def __init__(self):
+        super().__init__("https://sqs.example/jobs", retry_base_s=30, retry_max_s=900)
+        self.deferred = []
+
+    def submit(self, job_id):
+        pass
+
+    def defer(self, receipt_handle, receives):
+        self.deferred.append((receipt_handle, receives))
+
+
+@pytest.fixture
+def jobs_generator(make_generator):
+    generator = make_generator(JOB_QUEUE_BACKEND="local", JOB_STORE_PATH=":memory:")
+    generator.job_queue.close()
+    generator.job_queue = RecordingQueue()
+    return generator
+
+
+def submit(generator, user_id="user-1", **body):
+    return generator.submit_job(generator.parse_request(generation_event(user_id, **body)))
+
+
+def open_circuit(*args, **kwargs):
+    raise CircuitOpenError("bedrock", 30)
+
+
+def job_record(job_id, receives=1, message_id="m1"):
+    return {
+        "messageId": message_id,
+        "receiptHandle": f"handle-{message_id}",
+        "body": json.dumps({"job_id": job_id}),
+        "attributes": {"ApproximateReceiveCount": str(receives)},
+    }
+
+
+def test_job_runs_from_queued_to_succeeded(jobs_generator):
+    job = submit(jobs_generator)
+    assert jobs_generator.job_queue.submitted == [job.job_id]
+    assert jobs_generator.job_status(job.job_id, "user-1")["status"] == JOB_QUEUED
+
+    assert jobs_generator.run_job(job.job_id)
+
+    view = jobs_generator.job_status(job.job_id, "user-1")
+    assert view["status"] == JOB_SUCCEEDED
+    assert {"embedding", "search", "nova", JOB_SUCCEEDED} <= set(view["stages"])
+    assert view["result"]["path_id"]
+
+
+def test_invalid_request_fails_the_job_with_400(jobs_generator, monkeypatch):
+    def invalid(*args, **kwargs):
+        raise learning_path_generator.ValidationError("Consulta inválida")
+
+    job = submit(jobs_generator)
+    monkeypatch.setattr(jobs_generator, "run_request", invalid)
+
+    assert jobs_generator.run_job(job.job_id)
+
+    view = jobs_generator.job_status(job.job_id, "user-1")
+    assert view["status"] == JOB_FAILED
+    assert view["error"]["status"] == 400
+
+
+def test_open_circuit_defers_the_job_until_the_final_attempt(jobs_generator, monkeypatch):
+    job = submit(jobs_generator)
+    monkeypatch.setattr(jobs_generator, "run_request", open_circuit)
+
+    assert not jobs_generator.run_job(job.job_id)
+    assert jobs_generator.job_status(job.job_id, "user-1")["status"] == JOB_QUEUED
+
+    assert jobs_generator.run_job(job.job_id, final_attempt=True)
+    view = jobs_generator.job_status(job.job_id, "user-1")
+    assert view["status"] == JOB_FAILED
+    assert view["error"]["status"] == 503
+
+
+def test_finished_job_is_not_run_again(jobs_generator):
+    job = submit(jobs_generator)
+    jobs_generator.run_job(job.job_id)
+    calls = jobs_generator.bedrock.calls["nova"]
+
+    assert jobs_generator.run_job(job.job_id)
+    assert jobs_generator.bedrock.calls["nova"] == calls
+
+
+def test_job_status_is_only_visible_to_its_owner(jobs_generator):
+    job = submit(jobs_generator, user_id="owner")
+
+    def status_event(job_id, user_id):
+        return {"pathParameters": {"job_id": job_id}, "requestContext": {"authorizer": {"claims": {"sub": user_id}}}}
+
+    assert jobs_generator.job_status_for_event(status_event(job.job_id, "owner"))["job_id"] == job.job_id
+    assert jobs_generator.job_status_for_event(status_event(job.job_id, "intruder")) is None
+    assert jobs_generator.job_status_for_event(status_event("missing", "owner")) is None
+    assert jobs_generator.job_status_for_event({"pathParameters": None}) is None
+
+
+def test_worker_defers_with_backoff_while_deliveries_remain(jobs_generator, monkeypatch):
+    jobs_generator.job_queue = DeferringSQSQueue()
+    job = submit(jobs_generator)
+    monkeypatch.setattr(jobs_generator, "run_request", open_circuit)
+
+    response = learning_path_generator.job_worker_handler({"Records": [job_record(job.job_id, receives=2)]}, None)
+
+    assert response == {"batchItemFailures": [{"itemIdentifier": "m1"}]}
+    assert jobs_generator.job_queue.deferred == [("handle-m1", 2)]
+    assert jobs_generator.job_status(job.job_id, "user-1")["status"] == JOB_QUEUED
+
+
+def test_worker_fails_the_job_on_the_last_delivery(jobs_generator, monkeypatch):
+    jobs_generator.job_queue = DeferringSQSQueue()
+    job = submit(jobs_generator)
+    monkeypatch.setattr(jobs_generator, "run_request", open_circuit)
+
+    response = learning_path_generator.job_worker_handler({"Records": [job_record(job.job_id, receives=5)]}, None)
+
+    assert response == {"batchItemFailures": []}
+    assert jobs_generator.job_queue.deferred == []
+    assert jobs_generator.job_status(job.job_id, "user-1")["status"] == JOB_FAILED
+
+
+def test_worker_fails_the_job_when_the_last_delivery_errors(jobs_generator, monkeypatch):
+    job = submit(jobs_generator)
+    original_update = jobs_generator.job_store.update
+
+    def update(job_id, **fields):
+        if fields.get("status") == "running":
+            raise ConnectionError("store down")
+        original_update(job_id, **fields)
+
+    monkeypatch.setattr(jobs_generator.job_store, "update", update)
+    records = [job_record(job.job_id, receives=4, message_id="m1"), job_record(job.job_id, receives=5, message_id="m2")]
+
+    response = learning_path_generator.job_worker_handler({"Records": records}, None)
+
+    assert response == {"batchItemFailures": [{"itemIdentifier": "m1"}]}
+    assert jobs_generator.job_status(job.job_id, "user-1")["error"]["status"] == 500
+
+
+def test_worker_drops_malformed_messages(jobs_generator):
+    event = {"Records": [{"messageId": "m1", "body": "not json"}, {"messageId": "m2", "body": json.dumps({})}]}
+    assert learning_path_generator.job_worker_handler(event, None) == {"batchItemFailures": []}
+
+
+def test_local_queue_retries_a_deferred_job_until_the_final_attempt():
+    attempts = []
+    done = threading.Event()
+
+    def run_job(job_id, final_attempt=False):
+        attempts.append(final_attempt)
+        if final_attempt:
+            done.set()
+        return False
+
+    queue = LocalJobQueue(run_job, workers=1, max_attempts=3, retry_base_s=0, retry_max_s=0)
+    queue.submit("job-1")
+    assert done.wait(5)
+    queue.close()
+
+    assert attempts == [False, False, True]
+
+
+def test_closing_the_local_queue_runs_the_final_attempt_at_once():
+    attempts = []
+    first = threading.Event()
+
+    def run_job(job_id, final_attempt=False):
+        attempts.append(final_attempt)
+        first.set()
+        return False
+
+    queue = LocalJobQueue(run_job, workers=1, max_attempts=5, retry_base_s=60, retry_max_s=60)
+    queue.submit("job-1")
+    assert first.wait(5)
+    started = time.monotonic()
+    queue.close()
+
+    assert attempts == [False, True]
+    assert time.monotonic() - started < 5
+
+
+def test_retry_delay_doubles_up_to_the_cap():
+    assert [retry_delay_s(attempt, 30, 900) for attempt in (1, 2, 3, 6)] == [30, 60, 120, 900]
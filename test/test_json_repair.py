@@ -0,0 +1,87 @@
+import json
+
+import pytest
+
+from conftest import generation_event
+from utils.fallback_planner import PLAN_SOURCE_PARTIAL
+from utils.json_repair import is_truncated_json, parse_json_object
+
+PLAN = {
+    "name": "Ruta",
+    "nodes": [{"course_id": "c1", "reason": "Base, \"sólida\" {1}"}, {"course_id": "c2", "reason": "Sigue"}],
+    "roadmap_text": "## Roadmap",
+}
+
+
+def truncate_first_call(generator, max_tokens):
+    """Cut the first Nova answer at ``max_tokens``, like Bedrock stopping at maxTokens."""
+    invoke_nova = generator.bedrock.invoke_nova
+
+    def invoke(system_prompt, user_prompt, tokens=None, **kwargs):
+        if kwargs.get("assistant_prefix") is None:
+            tokens = max_tokens
+        return invoke_nova(system_prompt, user_prompt, tokens, **kwargs)
+
+    generator.bedrock.invoke_nova = invoke
+
+
+def test_valid_json_is_not_marked_repaired():
+    result = parse_json_object(json.dumps(PLAN))
+    assert (result.value, result.truncated, result.repaired) == (PLAN, False, False)
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "Aquí está tu ruta:\n```json\n" + json.dumps(PLAN) + "\n```\nEspero que te sirva.",
+        json.dumps(PLAN, indent=2).replace('"Sigue"\n', '"Sigue",\n').replace("}\n  ]", "},\n  ]"),
+        json.dumps(PLAN).replace("## Roadmap", "## Roadmap\n- paso 1\t"),
+    ],
+    ids=["surrounding-text", "trailing-commas", "raw-control-characters"],
+)
+def test_common_model_mistakes_are_repaired(text):
+    result = parse_json_object(text)
+
+    assert result.repaired and not result.truncated
+    assert [node["course_id"] for node in result.value["nodes"]] == ["c1", "c2"]
+
+
+def test_truncated_object_is_cut_back_to_the_last_complete_value():
+    text = json.dumps(PLAN)
+    cut = text[: text.index('"Sigue"') + 3]
+
+    result = parse_json_object(cut)
+
+    assert is_truncated_json(cut) and not is_truncated_json(text)
+    assert result.truncated
+    # The half-written node keeps its finished fields; the generator drops incomplete nodes
+    assert result.value == {"name": "Ruta", "nodes": [PLAN["nodes"][0], {"course_id": "c2"}]}
+
+
+@pytest.mark.parametrize("text", ["sin json", "{\"nodes\": [1, 2] ¿?}", "{\"a\""])
+def test_unrecoverable_text_raises_value_error(text):
+    with pytest.raises(ValueError):
+        parse_json_object(text)
+
+
+def test_truncated_nova_answer_is_finished_by_a_continuation_call(make_generator):
+    generator = make_generator(NOVA_PLAN_CACHE_SIZE="0", NOVA_CONTINUATION_MAX_TOKENS="4096")
+    truncate_first_call(generator, 700)
+
+    response = generator.handle(generation_event(num_courses=4))
+
+    assert generator.bedrock.calls["nova"] == 2
+    assert response["plan_source"] == "nova"
+    assert len(response["courses"]) == 4
+
+
+def test_truncated_nova_answer_without_continuation_keeps_the_written_nodes(make_generator):
+    generator = make_generator(NOVA_PLAN_CACHE_SIZE="0", NOVA_CONTINUATION_MAX_TOKENS="0", MIN_COURSES_IN_PATH="1")
+    truncate_first_call(generator, 700)
+
+    response = generator.handle(generation_event(num_courses=4))
+
+    assert generator.bedrock.calls["nova"] == 1
+    assert response["plan_source"] == PLAN_SOURCE_PARTIAL
+    assert 0 < len(response["courses"]) < 4
+    assert response["roadmap_text"]
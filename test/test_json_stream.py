@@ -0,0 +1,70 @@
+import json
+
+import pytest
+
+from conftest import generation_event
+from utils.json_stream import IncrementalNodesParser
+
+PLAN = {
+    "name": "Ruta {con} llaves",
+    "tags": [{"course_id": "not-a-node"}],
+    "nodes": [
+        {"course_id": "c1", "reason": "Base \"sólida\" [1]", "lane": 0},
+        {"course_id": "c2", "reason": "Sigue con } y {", "extra": {"nested": [1, 2]}},
+        {"course_id": "c3", "reason": "Cierra\\"},
+    ],
+    "roadmap_text": "nodes: [ignorado]",
+}
+
+
+def feed_in_chunks(text, size):
+    parser = IncrementalNodesParser()
+    nodes = []
+    for start in range(0, len(text), size):
+        nodes.extend(parser.feed(text[start : start + size]))
+    return parser, nodes
+
+
+@pytest.mark.parametrize("size", [1, 2, 7, 64, 10_000])
+def test_nodes_are_the_same_however_the_stream_is_chunked(size):
+    text = json.dumps(PLAN, ensure_ascii=False)
+
+    parser, nodes = feed_in_chunks(text, size)
+
+    assert nodes == PLAN["nodes"]
+    assert parser.text == text
+
+
+def test_text_before_the_object_is_ignored():
+    _, nodes = feed_in_chunks("```json\n" + json.dumps(PLAN) + "\n```", 5)
+    assert [node["course_id"] for node in nodes] == ["c1", "c2", "c3"]
+
+
+def test_each_node_is_returned_as_soon_as_it_closes():
+    parser = IncrementalNodesParser()
+    text = json.dumps(PLAN)
+    first_end = text.index("}", text.index('"c1"')) + 1
+
+    assert parser.feed(text[:first_end]) == [PLAN["nodes"][0]]
+    assert parser.feed(text[first_end:]) == PLAN["nodes"][1:]
+
+
+def test_truncated_stream_keeps_only_complete_nodes():
+    text = json.dumps(PLAN)
+    _, nodes = feed_in_chunks(text[: text.index('"c3"')], 16)
+    assert [node["course_id"] for node in nodes] == ["c1", "c2"]
+
+
+def test_stream_yields_header_courses_roadmap_and_complete(make_generator):
+    generator = make_generator()
+
+    messages = list(generator.stream_learning_path(generation_event()))
+
+    kinds = [message["type"] for message in messages]
+    assert kinds[0] == "header"
+    assert kinds[-2:] == ["roadmap", "complete"]
+    courses = [message["course"]["course_id"] for message in messages if message["type"] == "course"]
+    path = messages[-1]["path"]
+    assert len(courses) == messages[0]["num_courses"]
+    assert sorted(courses) == sorted(course["course_id"] for course in path["courses"])
+    assert path["path_id"] == messages[0]["path_id"]
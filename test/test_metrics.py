@@ -0,0 +1,125 @@
+import contextvars
+import io
+import json
+import threading
+
+from utils.metrics import EmbeddedMetricFormatSink, InMemorySink, MetricsRecorder
+
+
+class RecordingSink(InMemorySink):
+    """InMemorySink that also keeps each publish() call separately."""
+
+    def __init__(self):
+        super().__init__()
+        self.flushes = []
+
+    def publish(self, data):
+        super().publish(data)
+        self.flushes.append([(datum.name, datum.value) for datum in data if not datum.dimensions])
+
+
+def run_in_new_context(func):
+    return contextvars.Context().run(func)
+
+
+def test_dimensioned_datum_is_also_recorded_without_dimensions():
+    sink = InMemorySink()
+    recorder = MetricsRecorder(sink)
+    recorder.start_request()
+    recorder.record("NovaTimeMs", 120, {"Model": "nova-lite"})
+    recorder.flush()
+
+    assert [(datum.name, datum.unit, datum.dimensions) for datum in sink.published] == [
+        ("NovaTimeMs", "Milliseconds", ()),
+        ("NovaTimeMs", "Milliseconds", (("Model", "nova-lite"),)),
+    ]
+
+
+def test_concurrent_requests_flush_only_their_own_points():
+    sink = RecordingSink()
+    recorder = MetricsRecorder(sink)
+    recorded = threading.Barrier(2)
+
+    def request(name):
+        def run():
+            recorder.start_request()
+            recorder.record(name, 1)
+            # Both requests have buffered a point before either flushes
+            recorded.wait(5)
+            recorder.record(name, 2)
+            recorder.flush()
+
+        return lambda: run_in_new_context(run)
+
+    threads = [threading.Thread(target=request(name)) for name in ("RequestA", "RequestB")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(sink.flushes) == [[("RequestA", 1), ("RequestA", 2)], [("RequestB", 1), ("RequestB", 2)]]
+
+
+def test_work_submitted_with_the_request_context_lands_in_its_buffer():
+    sink = RecordingSink()
+    recorder = MetricsRecorder(sink)
+
+    def run():
+        recorder.start_request()
+        worker = threading.Thread(target=contextvars.copy_context().run, args=(recorder.record, "HedgeCount", 1))
+        worker.start()
+        worker.join()
+        recorder.flush()
+
+    run_in_new_context(run)
+
+    assert sink.flushes == [[("HedgeCount", 1)]]
+
+
+def test_background_points_are_published_with_the_next_flush():
+    sink = RecordingSink()
+    recorder = MetricsRecorder(sink)
+    run_in_new_context(lambda: recorder.record("OutboxDepth", 3))
+
+    def run():
+        recorder.start_request()
+        recorder.record("PathsGeneratedCount", 1)
+        recorder.flush()
+
+    run_in_new_context(run)
+
+    assert sink.flushes == [[("PathsGeneratedCount", 1), ("OutboxDepth", 3)]]
+
+
+def test_recorder_without_a_sink_drops_points():
+    recorder = MetricsRecorder(None)
+    recorder.record("PathsGeneratedCount", 1)
+    recorder.flush()
+
+
+def test_emf_groups_points_by_dimension_set():
+    stream = io.StringIO()
+    recorder = MetricsRecorder(EmbeddedMetricFormatSink("Test", stream))
+
+    def run():
+        recorder.start_request()
+        recorder.record("BedrockInputTokens", 10, {"Stage": "nova"})
+        recorder.record("BedrockInputTokens", 5, {"Stage": "nova"})
+        recorder.record("PathsGeneratedCount", 1)
+        recorder.flush()
+
+    run_in_new_context(run)
+
+    documents = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert len(documents) == 2
+    plain, staged = documents
+    assert plain["BedrockInputTokens"] == [10.0, 5.0]
+    assert plain["PathsGeneratedCount"] == 1.0
+    assert plain["_aws"]["CloudWatchMetrics"][0]["Dimensions"] == [[]]
+    assert staged["Stage"] == "nova"
+    assert staged["BedrockInputTokens"] == [10.0, 5.0]
+    assert staged["_aws"]["CloudWatchMetrics"][0] == {
+        "Namespace": "Test",
+        "Dimensions": [["Stage"]],
+        "Metrics": [{"Name": "BedrockInputTokens", "Unit": "Count"}],
+    }
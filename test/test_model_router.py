@@ -0,0 +1,66 @@
+import pytest
+
+from benchmarks.fakes import FakeBedrockClient, LatencyModel
+from utils.model_router import MIN_SAMPLES, ModelRouter
+
+LARGE = "us.amazon.nova-lite-v1:0"
+SMALL = "us.amazon.nova-micro-v1:0"
+
+
+def router(**options):
+    return ModelRouter(LARGE, SMALL, small_max_items=5, small_max_p50_s=2.0, probe_every=4, **options)
+
+
+@pytest.mark.parametrize("expected_items, model", [(3, SMALL), (5, SMALL), (6, LARGE), (None, LARGE)])
+def test_small_paths_go_to_the_small_model(expected_items, model):
+    assert router().choose(expected_items) == model
+
+
+def test_without_a_small_model_every_call_uses_the_large_one():
+    assert ModelRouter(LARGE).choose(1) == LARGE
+
+
+def test_slow_small_model_is_demoted_but_still_probed():
+    routing = router()
+    for _ in range(MIN_SAMPLES):
+        routing.record(SMALL, 5.0, ok=True)
+
+    choices = [routing.choose(3) for _ in range(8)]
+
+    assert choices.count(SMALL) == 2
+    assert choices[3] == SMALL and choices[7] == SMALL
+
+
+def test_failing_small_model_is_demoted():
+    routing = router()
+    for ok in (True, False, False, True, False):
+        routing.record(SMALL, 0.5, ok=ok)
+
+    assert routing.choose(3) == LARGE
+
+
+def test_too_few_samples_do_not_demote():
+    routing = router()
+    for _ in range(MIN_SAMPLES - 1):
+        routing.record(SMALL, 30.0, ok=False)
+
+    assert routing.choose(3) == SMALL
+
+
+def test_max_tokens_grow_per_course_up_to_the_ceiling():
+    routing = router(base_output_tokens=1000, output_tokens_per_item=200, max_output_tokens=2500)
+
+    assert routing.max_tokens_for(2) == 1400
+    assert routing.max_tokens_for(0) == 1200
+    assert routing.max_tokens_for(50) == 2500
+    assert routing.max_tokens_for(None) == 2500
+
+
+def test_nova_calls_are_routed_by_expected_courses(monkeypatch):
+    monkeypatch.setenv("NOVA_SMALL_MODEL", SMALL)
+    bedrock = FakeBedrockClient(8, LatencyModel(1, scale=0), LatencyModel(1, scale=0), latency_scale=0)
+
+    small = bedrock.invoke_nova("system", '{"nodes"} course-000001', expected_items=1)
+    large = bedrock.invoke_nova("system", '{"nodes"} course-000001', expected_items=8)
+
+    assert (small["model"], large["model"]) == (SMALL, LARGE)
@@ -0,0 +1,138 @@
+import json
+
+import pytest
+
+import learning_path_generator
+from conftest import generation_event
+from utils.outbox import OutboxEntry, OutboxFlusher, SQLiteOutbox, build_outbox
+
+
+def entry(path_id: str) -> OutboxEntry:
+    return OutboxEntry(path_id, "user-1", {"path_id": path_id, "name": path_id}, ["course-000001", "course-000002"])
+
+
+class FlakyPersist:
+    """persist_batch double: any batch containing a path id in ``bad`` fails."""
+
+    def __init__(self, bad=()):
+        self.bad = set(bad)
+        self.written = []
+        self.batches = []
+
+    def __call__(self, paths, deadline=None):
+        ids = [path_data["path_id"] for _, path_data, _ in paths]
+        self.batches.append(ids)
+        if self.bad & set(ids):
+            raise RuntimeError("constraint violation")
+        self.written.extend(ids)
+
+
+def test_flusher_writes_a_batch_and_acks_it(tmp_path):
+    outbox = SQLiteOutbox(str(tmp_path / "outbox.sqlite3"))
+    for path_id in ("a", "b", "c"):
+        outbox.enqueue(entry(path_id))
+    persist = FlakyPersist()
+    flusher = OutboxFlusher(outbox, persist, batch_size=10)
+
+    assert flusher.flush_once() == 3
+    assert persist.batches == [["a", "b", "c"]]
+    assert outbox.stats()[0] == 0
+
+
+def test_flusher_isolates_the_failing_entry_of_a_batch(tmp_path):
+    outbox = SQLiteOutbox(str(tmp_path / "outbox.sqlite3"))
+    for path_id in ("a", "bad", "c"):
+        outbox.enqueue(entry(path_id))
+    persist = FlakyPersist(bad={"bad"})
+    flusher = OutboxFlusher(outbox, persist, batch_size=10)
+
+    flusher.flush_once()
+    # The batch failed, then each entry was retried alone
+    assert persist.batches[0] == ["a", "bad", "c"]
+    assert sorted(persist.written) == ["a", "c"]
+    assert outbox.stats()[0] == 1
+    # The bad entry backs off instead of being claimed again right away
+    assert outbox.claim(10) == []
+
+
+def test_entry_is_dead_lettered_after_max_attempts(tmp_path):
+    outbox = SQLiteOutbox(str(tmp_path / "outbox.sqlite3"), max_attempts=2)
+    outbox.enqueue(entry("bad"))
+    claimed = outbox.claim(1)[0]
+    assert outbox.retry(claimed, "first failure")
+    claimed.attempts = 2
+    assert not outbox.retry(claimed, "second failure")
+    assert outbox.stats()[0] == 0
+
+
+def test_enqueue_is_idempotent_per_path_id(tmp_path):
+    outbox = SQLiteOutbox(str(tmp_path / "outbox.sqlite3"))
+    outbox.enqueue(entry("a"))
+    outbox.enqueue(entry("a"))
+    assert outbox.stats()[0] == 1
+
+
+def test_sqlite_outbox_is_refused_on_lambda(monkeypatch, tmp_path):
+    monkeypatch.setenv("OUTBOX_BACKEND", "sqlite")
+    monkeypatch.setenv("OUTBOX_PATH", str(tmp_path / "outbox.sqlite3"))
+    assert isinstance(build_outbox(), SQLiteOutbox)
+    monkeypatch.setenv("AWS_LAMBDA_FUNCTION_NAME", "learning-path-generator")
+    assert build_outbox() is None
+
+
+def sqs_record(message_id: str, body: str):
+    return {"messageId": message_id, "body": body}
+
+
+def test_outbox_handler_reports_only_failed_messages(monkeypatch):
+    persist = FlakyPersist(bad={"bad"})
+
+    class Client:
+        persist_learning_paths = persist
+
+    monkeypatch.setattr(learning_path_generator, "get_postgres_client", lambda: Client())
+    event = {
+        "Records": [
+            sqs_record("m1", entry("a").to_json()),
+            sqs_record("m2", entry("bad").to_json()),
+            sqs_record("m3", "not json"),
+            sqs_record("m4", entry("c").to_json()),
+        ]
+    }
+
+    response = learning_path_generator.outbox_handler(event, None)
+
+    # Malformed messages are dropped, not redelivered
+    assert response == {"batchItemFailures": [{"itemIdentifier": "m2"}]}
+    assert sorted(persist.written) == ["a", "c"]
+
+
+def test_outbox_handler_acks_a_batch_written_at_once(monkeypatch):
+    persist = FlakyPersist()
+
+    class Client:
+        persist_learning_paths = persist
+
+    monkeypatch.setattr(learning_path_generator, "get_postgres_client", lambda: Client())
+    event = {"Records": [sqs_record("m1", entry("a").to_json()), sqs_record("m2", entry("b").to_json())]}
+
+    assert learning_path_generator.outbox_handler(event, None) == {"batchItemFailures": []}
+    assert persist.batches == [["a", "b"]]
+
+
+@pytest.mark.parametrize("response_format", ["backend", "frontend"])
+def test_outbox_response_is_pending_until_written(make_generator, tmp_path, response_format):
+    generator = make_generator(OUTBOX_BACKEND="sqlite", OUTBOX_PATH=str(tmp_path / "outbox.sqlite3"))
+    body = json.loads(generator.render_response(generator.handle(generation_event()), response_format))
+
+    assert body["persistence"] == "pending"
+    assert body["persisted"] is False
+
+
+def test_synchronous_write_is_reported_as_persisted(make_generator):
+    generator = make_generator(OUTBOX_BACKEND="none")
+    response = generator.handle(generation_event())
+
+    assert response["persistence"] == "persisted"
+    assert response["persisted"] is True
+    assert generator.postgres_client.count_rows("user_learning_paths") == 1
@@ -0,0 +1,77 @@
+import time
+
+from conftest import generation_event
+from utils.plan_cache import PlanCache, plan_cache_key
+
+
+def plan():
+    return {"name": "Ruta", "nodes": [{"course_id": "c1", "order": 1}]}
+
+
+def test_key_ignores_course_order_but_not_level_or_hours():
+    key = plan_cache_key(["c2", "c1"], "beginner", 5)
+
+    assert key == plan_cache_key(["c1", "c2"], "beginner", 5)
+    assert key != plan_cache_key(["c1", "c2"], "advanced", 5)
+    assert key != plan_cache_key(["c1", "c2"], "beginner", 6)
+    assert key != plan_cache_key(["c1", "c3"], "beginner", 5)
+
+
+def test_cached_plans_are_copies():
+    cache = PlanCache(max_entries=4, ttl_seconds=60)
+    stored = plan()
+    cache.put("key", stored)
+    stored["nodes"].append({"course_id": "c2"})
+
+    first = cache.get("key")
+    first["nodes"][0]["reason"] = "enriched by the caller"
+
+    assert cache.get("key") == plan()
+
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    cache = PlanCache(max_entries=4, ttl_seconds=60)
+    cache.put("key", plan())
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 61)
+
+    assert cache.get("key") is None
+
+
+def test_least_recently_used_plan_is_evicted():
+    cache = PlanCache(max_entries=2, ttl_seconds=60)
+    cache.put("a", plan())
+    cache.put("b", plan())
+    cache.get("a")
+    cache.put("c", plan())
+
+    assert cache.get("a") is not None
+    assert cache.get("b") is None
+
+
+def test_zero_size_disables_the_cache():
+    cache = PlanCache(max_entries=0, ttl_seconds=60)
+    cache.put("key", plan())
+
+    assert not cache.enabled
+    assert cache.get("key") is None
+
+
+def test_generator_reuses_a_plan_for_the_same_courses(make_generator):
+    generator = make_generator(NOVA_PLAN_CACHE_SIZE="16")
+
+    first = generator.handle(generation_event(user_id="user-1"))
+    second = generator.handle(generation_event(user_id="user-2"))
+
+    assert generator.bedrock.calls["nova"] == 1
+    assert [course["course_id"] for course in second["courses"]] == [course["course_id"] for course in first["courses"]]
+    assert second["path_id"] != first["path_id"]
+
+
+def test_generator_calls_nova_per_request_without_the_cache(make_generator):
+    generator = make_generator(NOVA_PLAN_CACHE_SIZE="0")
+
+    generator.handle(generation_event())
+    generator.handle(generation_event())
+
+    assert generator.bedrock.calls["nova"] == 2
@@ -0,0 +1,191 @@
+import uuid
+
+import psycopg2
+import psycopg2.extras
+import pytest
+
+from utils.deadline import Deadline
+from utils.postgres_client import PREPARED_PERSIST_STATEMENT, PostgresClient
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, query, params=None):
+        if self.connection.fail_next:
+            self.connection.fail_next = False
+            raise psycopg2.DataError("invalid input")
+        self.connection.statements.append((query, params))
+
+    def fetchone(self):
+        return (self.connection.statements[-1][1][0],)
+
+
+class FakeConnection:
+    """psycopg2 connection double recording statements; execute_values is patched to record here too."""
+
+    def __init__(self, server_version=160000):
+        self.server_version = server_version
+        self.statements = []
+        self.closed = 0
+        self.autocommit = True
+        self.commits = 0
+        self.rollbacks = 0
+        self.fail_next = False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = 1
+
+
+class ReopeningPool:
+    """Hands out a new connection once the previous one was closed, like the real pool."""
+
+    def __init__(self, server_version):
+        self.server_version = server_version
+        self.connections = [FakeConnection(server_version)]
+
+    def getconn(self):
+        if self.connections[-1].closed:
+            self.connections.append(FakeConnection(self.server_version))
+        return self.connections[-1]
+
+    def putconn(self, connection, close=False):
+        pass
+
+
+class FakePool:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def getconn(self):
+        return self.connection
+
+    def putconn(self, connection, close=False):
+        pass
+
+    def closeall(self):
+        pass
+
+
+@pytest.fixture
+def make_client(monkeypatch):
+    def execute_values(cur, sql, argslist, template=None, page_size=100, fetch=False):
+        cur.connection.statements.append((sql, list(argslist)))
+
+    monkeypatch.setattr(psycopg2.extras, "execute_values", execute_values)
+
+    def build(server_version=160000, **env):
+        monkeypatch.setenv("POSTGRES_HOST", "localhost")
+        monkeypatch.setenv("POSTGRES_PASSWORD", "postgres")
+        for name, value in env.items():
+            monkeypatch.setenv(name, value)
+        client = PostgresClient()
+        connection = FakeConnection(server_version)
+        client._pool = FakePool(connection)
+        return client, connection
+
+    return build
+
+
+def path(path_id):
+    return {"path_id": path_id, "name": path_id, "description": "ruta"}
+
+
+def test_batch_write_generates_progress_ids_client_side(make_client):
+    client, connection = make_client(server_version=120000)
+    client.persist_learning_paths(
+        [("user-1", path("path-1"), [{"course_id": "c1"}, {"course_id": "c2"}]), ("user-2", path("path-2"), [{"course_id": "c3"}])]
+    )
+
+    (paths_sql, path_rows), (progress_sql, progress_rows) = connection.statements
+    assert "gen_random_uuid" not in progress_sql
+    assert [row[0] for row in path_rows] == ["path-1", "path-2"]
+    assert [row[1:] for row in progress_rows] == [
+        ("user-1", "path-1", "c1", "not_started", 0.0, 1),
+        ("user-1", "path-1", "c2", "not_started", 0.0, 2),
+        ("user-2", "path-2", "c3", "not_started", 0.0, 1),
+    ]
+    assert len({uuid.UUID(row[0]) for row in progress_rows}) == 3
+    assert connection.commits == 1
+
+
+def nodes(*course_ids):
+    return [{"course_id": course_id} for course_id in course_ids]
+
+
+def test_single_mode_prepares_once_per_connection(make_client):
+    client, connection = make_client(POSTGRES_PERSIST_MODE="single")
+
+    client.persist_learning_path("user-1", path("path-1"), nodes("c1", "c2"))
+    client.persist_learning_path("user-1", path("path-2"), nodes("c3"))
+
+    (first, first_params), (second, second_params) = connection.statements
+    assert first.startswith(f"PREPARE {PREPARED_PERSIST_STATEMENT} AS") and "EXECUTE" in first
+    assert second.startswith(f"EXECUTE {PREPARED_PERSIST_STATEMENT}")
+    assert first_params[0] == "path-1" and first_params[-1] == ["c1", "c2"]
+    assert second_params[-1] == ["c3"]
+    assert connection.commits == 0
+
+
+def test_single_mode_without_prepared_statements_inlines_the_query(make_client):
+    client, connection = make_client(POSTGRES_PERSIST_MODE="single", POSTGRES_PREPARED_STATEMENTS="false")
+
+    client.persist_learning_path("user-1", path("path-1"), nodes("c1"))
+
+    [(query, params)] = connection.statements
+    assert "PREPARE" not in query and "EXECUTE" not in query
+    assert query.lstrip().startswith("WITH path AS")
+    assert len(params) == 12
+
+
+def test_single_mode_scopes_the_deadline_to_the_statement(make_client):
+    client, connection = make_client(POSTGRES_PERSIST_MODE="single")
+
+    client.persist_learning_path("user-1", path("path-1"), nodes("c1"), Deadline.after(2))
+
+    [(query, params)] = connection.statements
+    assert query.startswith("SET LOCAL statement_timeout = %s;")
+    assert 0 < params[0] <= 2000 and params[1] == "path-1"
+
+
+def test_single_mode_falls_back_to_statements_before_postgres_13(make_client):
+    client, connection = make_client(server_version=120000, POSTGRES_PERSIST_MODE="single")
+
+    client.persist_learning_path("user-1", path("path-1"), nodes("c1", "c2"))
+
+    (path_sql, path_params), (progress_sql, progress_rows) = connection.statements
+    assert "INSERT INTO user_learning_paths" in path_sql and path_params[0] == "path-1"
+    assert [row[3] for row in progress_rows] == ["c1", "c2"]
+    assert not any("PREPARE" in query for query, _ in connection.statements)
+    assert connection.commits == 1
+
+
+def test_failed_prepared_write_prepares_again_on_a_new_connection(make_client):
+    client, _ = make_client(POSTGRES_PERSIST_MODE="single")
+    client._pool = ReopeningPool(160000)
+    client.persist_learning_path("user-1", path("path-1"), nodes("c1"))
+    client._pool.connections[0].fail_next = True
+
+    with pytest.raises(psycopg2.DataError):
+        client.persist_learning_path("user-1", path("path-2"), nodes("c2"))
+    client.persist_learning_path("user-1", path("path-3"), nodes("c3"))
+
+    old, new = client._pool.connections
+    assert old.closed
+    assert new.statements[0][0].startswith(f"PREPARE {PREPARED_PERSIST_STATEMENT}")
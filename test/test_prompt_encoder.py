@@ -0,0 +1,61 @@
+import json
+
+from conftest import generation_event
+from utils.prompt_encoder import COMPACT_COLUMNS, PromptEncoder, estimate_tokens
+
+
+def courses(count, description_words=80):
+    return [
+        {
+            "course_id": f"course-{index:06d}",
+            "title": f"Curso | {index}",
+            "level": "beginner",
+            "rating": 4.567,
+            "url": f"https://example.com/{index}",
+            "price": 19.99,
+            "description": " ".join(["palabra"] * description_words),
+        }
+        for index in range(count)
+    ]
+
+
+def test_json_encoding_keeps_every_field():
+    block, note = PromptEncoder("json").encode(courses(2))
+
+    assert json.loads(block) == courses(2)
+    assert note == ""
+
+
+def test_compact_encoding_writes_one_row_per_course_without_links():
+    block, note = PromptEncoder("compact", token_budget=2000).encode(courses(3))
+
+    header, *rows = block.split("\n")
+    assert header.split("|") == list(COMPACT_COLUMNS) + ["description"]
+    assert len(rows) == 3
+    assert rows[0].startswith("course-000000|Curso / 0|beginner||||4.57|||")
+    assert "https://" not in block and "19.99" not in block
+    assert note
+
+
+def test_descriptions_are_trimmed_to_fit_the_budget():
+    budget = 300
+    block, _ = PromptEncoder("compact", token_budget=budget).encode(courses(5, description_words=200))
+
+    assert estimate_tokens(block) <= budget
+    assert all(row.endswith("…") for row in block.split("\n")[1:])
+
+
+def test_courses_are_kept_when_the_budget_is_too_small():
+    block, _ = PromptEncoder("compact", token_budget=10).encode(courses(6))
+
+    rows = block.split("\n")[1:]
+    assert len(rows) == 6
+    assert all(row.endswith("|") for row in rows)
+
+
+def test_generator_merges_back_fields_left_out_of_the_prompt(make_generator):
+    generator = make_generator(PROMPT_ENCODING="compact", NOVA_PLAN_CACHE_SIZE="0")
+
+    response = generator.handle(generation_event())
+
+    assert all(course["url"].startswith("https://example.com/courses/") for course in response["courses"])
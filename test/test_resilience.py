@@ -0,0 +1,234 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from utils import resilience
+from utils.deadline import Deadline, DeadlineExceeded
+from utils.resilience import (
+    STATE_CLOSED,
+    STATE_HALF_OPEN,
+    STATE_OPEN,
+    CircuitBreaker,
+    CircuitOpenError,
+    DependencyPolicy,
+    RetryBudget,
+    hedged,
+    reserve_hedge_workers,
+)
+
+
+class TransientError(Exception):
+    pass
+
+
+def is_transient(exc: BaseException) -> bool:
+    return isinstance(exc, TransientError)
+
+
+@pytest.fixture
+def small_hedge_pool(monkeypatch):
+    """A fresh 2-worker hedge pool, so a handful of concurrent calls saturates it."""
+    monkeypatch.setenv("HEDGE_MAX_WORKERS", "2")
+    monkeypatch.setattr(resilience, "_hedge_executor", None)
+    monkeypatch.setattr(resilience, "_hedge_min_workers", 0)
+    yield
+    if resilience._hedge_executor is not None:
+        resilience._hedge_executor.shutdown(wait=False, cancel_futures=True)
+    resilience._hedge_executor = None
+
+
+def test_breaker_opens_after_threshold_and_probes_once_half_open():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=0.05)
+    breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == STATE_CLOSED
+    breaker.record_failure()
+    assert breaker.state == STATE_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+
+    time.sleep(0.06)
+    breaker.allow()
+    assert breaker.state == STATE_HALF_OPEN
+    # Only one probe at a time
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+    breaker.record_success()
+    assert breaker.state == STATE_CLOSED
+    breaker.allow()
+
+
+def test_breaker_reopens_when_probe_fails():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == STATE_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+
+
+def test_breaker_threshold_zero_disables_it():
+    breaker = CircuitBreaker("test", failure_threshold=0)
+    for _ in range(10):
+        breaker.record_failure()
+        breaker.allow()
+    assert breaker.state == STATE_CLOSED
+
+
+def test_retry_budget_spends_deposits_and_refills():
+    budget = RetryBudget(ratio=0.5, min_per_second=0.0, capacity=1.0)
+    assert budget.try_spend()
+    assert not budget.try_spend()
+    budget.deposit()
+    assert not budget.try_spend()
+    budget.deposit()
+    assert budget.try_spend()
+
+    refilling = RetryBudget(ratio=0.0, min_per_second=100.0, capacity=1.0)
+    assert refilling.try_spend()
+    time.sleep(0.02)
+    assert refilling.try_spend()
+
+
+def make_policy(budget: RetryBudget, failure_threshold: int = 5, max_attempts: int = 3) -> DependencyPolicy:
+    return DependencyPolicy(
+        "test",
+        is_transient,
+        CircuitBreaker("test", failure_threshold, 30.0),
+        budget,
+        max_attempts=max_attempts,
+        backoff_base=0.001,
+        min_attempt_s=0.0,
+    )
+
+
+def test_policy_retries_transient_errors_until_success():
+    policy = make_policy(RetryBudget(ratio=1.0, capacity=10.0))
+    attempts = []
+
+    def attempt():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise TransientError("busy")
+        return "ok"
+
+    assert policy.call(attempt) == "ok"
+    assert len(attempts) == 3
+    assert policy.breaker.state == STATE_CLOSED
+
+
+def test_policy_does_not_retry_when_budget_is_exhausted():
+    policy = make_policy(RetryBudget(ratio=0.0, min_per_second=0.0, capacity=0.0))
+    attempts = []
+
+    def attempt():
+        attempts.append(1)
+        raise TransientError("busy")
+
+    with pytest.raises(TransientError):
+        policy.call(attempt)
+    assert len(attempts) == 1
+
+
+def test_policy_non_transient_error_is_not_retried_and_counts_as_success():
+    policy = make_policy(RetryBudget(ratio=1.0, capacity=10.0), failure_threshold=1)
+    attempts = []
+
+    def attempt():
+        attempts.append(1)
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        policy.call(attempt)
+    assert len(attempts) == 1
+    assert policy.breaker.state == STATE_CLOSED
+
+
+def test_policy_fails_fast_while_breaker_is_open():
+    policy = make_policy(RetryBudget(ratio=0.0, min_per_second=0.0, capacity=0.0), failure_threshold=1)
+    with pytest.raises(TransientError):
+        policy.call(lambda: (_ for _ in ()).throw(TransientError("down")))
+    calls = []
+    with pytest.raises(CircuitOpenError):
+        policy.call(lambda: calls.append(1))
+    assert calls == []
+
+
+def test_policy_skips_retry_that_cannot_finish_before_the_deadline():
+    policy = DependencyPolicy(
+        "test", is_transient, CircuitBreaker("test", 5, 30.0), RetryBudget(ratio=1.0), backoff_base=0.001, min_attempt_s=5.0
+    )
+    with pytest.raises(DeadlineExceeded):
+        policy.call(lambda: (_ for _ in ()).throw(TransientError("busy")), deadline=Deadline.after(1.0))
+
+
+def test_hedged_returns_primary_when_fast(small_hedge_pool):
+    assert hedged(lambda: "primary", lambda: "hedge", 1.0, "test") == "primary"
+
+
+def test_hedged_uses_hedge_when_primary_is_slow(small_hedge_pool):
+    release = threading.Event()
+    start = time.monotonic()
+    assert hedged(lambda: release.wait(2) and "primary", lambda: "hedge", 0.05, "test") == "hedge"
+    assert time.monotonic() - start < 0.5
+    release.set()
+
+
+def test_hedged_falls_back_to_primary_when_hedge_fails(small_hedge_pool):
+    def primary():
+        time.sleep(0.1)
+        return "primary"
+
+    def failing_hedge():
+        raise TransientError("hedge failed")
+
+    assert hedged(primary, failing_hedge, 0.02, "test") == "primary"
+
+
+def test_hedged_wait_is_bounded_by_deadline(small_hedge_pool):
+    release = threading.Event()
+
+    def failing_hedge():
+        raise TransientError("hedge failed")
+
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        hedged(lambda: release.wait(5), failing_hedge, 0.02, "test", Deadline.after(0.2))
+    assert time.monotonic() - start < 1.0
+    release.set()
+
+
+def test_hedged_fallback_is_not_starved_by_concurrent_slow_primaries(small_hedge_pool):
+    """16 concurrent requests on a 2-worker pool: every one still gets its fallback within budget."""
+    release = threading.Event()
+
+    def slow_primary():
+        release.wait(4)
+        return "primary"
+
+    def timed_call(_):
+        start = time.monotonic()
+        result = hedged(slow_primary, lambda: "fallback", 0.2, "nova", Deadline.after(2.0))
+        return result, time.monotonic() - start
+
+    try:
+        with ThreadPoolExecutor(max_workers=16) as callers:
+            outcomes = list(callers.map(timed_call, range(16)))
+    finally:
+        release.set()
+    assert [result for result, _ in outcomes] == ["fallback"] * 16
+    assert max(elapsed for _, elapsed in outcomes) < 0.6
+
+
+def test_reserved_hedge_workers_replace_a_smaller_pool(small_hedge_pool):
+    small = resilience._get_hedge_executor()
+
+    assert reserve_hedge_workers(1) == 2
+    assert resilience._get_hedge_executor() is small
+    assert reserve_hedge_workers(32) == 32
+    assert resilience._get_hedge_executor() is not small
+    assert resilience._hedge_executor_workers == 32
@@ -0,0 +1,85 @@
+import pytest
+
+from benchmarks.fakes import FakeMongoDBClient
+from utils.search_filters import compile_atlas_filter, filter_signature, relaxation_stages
+
+
+def test_empty_preferences_compile_to_no_filter():
+    assert compile_atlas_filter({"user_level": None, "language": None, "preferred_platforms": [], "max_price": None}) == {}
+    # An advanced user may take any level, so the level adds no clause
+    assert compile_atlas_filter({"user_level": "advanced"}) == {}
+
+
+def test_single_preference_is_not_wrapped_in_and():
+    assert compile_atlas_filter({"user_level": "beginner"}) == {"level": {"$nin": ["advanced"]}}
+    assert compile_atlas_filter({"language": "es"}) == {"language": {"$eq": "es"}}
+
+
+def test_preferences_compile_to_an_and_of_clauses():
+    compiled = compile_atlas_filter(
+        {"user_level": "beginner", "language": "es", "preferred_platforms": ("Udemy", "Coursera"), "max_price": 20}
+    )
+
+    assert compiled == {
+        "$and": [
+            {"level": {"$nin": ["advanced"]}},
+            {"language": {"$eq": "es"}},
+            {"platform": {"$in": ["Udemy", "Coursera"]}},
+            # Courses without a price are kept, as the post-filter does
+            {"$or": [{"price": {"$lte": 20.0}}, {"price": {"$eq": None}}]},
+        ]
+    }
+
+
+def test_relaxation_drops_preferences_least_important_first_then_the_level():
+    filters = {"user_level": "beginner", "language": "es", "preferred_platforms": ["Udemy"], "max_price": 20}
+
+    stages = relaxation_stages(filters)
+
+    assert [sorted(key for key, value in stage.items() if value not in (None, [], "")) for stage in stages] == [
+        ["language", "max_price", "preferred_platforms", "user_level"],
+        ["language", "max_price", "user_level"],
+        ["language", "user_level"],
+        ["user_level"],
+        [],
+    ]
+
+
+def test_level_alone_is_never_relaxed():
+    assert relaxation_stages({"user_level": "beginner", "language": None}) == [{"user_level": "beginner", "language": None}]
+
+
+def test_filter_signature_ignores_inactive_values_and_platform_order():
+    assert filter_signature({"preferred_platforms": ["b", "a"], "language": None}) == filter_signature(
+        {"preferred_platforms": ["a", "b"], "max_price": None}
+    )
+
+
+def course(course_id, embedding, level, language="en"):
+    return {"_id": course_id, "embedding": embedding, "title": course_id, "level": level, "language": language, "platform": "Udemy", "price": 10.0}
+
+
+@pytest.fixture
+def prefilter_client(monkeypatch):
+    monkeypatch.setenv("VECTOR_SEARCH_PREFILTER", "true")
+    catalog = [
+        course("beginner-es", [1.0, 0.0, 0.0], "beginner", "es"),
+        course("beginner-en", [0.9, 0.1, 0.0], "beginner"),
+        course("advanced-1", [0.8, 0.2, 0.0], "advanced"),
+        course("advanced-2", [0.7, 0.3, 0.0], "advanced"),
+        course("advanced-3", [0.6, 0.4, 0.0], "advanced"),
+    ]
+    return FakeMongoDBClient(catalog, 3)
+
+
+def test_staged_search_falls_back_past_the_level_like_the_post_filter(prefilter_client):
+    results = prefilter_client.vector_search([1.0, 0.0, 0.0], 4, 10, {"user_level": "beginner", "language": "es"})
+
+    # Matches of the stricter stages come first
+    assert [result["course_id"] for result in results] == ["beginner-es", "beginner-en", "advanced-1", "advanced-2"]
+
+
+def test_staged_search_with_only_a_level_stays_within_it(prefilter_client):
+    results = prefilter_client.vector_search([1.0, 0.0, 0.0], 4, 10, {"user_level": "beginner", "language": None})
+
+    assert [result["course_id"] for result in results] == ["beginner-es", "beginner-en"]
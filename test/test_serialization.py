@@ -0,0 +1,83 @@
+import dataclasses
+import datetime
+import json
+from decimal import Decimal
+
+import pytest
+
+import learning_path_generator
+from conftest import generation_event
+from utils import serialization
+from utils.request_context import RequestContext
+from utils.serialization import encode_json
+
+VALUE = {"name": "Ruta ñandú", "hours": 12, "price": Decimal("19.90"), "tags": ["a", None, True]}
+
+
+@pytest.fixture(params=["orjson", "stdlib"])
+def encoder(request, monkeypatch):
+    if request.param == "orjson":
+        pytest.importorskip("orjson")
+    else:
+        monkeypatch.setattr(serialization, "orjson", None)
+    return request.param
+
+
+def test_bodies_are_compact_json(encoder):
+    body = encode_json(VALUE)
+
+    assert json.loads(body) == {**VALUE, "price": "19.90"}
+    assert ", " not in body and ": " not in body
+
+
+def test_dates_are_written_as_text(encoder):
+    decoded = json.loads(encode_json({"due": datetime.date(2026, 1, 31)}))
+    assert decoded == {"due": "2026-01-31"}
+
+
+def test_values_orjson_rejects_fall_back_to_the_stdlib():
+    assert json.loads(encode_json({"big": 2**70, 1: "x"})) == {"big": 2**70, "1": "x"}
+
+
+def test_request_context_defaults_and_unknown_formats():
+    payload = {"user_query": "python", "user_level": "beginner", "time_per_week": 5, "num_courses": 4, "preferences": None}
+
+    request = RequestContext.from_payload("user-1", {**payload, "response_format": "xml"})
+
+    assert request.response_format == "backend"
+    assert request.preferences == {}
+    assert request.max_price is None and request.language is None
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        request.user_id = "user-2"
+
+
+def test_event_body_is_parsed_once_per_request(make_generator, monkeypatch):
+    generator = make_generator(NOVA_PLAN_CACHE_SIZE="0")
+    parses = []
+    parse_body = generator._parse_body
+    monkeypatch.setattr(generator, "_parse_body", lambda event: parses.append(event) or parse_body(event))
+
+    response = learning_path_generator.lambda_handler(generation_event(response_format="both"), None)
+
+    assert response["statusCode"] == 200
+    assert len(parses) == 1
+    body = json.loads(response["body"])
+    assert body["frontend"]["id"] == body["backend"]["path_id"]
+
+
+@pytest.mark.parametrize("response_format, keys", [("backend", "path_id"), ("frontend", "titulo")])
+def test_only_the_requested_view_is_rendered(make_generator, response_format, keys):
+    make_generator(NOVA_PLAN_CACHE_SIZE="0")
+
+    response = learning_path_generator.lambda_handler(generation_event(response_format=response_format), None)
+
+    assert keys in json.loads(response["body"])
+
+
+def test_invalid_body_answers_400_with_a_json_error(make_generator):
+    make_generator()
+
+    response = learning_path_generator.lambda_handler({"body": "{no es json"}, None)
+
+    assert response["statusCode"] == 400
+    assert json.loads(response["body"]) == {"error": "El cuerpo de la solicitud debe ser JSON válido"}
@@ -0,0 +1,111 @@
+import http.client
+import json
+import threading
+import time
+
+import pytest
+
+import server
+
+BODY = {
+    "user_id": "user-1",
+    "user_query": "Quiero aprender Python desde cero para análisis de datos",
+    "user_level": "beginner",
+    "time_per_week": 5,
+    "num_courses": 4,
+}
+
+
+@pytest.fixture
+def running_server(make_generator):
+    make_generator(NOVA_PLAN_CACHE_SIZE="0")
+    http_server = server.build_server("127.0.0.1", 0, 2)
+    thread = threading.Thread(target=http_server.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True)
+    thread.start()
+    yield http_server
+    http_server.shutdown()
+    http_server.server_close()
+    thread.join(5)
+
+
+def call(http_server, method, path, body=None):
+    connection = http.client.HTTPConnection(*http_server.server_address[:2], timeout=10)
+    try:
+        connection.request(method, path, body=json.dumps(body) if body is not None else None)
+        response = connection.getresponse()
+        return response.status, dict(response.getheaders()), response.read().decode("utf-8")
+    finally:
+        connection.close()
+
+
+def test_health_does_not_touch_the_generator(running_server):
+    status, _, body = call(running_server, "GET", "/health")
+    assert (status, json.loads(body)) == (200, {"status": "ok"})
+
+
+def test_post_generates_a_path(running_server):
+    status, headers, body = call(running_server, "POST", "/generate-learning-path", BODY)
+
+    assert status == 200
+    assert headers["Content-Length"] == str(len(body.encode("utf-8")))
+    path = json.loads(body)
+    assert path["user_id"] == "user-1" and len(path["courses"]) == 4
+
+
+def test_validation_errors_keep_the_handler_status(running_server):
+    status, _, body = call(running_server, "POST", "/generate-learning-path", {**BODY, "user_level": "expert"})
+    assert status == 400 and "user_level" in json.loads(body)["error"]
+
+
+def test_stream_writes_one_json_line_per_event(running_server):
+    status, headers, body = call(running_server, "POST", "/generate-learning-path/stream", BODY)
+
+    events = [json.loads(line) for line in body.splitlines()]
+    assert status == 200 and headers["Content-Type"] == "application/x-ndjson"
+    assert events[0]["type"] == "header" and events[-1]["type"] == "complete"
+
+
+@pytest.mark.parametrize("method, path", [("GET", "/nope"), ("POST", "/generate-learning-path/extra"), ("GET", "/jobs/")])
+def test_unknown_routes_answer_404(running_server, method, path):
+    status, _, body = call(running_server, method, path, {} if method == "POST" else None)
+    assert (status, json.loads(body)) == (404, {"error": "Ruta no encontrada"})
+
+
+@pytest.mark.parametrize(
+    "method, path, allow",
+    [
+        ("GET", "/generate-learning-path", "POST, OPTIONS"),
+        ("DELETE", "/generate-learning-path", "POST, OPTIONS"),
+        ("GET", "/generate-learning-path/stream", "POST"),
+        ("POST", "/health", "GET"),
+        ("PUT", "/jobs/job-1", "GET, OPTIONS"),
+    ],
+)
+def test_other_methods_on_known_routes_answer_405(running_server, method, path, allow):
+    status, headers, _ = call(running_server, method, path)
+    assert (status, headers["Allow"]) == (405, allow)
+
+
+def test_shutdown_drains_requests_in_flight(running_server, monkeypatch):
+    started, release = threading.Event(), threading.Event()
+
+    def slow_handler(event, context):
+        started.set()
+        release.wait(5)
+        return {"statusCode": 200, "headers": {}, "body": "{}"}
+
+    monkeypatch.setattr(server, "lambda_handler", slow_handler)
+    responses = []
+    client = threading.Thread(target=lambda: responses.append(call(running_server, "POST", "/generate-learning-path", BODY)))
+    client.start()
+    assert started.wait(5)
+
+    running_server.shutdown()
+    assert not running_server.drain(0.05)
+    release.set()
+    start = time.monotonic()
+    server.shutdown(running_server, 5)
+    client.join(5)
+
+    assert time.monotonic() - start < 5
+    assert responses[0][0] == 200
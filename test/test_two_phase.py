@@ -0,0 +1,53 @@
+import json
+
+import pytest
+
+import learning_path_generator
+from conftest import generation_event
+
+
+def nodes(*lanes):
+    placed = []
+    for lane in lanes:
+        placed.append({"course_id": f"c{len(placed)}", "lane": lane, "order": sum(1 for node in placed if node["lane"] == lane)})
+    return placed
+
+
+# The fake places six courses in lanes of 2, 1, 2 and 1
+@pytest.mark.parametrize("per_call, reason_calls", [("1", 6), ("2", 4), ("3", 4)])
+def test_each_course_gets_its_reason_from_a_fragment_call(make_generator, per_call, reason_calls):
+    generator = make_generator(NOVA_TWO_PHASE="true", NOVA_REASONS_PER_CALL=per_call, NOVA_PLAN_CACHE_SIZE="0")
+
+    response = generator.handle(generation_event(num_courses=6))
+
+    assert len(response["courses"]) == 6
+    assert all(course["reason"] for course in response["courses"])
+    assert response["roadmap_text"].startswith("## Roadmap")
+    # Skeleton + roadmap + one call per lane group
+    assert generator.bedrock.calls["nova"] == 2 + reason_calls
+
+
+def test_reason_groups_follow_lanes_and_the_per_call_limit(make_generator):
+    generator = make_generator(NOVA_TWO_PHASE="true", NOVA_REASONS_PER_CALL="2")
+
+    groups = generator._reason_groups(nodes(1, 0, 0, 0, 1))
+
+    assert [[node["course_id"] for node in group] for group in groups] == [["c1", "c2"], ["c3"], ["c0", "c4"]]
+
+
+def test_skeleton_with_an_unknown_course_is_rejected_before_the_fragments(make_generator):
+    generator = make_generator(NOVA_TWO_PHASE="true")
+    skeleton = {"name": "Ruta", "nodes": [{"course_id": "course-999999", "lane": 0, "order": 0}]}
+    generator.bedrock.invoke_nova = lambda *args, **kwargs: {"message": {"content": [{"text": json.dumps(skeleton)}]}}
+
+    with pytest.raises(learning_path_generator.ValidationError, match="course-999999"):
+        generator._orchestrate_two_phase("python", "beginner", 5, [{"course_id": "course-000001", "title": "Python"}])
+
+
+def test_single_call_is_kept_by_default(make_generator):
+    generator = make_generator(NOVA_PLAN_CACHE_SIZE="0")
+
+    generator.handle(generation_event())
+
+    assert generator.nova_executor is None
+    assert generator.bedrock.calls["nova"] == 1
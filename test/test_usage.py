@@ -0,0 +1,74 @@
+import contextvars
+
+import pytest
+
+from conftest import generation_event
+from utils import usage
+from utils.usage import current_usage, estimate_cost_usd, record_bedrock_call, start_usage, usage_stage
+
+
+def in_new_context(func, *args):
+    # Empty context: earlier handler tests may have left a ledger in this thread's context
+    return contextvars.Context().run(func, *args)
+
+
+def test_cost_uses_the_price_of_the_matching_model():
+    assert estimate_cost_usd("us.amazon.nova-lite-v1:0", 1000, 1000) == pytest.approx(0.0003)
+    assert estimate_cost_usd("amazon.titan-embed-text-v2:0", 2000, 0) == pytest.approx(0.00004)
+    assert estimate_cost_usd("unknown-model", 1000, 1000) == 0.0
+
+
+def test_prices_can_be_overridden_and_bad_json_is_ignored(monkeypatch):
+    monkeypatch.setenv("BEDROCK_PRICES_JSON", '{"nova-lite": [0.001, 0.002]}')
+    assert usage._load_prices()["nova-lite"] == (0.001, 0.002)
+
+    monkeypatch.setenv("BEDROCK_PRICES_JSON", "not json")
+    assert usage._load_prices() == usage.DEFAULT_PRICES_PER_1K
+
+
+def test_calls_outside_a_request_are_not_recorded():
+    def run():
+        record_bedrock_call("nova", "nova-lite", 10, 10)
+        return current_usage()
+
+    assert in_new_context(run) is None
+
+
+def test_summary_breaks_calls_down_by_stage():
+    def run():
+        ledger = start_usage()
+        record_bedrock_call("embedding", "titan-embed-text-v2", 12, latency_ms=40)
+        with usage_stage("nova_skeleton"):
+            record_bedrock_call("nova", "nova-lite", 1000, 200, attempts=2, latency_ms=900)
+            record_bedrock_call("nova", "nova-lite", 500, 0, ok=False)
+        return ledger.summary()
+
+    summary = in_new_context(run)
+
+    assert (summary["calls"], summary["failed_calls"], summary["attempts"]) == (3, 1, 4)
+    assert summary["input_tokens"] == 1512
+    assert summary["stages"]["embedding"]["latency_ms"] == 40
+    assert summary["stages"]["nova_skeleton"] == {
+        "model": "nova-lite",
+        "calls": 2,
+        "attempts": 3,
+        "input_tokens": 1500,
+        "output_tokens": 200,
+        "latency_ms": 900,
+    }
+    expected_cost = estimate_cost_usd("nova-lite", 1500, 200) + estimate_cost_usd("titan-embed-text-v2", 12, 0)
+    assert summary["cost_usd"] == round(expected_cost, 6)
+
+
+def test_fragment_calls_land_in_the_request_ledger(make_generator):
+    generator = make_generator(NOVA_TWO_PHASE="true", NOVA_PLAN_CACHE_SIZE="0")
+
+    def run():
+        ledger = start_usage()
+        generator.handle(generation_event())
+        return ledger.summary()
+
+    summary = in_new_context(run)
+
+    assert {"embedding", "nova_skeleton", "nova_reasons", "nova_roadmap"} <= set(summary["stages"])
+    assert summary["calls"] == generator.bedrock.calls["embedding"] + generator.bedrock.calls["nova"]
@@ -0,0 +1,121 @@
+import threading
+
+import numpy as np
+import pytest
+
+from utils import vector_index
+from utils.vector_index import LocalVectorIndex, load_local_index
+
+
+def course(course_id, embedding, level="beginner"):
+    return {"_id": course_id, "title": course_id, "level": level, "embedding": embedding}
+
+
+@pytest.fixture
+def index():
+    documents = [
+        course("a", [1.0, 0.0, 0.0]),
+        course("b", [0.8, 0.6, 0.0], level="advanced"),
+        course("c", [0.0, 1.0, 0.0]),
+        course("d", [0.0, 0.0, 1.0], level="advanced"),
+        course("short", [1.0, 0.0]),
+    ]
+    return LocalVectorIndex.from_documents(documents, 3)
+
+
+def ids(results):
+    return [result["_id"] for result in results]
+
+
+def test_documents_with_another_dimension_are_skipped(index):
+    assert index.size == 4
+    assert index.dimension == 3
+
+
+def test_search_ranks_by_cosine_with_atlas_scores(index):
+    results = index.search([2.0, 0.0, 0.0], num_candidates=3)
+
+    assert ids(results) == ["a", "b", "c"]
+    assert results[0]["score"] == pytest.approx(1.0)
+    assert results[1]["score"] == pytest.approx((1.0 + 0.8) / 2)
+    assert results[2]["score"] == pytest.approx(0.5)
+    assert "embedding" not in results[0]
+
+
+def test_search_only_returns_rows_allowed_by_the_mask(index):
+    advanced = index.filter_mask("advanced", lambda doc: doc.get("level") == "advanced")
+
+    assert ids(index.search([1.0, 0.0, 0.0], num_candidates=10, allowed=advanced)) == ["b", "d"]
+    assert index.search([1.0, 0.0, 0.0], num_candidates=10, allowed=np.zeros(index.size, dtype=bool)) == []
+
+
+def test_search_many_matches_single_searches(index):
+    queries = [[1.0, 0.0, 0.0], [0.0, 0.2, 1.0]]
+
+    batched = index.search_many(queries, num_candidates=2)
+
+    assert [ids(results) for results in batched] == [ids(index.search(query, 2)) for query in queries]
+
+
+def test_search_rejects_a_query_of_another_dimension(index):
+    with pytest.raises(ValueError):
+        index.search([1.0, 0.0], num_candidates=2)
+    with pytest.raises(ValueError):
+        index.search([0.0, 0.0, 0.0], num_candidates=2)
+
+
+def test_masks_are_cached_per_signature_and_evicted_oldest_first(index, monkeypatch):
+    monkeypatch.setattr(vector_index, "MAX_CACHED_MASKS", 2)
+    calls = []
+
+    def predicate(doc):
+        calls.append(doc["_id"])
+        return True
+
+    index.filter_mask("one", predicate)
+    index.filter_mask("one", predicate)
+    assert len(calls) == index.size
+
+    index.filter_mask("two", predicate)
+    index.filter_mask("one", predicate)
+    index.filter_mask("three", predicate)
+    assert list(index._mask_cache) == ["one", "three"]
+
+
+def test_concurrent_mask_evictions_do_not_fail(index, monkeypatch):
+    monkeypatch.setattr(vector_index, "MAX_CACHED_MASKS", 4)
+    errors = []
+
+    def worker(offset):
+        try:
+            for number in range(300):
+                index.filter_mask(f"sig-{(offset + number) % 20}", lambda doc: True)
+        except Exception as exc:  # noqa: BLE001
+            errors.append(exc)
+
+    threads = [threading.Thread(target=worker, args=(offset,)) for offset in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert len(index._mask_cache) <= 4
+
+
+def test_snapshot_round_trip(index, tmp_path):
+    path = str(tmp_path / "index")
+    index.save_snapshot(path)
+
+    loaded = LocalVectorIndex.from_snapshot(path, 3)
+
+    assert ids(loaded.search([1.0, 0.0, 0.0], 4)) == ids(index.search([1.0, 0.0, 0.0], 4))
+
+
+def test_snapshot_of_another_dimension_is_rejected_at_load(index, tmp_path, monkeypatch):
+    path = str(tmp_path / "index")
+    index.save_snapshot(path)
+    monkeypatch.setenv("VECTOR_INDEX_SNAPSHOT", path)
+
+    with pytest.raises(ValueError):
+        load_local_index(collection=None, dimension=1024)
@@ -0,0 +1,45 @@
+import pytest
+
+from conftest import generation_event
+
+
+@pytest.fixture
+def warm_ups(make_generator, monkeypatch):
+    generator = make_generator(PARALLEL_WARM_UP="true", WARM_UP_IDLE_SECONDS="300")
+    calls = []
+    monkeypatch.setattr(generator.mongo_client, "warm_up", lambda: calls.append("mongo"))
+    monkeypatch.setattr(generator.postgres_client, "warm_up", lambda: calls.append("postgres"))
+    return generator, calls
+
+
+def test_first_request_warms_up_both_clients(warm_ups):
+    generator, calls = warm_ups
+
+    generator.handle(generation_event())
+
+    assert sorted(calls) == ["mongo", "postgres"]
+
+
+def test_warm_container_skips_the_warm_up(warm_ups):
+    generator, calls = warm_ups
+
+    for _ in range(3):
+        generator.handle(generation_event())
+
+    assert sorted(calls) == ["mongo", "postgres"]
+
+
+def test_warm_up_runs_again_after_an_idle_gap(warm_ups):
+    generator, calls = warm_ups
+    generator.handle(generation_event())
+    # As if the container had been frozen for longer than WARM_UP_IDLE_SECONDS
+    generator._last_request_at -= 301
+
+    generator.handle(generation_event())
+
+    assert sorted(calls) == ["mongo", "mongo", "postgres", "postgres"]
+
+
+def test_warm_up_is_off_by_default(make_generator):
+    generator = make_generator()
+    assert generator._start_warm_up() == {}